@@ -0,0 +1,289 @@
+# coding: utf-8
+
+"""APIの残り回数に合わせて呼び出しの間隔を空け、失敗の種類に応じて待ってから再試行するクライアント"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import time
+import threading
+import requests
+from tweepy.models import Status
+
+
+# APIのURL
+API_ROOT = "https://api.twitter.com/1.1"
+
+# 流量制限 (420/429) の待機時間 (1分から倍々に増やす)
+RATE_LIMIT_START = 60.0
+RATE_LIMIT_MAX = 960.0
+# サーバエラー (5xx など) の待機時間 (5秒から倍々に320秒まで増やす)
+HTTP_ERROR_START = 5.0
+HTTP_ERROR_MAX = 320.0
+# 通信エラーの待機時間 (0.25秒ずつ16秒まで増やす)
+TCPIP_ERROR_STEP = 0.25
+TCPIP_ERROR_MAX = 16.0
+
+# 流量制限のリセット時刻から余分に待つ秒数 (時計のずれの分)
+RESET_MARGIN = 1.0
+
+# トークンバケットに溜められる呼び出し回数
+BUCKET_BURST = 10
+
+
+class APIError(Exception):
+    """APIが200以外のステータスコードを返したことを表す例外"""
+    def __init__(self, status, message=""):
+        """
+        コンストラクタ
+        @param status ステータスコード
+        @param message レスポンスの本文
+        """
+        super(APIError, self).__init__("HTTP " + str(status) + ": " + message[:200])
+        self.status = status
+
+
+class Backoff():
+    """失敗が続くたびに待機時間を増やすクラス"""
+    def __init__(self, start, maximum, factor=2.0, step=0.0):
+        """
+        コンストラクタ
+        @param start 最初の待機時間 (秒)
+        @param maximum 待機時間の最大 (秒)
+        @param factor 失敗するたびに掛ける倍率 (1なら step ずつ増やす)
+        @param step 失敗するたびに足す秒数
+        """
+        self.start = start
+        self.maximum = maximum
+        self.factor = factor
+        self.step = step
+        self.current = start
+
+    def next(self):
+        """
+        次の待機時間を求めて、その次の待機時間を増やす
+        @return 秒数
+        """
+        delay = self.current
+        self.current = min(self.current * self.factor + self.step, self.maximum)
+        return delay
+
+    def reset(self):
+        """待機時間を最初に戻す"""
+        self.current = self.start
+
+
+class BackoffPolicy():
+    """流量制限、サーバエラー、通信エラーのそれぞれに分けて待機時間を決めるクラス"""
+    def __init__(self):
+        """コンストラクタ"""
+        self.rate = Backoff(RATE_LIMIT_START, RATE_LIMIT_MAX)
+        self.http = Backoff(HTTP_ERROR_START, HTTP_ERROR_MAX)
+        self.tcpip = Backoff(TCPIP_ERROR_STEP, TCPIP_ERROR_MAX, 1.0, TCPIP_ERROR_STEP)
+        self.lock = threading.Lock()
+
+    def delay(self, status=None):
+        """
+        失敗の種類に応じた待機時間を求める
+        @param status HTTPのステータスコード (通信エラーならNone)
+        @return 秒数
+        """
+        with self.lock:
+            if status in (420, 429):
+                return self.rate.next()
+            if status is not None:
+                return self.http.next()
+            return self.tcpip.next()
+
+    def reset(self):
+        """成功したのですべての待機時間を最初に戻す"""
+        with self.lock:
+            self.rate.reset()
+            self.http.reset()
+            self.tcpip.reset()
+
+
+class TokenBucket():
+    """
+    一定の速さでトークンが溜まり、一回の呼び出しごとにトークンを一つ使うことで呼び出しの間隔を空けるクラス
+    レスポンスヘッダの残り回数とリセット時刻が分かれば、リセットまでの残り時間に残り回数を均等に割り振る
+    """
+    def __init__(self, rate_limit=900, window=900.0, burst=BUCKET_BURST, sleep=time.sleep, clock=time.time):
+        """
+        コンストラクタ
+        @param rate_limit 時間枠あたりの呼び出し回数の上限 (0なら制限しない)
+        @param window 時間枠の秒数
+        @param burst 溜められるトークンの最大数
+        @param sleep 待機する関数
+        @param clock 現在時刻 (UNIX時間) を返す関数 (sleep を差し替える場合は合わせて進める)
+        """
+        self.unlimited = rate_limit <= 0
+        self.base_rate = rate_limit / window if rate_limit > 0 else 0.0
+        self.burst = burst
+        self.sleep = sleep
+        self.clock = clock
+        self.lock = threading.Lock()
+
+        self.rate = self.base_rate
+        self.rate_until = 0.0
+        self.tokens = float(burst)
+        self.updated = clock()
+
+    def refill(self, now):
+        """
+        経過時間の分だけトークンを溜める
+        @param now 現在時刻
+        """
+        if now >= self.rate_until:
+            self.rate = self.base_rate
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """
+        トークンが溜まるまで待ってから一つ使う
+        待つ間はロックを離し、他のスレッドがレスポンスヘッダに合わせて速さを変えられるようにする
+        """
+        if self.unlimited:
+            return
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                if self.rate > 0:
+                    delay = (1 - self.tokens) / self.rate
+                else:
+                    # 残り回数がなければリセット時刻まで待つ (リセット後の refill で元の速さに戻る)
+                    delay = max(self.rate_until - now, 0.0)
+            self.sleep(delay)
+
+    def update(self, remaining, reset_at):
+        """
+        レスポンスヘッダの残り回数とリセット時刻に合わせる
+        @param remaining 時間枠の残りの呼び出し回数
+        @param reset_at 時間枠がリセットされる時刻 (UNIX時間)
+        """
+        if self.unlimited:
+            return
+        with self.lock:
+            now = self.clock()
+            self.refill(now)
+            if reset_at <= now:
+                return
+            self.tokens = min(self.tokens, remaining)
+            self.rate = max(remaining - self.tokens, 0) / (reset_at - now)
+            self.rate_until = reset_at
+
+
+class LookupClient():
+    """
+    statuses/lookup を呼び出すクライアント
+    呼び出しの間隔をトークンバケットで空け、流量制限、サーバエラー、通信エラーはそれぞれの待機時間だけ待って再試行する
+    """
+    def __init__(self, auth=None, api_root=API_ROOT, rate_limit=900, window=900.0, max_retries=5, timeout=30.0, sleep=time.sleep, clock=time.time):
+        """
+        コンストラクタ
+        @param auth tweepyの認証情報 (Noneなら認証しない)
+        @param api_root APIのURL
+        @param rate_limit 時間枠あたりの呼び出し回数の上限 (0なら制限しない)
+        @param window 時間枠の秒数
+        @param max_retries 再試行する最大の回数
+        @param timeout 一回の呼び出しのタイムアウト (秒)
+        @param sleep 待機する関数
+        @param clock 現在時刻 (UNIX時間) を返す関数 (sleep を差し替える場合は合わせて進める)
+        """
+        self.auth = auth
+        self.url = api_root + "/statuses/lookup.json"
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.sleep = sleep
+        self.clock = clock
+
+        self.session = requests.Session()
+        self.bucket = TokenBucket(rate_limit, window, sleep=sleep, clock=clock)
+        self.backoff = BackoffPolicy()
+
+        # レスポンスヘッダから分かった残り回数とリセット時刻、失敗の回数
+        self.lock = threading.Lock()
+        self.remaining = None
+        self.reset_at = None
+        self.calls = 0
+        self.errors = {}
+
+    def statuses_lookup(self, id_, *args, **kwargs):
+        """
+        ツイートIDのリストに対応するツイートを取得する
+        @param id_ ツイートIDのリスト
+        @return 取得したツイートのリスト
+        """
+        for retry in range(self.max_retries + 1):
+            if retry > 0:
+                self.sleep(delay)
+            self.bucket.acquire()
+            try:
+                resp = self.session.get(self.url, params={'id': ",".join(map(str, id_))},
+                                        auth=self.auth.apply_auth() if self.auth else None, timeout=self.timeout)
+            except requests.RequestException as e:
+                error = e
+                self.record("tcpip")
+                delay = self.backoff.delay()
+                continue
+
+            self.update(resp.headers)
+            if resp.status_code == 200:
+                self.backoff.reset()
+                return [Status.parse(None, raw) for raw in resp.json()]
+
+            error = APIError(resp.status_code, resp.text)
+            self.record(resp.status_code)
+            if resp.status_code in (420, 429):
+                # リセット時刻が分かればそれまで待ち、分からなければ倍々に待つ
+                delay = self.backoff.delay(resp.status_code)
+                with self.lock:
+                    reset_at = self.reset_at
+                now = self.clock()
+                if reset_at is not None and reset_at > now:
+                    delay = reset_at - now + RESET_MARGIN
+            elif resp.status_code >= 500:
+                delay = self.backoff.delay(resp.status_code)
+            else:
+                raise error
+
+        raise error
+
+    def update(self, headers):
+        """
+        レスポンスヘッダから残り回数とリセット時刻を読み取る
+        @param headers レスポンスヘッダ
+        """
+        remaining = headers.get('x-rate-limit-remaining')
+        reset_at = headers.get('x-rate-limit-reset')
+        with self.lock:
+            self.calls += 1
+            if remaining is not None and reset_at is not None:
+                self.remaining = int(remaining)
+                self.reset_at = int(reset_at)
+        if remaining is not None and reset_at is not None:
+            self.bucket.update(int(remaining), int(reset_at))
+
+    def record(self, kind):
+        """
+        失敗を数える
+        @param kind ステータスコードか "tcpip"
+        """
+        with self.lock:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def stats(self):
+        """
+        呼び出しの統計を求める
+        @return 呼び出し回数、残り回数、リセット時刻、失敗の種類ごとの回数の辞書
+        """
+        with self.lock:
+            return {'calls': self.calls, 'remaining': self.remaining, 'reset_at': self.reset_at, 'errors': dict(self.errors)}
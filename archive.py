@@ -0,0 +1,322 @@
+# coding: utf-8
+
+"""ストリームのデータとリプライ先の取得結果を圧縮したJSONLのシャードにそのまま保存するアーカイブ"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import io
+import os
+import gzip
+import json
+import time
+import queue
+import threading
+from checkpoint import atomic_write
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# 圧縮形式ごとのシャードの拡張子
+SHARD_SUFFIXES = {"gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}
+
+# アーカイブするデータの種類 (ストリームのデータ, リプライ先の取得結果)
+KINDS = ["stream", "lookup"]
+
+
+def open_shard(path):
+    """
+    シャードを読み込み用に開く
+    @param path シャードのファイルパス (拡張子で圧縮形式を判定し、圧縮されていないものも読める)
+    @return テキストのファイルオブジェクト
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read " + path)
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True), encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def read_ids(path):
+    """
+    シャードに含まれるデータ数とツイートIDの範囲を求める (書き込み途中で終了したシャードは読めたところまで)
+    @param path シャードのファイルパス
+    @return データ数、ツイートIDの最小と最大 (IDを持つデータがなければNone)
+    """
+    messages, min_id, max_id = 0, None, None
+    try:
+        with open_shard(path) as f:
+            for line in f:
+                try:
+                    tweet_id = json.loads(line).get('id')
+                except ValueError:
+                    break
+                messages += 1
+                if isinstance(tweet_id, int):
+                    min_id = tweet_id if min_id is None else min(min_id, tweet_id)
+                    max_id = tweet_id if max_id is None else max(max_id, tweet_id)
+    except EOFError:
+        pass
+    return messages, min_id, max_id
+
+
+def kind_path(kind, name):
+    """
+    アーカイブのフォルダからのシャードの相対パスを求める
+    @param kind データの種類
+    @param name シャードのファイル名
+    @return 相対パス
+    """
+    return kind + "/" + name
+
+
+class ShardWriter():
+    """一種類のデータを圧縮したシャードに書き込み、サイズか時間で次のシャードに切り替えるクラス"""
+    def __init__(self, folder, kind, compression, number):
+        """
+        コンストラクタ
+        @param folder アーカイブのフォルダ
+        @param kind データの種類
+        @param compression 圧縮形式 ("gzip" か "zstd")
+        @param number 最初に書き込むシャード番号
+        """
+        self.folder = folder
+        self.kind = kind
+        self.compression = compression
+        self.number = number
+        self.file = None
+
+        if not os.path.isdir(os.path.join(folder, kind)):
+            os.makedirs(os.path.join(folder, kind))
+
+    def open(self):
+        """次のシャードを開く"""
+        self.name = kind_path(self.kind, "%s_%05d%s" % (self.kind, self.number, SHARD_SUFFIXES[self.compression]))
+        raw = open(os.path.join(self.folder, self.name), 'wb')
+        if self.compression == "zstd":
+            self.file = zstandard.ZstdCompressor().stream_writer(raw)
+        else:
+            self.file = gzip.GzipFile(fileobj=raw, mode='wb')
+        self.raw = raw
+        self.number += 1
+
+        self.opened = time.time()
+        self.messages = 0
+        self.size = 0
+        self.min_id = None
+        self.max_id = None
+
+    def write(self, lines, ids):
+        """
+        データを書き込む
+        @param lines 一行ずつのjson形式のデータのリスト
+        @param ids 各データのツイートIDのリスト (IDを持たないデータはNone)
+        """
+        if self.file is None:
+            self.open()
+
+        data = "".join(lines).encode('utf-8')
+        self.file.write(data)
+        self.messages += len(lines)
+        self.size += len(data)
+
+        ids = [tweet_id for tweet_id in ids if tweet_id is not None]
+        if ids:
+            self.min_id = min(ids) if self.min_id is None else min(self.min_id, min(ids))
+            self.max_id = max(ids) if self.max_id is None else max(self.max_id, max(ids))
+
+    def flush(self):
+        """書き込んだデータを、シャードを閉じなくても読み込めるように書き出す"""
+        if self.file is None:
+            return
+        if self.compression == "zstd":
+            self.file.flush(zstandard.FLUSH_BLOCK)
+        else:
+            self.file.flush()
+        self.raw.flush()
+
+    def close(self):
+        """
+        シャードを閉じる
+        @return 索引に記録するシャードの情報 (開いていなければNone)
+        """
+        if self.file is None:
+            return None
+
+        if self.compression == "zstd":
+            self.file.flush(zstandard.FLUSH_FRAME)
+        else:
+            self.file.close()
+        self.raw.flush()
+        os.fsync(self.raw.fileno())
+        self.raw.close()
+        self.file = None
+
+        return {
+            'kind': self.kind, 'file': self.name, 'messages': self.messages, 'bytes': self.size,
+            'min_id': self.min_id, 'max_id': self.max_id, 'opened': self.opened, 'closed': time.time()
+        }
+
+
+class StreamArchive():
+    """
+    ストリームのデータとリプライ先の取得結果を、種類ごとにバックグラウンドのスレッドでシャードに書き込むクラス
+    呼び出し側はキューに積むだけなので、ストリームの処理がディスクへの書き込みで待たされることはない
+    閉じたシャードのデータ数とツイートIDの範囲を "index.json" に記録する
+    """
+    def __init__(self, folder="data/archive", compression="gzip", shard_bytes=268435456, shard_seconds=3600, flush_interval=10.0):
+        """
+        コンストラクタ
+        @param folder 保存するフォルダ (種類ごとのサブフォルダにシャードを保存する)
+        @param compression 圧縮形式 ("gzip" か "zstd"、zstandard がなければ "gzip" になる)
+        @param shard_bytes 一つのシャードに書き込む圧縮前のバイト数の目安
+        @param shard_seconds 一つのシャードに書き込む秒数の目安
+        @param flush_interval 書き出す間隔 (秒)
+        """
+        if compression not in SHARD_SUFFIXES:
+            raise ValueError("unknown compression: " + str(compression))
+        if compression == "zstd" and zstandard is None:
+            print('ON ARCHIVE: zstandard is not installed, using gzip')
+            compression = "gzip"
+
+        self.folder = folder
+        self.shard_bytes = shard_bytes
+        self.shard_seconds = shard_seconds
+        self.flush_interval = flush_interval
+        self.index_path = os.path.join(folder, "index.json")
+
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        # 索引を読み込み、前回閉じられなかったシャードを索引に加える
+        self.index = self.recover()
+        self.writers = {kind: ShardWriter(folder, kind, compression, self.next_number(kind)) for kind in KINDS}
+
+        self.tasks = queue.Queue()
+        self.thread = threading.Thread(target=self.work, name="archive", daemon=True)
+        self.thread.start()
+
+    def recover(self):
+        """
+        索引を読み込み、索引にないシャードを読めたところまで索引に加える
+        @return 索引のシャードの情報のリスト
+        """
+        index = []
+        if os.path.isfile(self.index_path):
+            with open(self.index_path, 'rt', encoding='utf-8') as f:
+                index = json.load(f)['shards']
+
+        indexed = set([shard['file'] for shard in index])
+        added = False
+        for kind in KINDS:
+            folder = os.path.join(self.folder, kind)
+            if not os.path.isdir(folder):
+                continue
+            for name in sorted(os.listdir(folder)):
+                name = kind_path(kind, name)
+                if name in indexed or not name.endswith(tuple(SHARD_SUFFIXES.values())):
+                    continue
+                path = os.path.join(self.folder, name)
+                messages, min_id, max_id = read_ids(path)
+                mtime = os.path.getmtime(path)
+                index.append({
+                    'kind': kind, 'file': name, 'messages': messages, 'bytes': None,
+                    'min_id': min_id, 'max_id': max_id, 'opened': None, 'closed': mtime
+                })
+                added = True
+
+        if added:
+            self.save_index(index)
+        return index
+
+    def next_number(self, kind):
+        """
+        次に書き込むシャード番号を求める
+        @param kind データの種類
+        @return シャード番号
+        """
+        numbers = [int(shard['file'].split("_")[-1].split(".")[0]) for shard in self.index if shard['kind'] == kind]
+        return max(numbers) + 1 if numbers else 0
+
+    def save_index(self, index):
+        """
+        索引を保存する
+        @param index シャードの情報のリスト
+        """
+        atomic_write(self.index_path, json.dumps({'shards': index}, ensure_ascii=False).encode('utf-8'))
+
+    def stream(self, data, tweet_id=None):
+        """
+        ストリームから受け取ったデータを書き込みに積む
+        @param data json形式のデータ
+        @param tweet_id データのツイートID (IDを持たないデータはNone)
+        """
+        self.tasks.put(("stream", data, tweet_id))
+
+    def lookup(self, statuses):
+        """
+        リプライ先の取得結果を書き込みに積む
+        @param statuses 取得したツイートのリスト (元のjsonを _json に持つもの)
+        """
+        for status in statuses:
+            self.tasks.put(("lookup", status, status.id))
+
+    def work(self):
+        """キューに積まれたデータをシャードに書き込むスレッドの処理"""
+        flushed_at = time.time()
+        while True:
+            try:
+                tasks = [self.tasks.get(timeout=1.0)]
+            except queue.Empty:
+                tasks = []
+
+            # 積まれているデータをまとめて書き込む
+            while True:
+                try:
+                    tasks.append(self.tasks.get_nowait())
+                except queue.Empty:
+                    break
+
+            closing = None in tasks
+            lines = {kind: [] for kind in KINDS}
+            ids = {kind: [] for kind in KINDS}
+            for task in tasks:
+                if task is None:
+                    continue
+                kind, data, tweet_id = task
+                if kind == "stream":
+                    lines[kind].append(data.strip() + "\n")
+                else:
+                    lines[kind].append(json.dumps(data._json, ensure_ascii=False) + "\n")
+                ids[kind].append(tweet_id)
+
+            closed = []
+            for kind, writer in self.writers.items():
+                if lines[kind]:
+                    writer.write(lines[kind], ids[kind])
+                if writer.file is not None and (closing or writer.size >= self.shard_bytes or
+                time.time() - writer.opened >= self.shard_seconds):
+                    closed.append(writer.close())
+
+            if closed:
+                self.index += closed
+                self.save_index(self.index)
+            elif time.time() - flushed_at >= self.flush_interval:
+                for writer in self.writers.values():
+                    writer.flush()
+                flushed_at = time.time()
+
+            if closing:
+                return
+
+    def close(self):
+        """積まれているデータをすべて書き込んでからシャードを閉じ、索引を保存する"""
+        self.tasks.put(None)
+        self.thread.join()
@@ -0,0 +1,139 @@
+# coding: utf-8
+
+"""ストリームのデータのデコードを従来の実装とリプライでないデータを先に捨てる実装で比較するベンチマーク"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import os
+import sys
+import json
+import time
+import random
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stream_decoder import StreamDecoder, loads
+from corpus import generate_tweet
+
+
+# 生成するデータ数
+N_MESSAGES = 200000
+# リプライとリツイートの割合
+REPLY_RATIO = 0.2
+RETWEET_RATIO = 0.3
+
+
+def make_user(rand):
+    """
+    ストリームのツイートに含まれるユーザの構造体を生成する
+    @param rand 乱数生成器
+    @return ユーザの構造体
+    """
+    user_id = rand.randint(1, 10 ** 10)
+    return {
+        'id': user_id, 'id_str': str(user_id), 'name': "user" + str(user_id), 'screen_name': "user_" + str(user_id),
+        'location': "日本", 'url': None, 'description': generate_tweet(rand, 0.0), 'protected': False, 'verified': False,
+        'followers_count': rand.randint(0, 10000), 'friends_count': rand.randint(0, 10000), 'listed_count': 0,
+        'favourites_count': rand.randint(0, 10000), 'statuses_count': rand.randint(0, 100000),
+        'created_at': "Mon Apr 01 00:00:00 +0000 2019", 'lang': "ja", 'profile_image_url_https': "https://pbs.twimg.com/x.jpg",
+        'default_profile': True, 'following': None, 'follow_request_sent': None, 'notifications': None
+    }
+
+
+def make_message(rand, kind):
+    """
+    ストリームに流れる形式のツイートデータを生成する
+    @param rand 乱数生成器
+    @param kind "reply"、"retweet"、"tweet" のいずれか
+    @return ツイートデータの構造体
+    """
+    tweet_id = rand.randint(10 ** 18, 2 * 10 ** 18)
+    reply_to = rand.randint(10 ** 18, 2 * 10 ** 18) if kind == "reply" else None
+    message = {
+        'created_at': "Mon Apr 01 00:00:00 +0000 2019", 'id': tweet_id, 'id_str': str(tweet_id),
+        'text': generate_tweet(rand), 'source': "<a href=\"https://mobile.twitter.com\">Twitter Web App</a>",
+        'truncated': False, 'in_reply_to_status_id': reply_to, 'in_reply_to_status_id_str': str(reply_to) if reply_to else None,
+        'in_reply_to_user_id': None, 'in_reply_to_user_id_str': None, 'in_reply_to_screen_name': None,
+        'user': make_user(rand), 'geo': None, 'coordinates': None, 'place': None, 'contributors': None,
+        'is_quote_status': False, 'quote_count': 0, 'reply_count': 0, 'retweet_count': 0, 'favorite_count': 0,
+        'entities': {'hashtags': [], 'urls': [], 'user_mentions': [], 'symbols': []},
+        'favorited': False, 'retweeted': False, 'filter_level': "low", 'lang': "ja", 'timestamp_ms': "1554076800000"
+    }
+    if kind == "retweet":
+        # リツイートの元のツイートはリプライであることもある
+        message['retweeted_status'] = make_message(rand, "reply" if rand.random() < 0.3 else "tweet")
+    return message
+
+
+def make_sample(n):
+    """
+    ストリームのデータの標本を生成する
+    @param n データ数
+    @return json形式のデータのリスト
+    """
+    rand = random.Random(0)
+    sample = []
+    for _ in range(n):
+        r = rand.random()
+        kind = "reply" if r < REPLY_RATIO else "retweet" if r < REPLY_RATIO + RETWEET_RATIO else "tweet"
+        sample.append(json.dumps(make_message(rand, kind), ensure_ascii=False, separators=(",", ":")) + "\r\n")
+    return sample
+
+
+def legacy_decode(data):
+    """
+    従来の実装 (すべてのデータをjsonモジュールでデコードする)
+    @param data json形式のデータ
+    @return on_status が使う項目のリスト (リプライでなければNone)
+    """
+    raw = json.loads(data)
+    if isinstance(raw.get('in_reply_to_status_id'), int):
+        return [raw['in_reply_to_status_id'], raw['user']['id'], raw['text'], raw['id']]
+    return None
+
+
+def measure(decode, sample):
+    """
+    デコードのCPU時間を計測する
+    @param decode デコードする関数
+    @param sample json形式のデータのリスト
+    @return CPU秒数
+    @return デコード結果のリスト
+    """
+    start = time.process_time()
+    results = [decode(data) for data in sample]
+    return time.process_time() - start, results
+
+
+def main():
+    """結果の一致を確認した上で、デコードせずに捨てたデータの割合と削減したCPU時間を出力する"""
+    # 記録したストリームのファイルかフォルダが指定されればそれを標本にする
+    if len(sys.argv) > 1:
+        from replay import iter_records
+        sample = list(iter_records(sys.argv[1:]))
+    else:
+        sample = make_sample(N_MESSAGES)
+
+    decoder = StreamDecoder()
+    legacy_time, legacy_results = measure(legacy_decode, sample)
+    fast_time, fast_results = measure(decoder.decode, sample)
+
+    if legacy_results != fast_results:
+        print("results differ")
+        sys.exit(1)
+
+    stats = decoder.stats()
+    print("messages: %d (%d[MB]), decoder: %s" % (len(sample), sum(map(len, sample)) // 1048576, loads.__module__))
+    print("  skipped : %6.1f%% without decoding" % (100.0 * stats['skipped'] / stats['messages']))
+    print("  replys  : %6.1f%%" % (100.0 * stats['replys'] / stats['messages']))
+    print("  legacy  : %8.2f[sec] (%5.1f[usec/message])" % (legacy_time, 1e6 * legacy_time / len(sample)))
+    print("  fast    : %8.2f[sec] (%5.1f[usec/message])" % (fast_time, 1e6 * fast_time / len(sample)))
+    print("  saved   : %6.1f%% CPU" % (100.0 * (1 - fast_time / legacy_time)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# coding: utf-8
+
+"""ツイートIDの重複判定をリストとTweetIdSetで比較するマイクロベンチマーク"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from dedup import TweetIdSet
+
+
+# 容量と計測回数
+CAPACITY = 1000000
+SIZES = [10000, 100000, 1000000]
+ADD_ROUNDS = 200
+LOOKUP_ROUNDS = 20
+BATCH_SIZE = 100
+
+
+def bench_list(ids, new_ids, queries):
+    """
+    従来のリストによる実装を計測する
+    @param ids 事前に保持しているツイートID
+    @param new_ids 追加するツイートID
+    @param queries 所属判定するツイートIDのバッチのリスト
+    @return 追加1回あたりの秒数
+    @return バッチ1回あたりの所属判定の秒数
+    """
+    tweet_ids = list(ids)
+
+    start = time.perf_counter()
+    for tweet_id in new_ids:
+        tweet_ids = tweet_ids[-CAPACITY:]
+        tweet_ids.append(tweet_id)
+    add_time = (time.perf_counter() - start) / len(new_ids)
+
+    start = time.perf_counter()
+    for batch in queries:
+        for tweet_id in batch:
+            tweet_id not in tweet_ids
+    lookup_time = (time.perf_counter() - start) / len(queries)
+
+    return add_time, lookup_time
+
+
+def bench_set(ids, new_ids, queries):
+    """
+    TweetIdSetによる実装を計測する
+    @param ids 事前に保持しているツイートID
+    @param new_ids 追加するツイートID
+    @param queries 所属判定するツイートIDのバッチのリスト
+    @return 追加1回あたりの秒数
+    @return バッチ1回あたりの所属判定の秒数
+    """
+    tweet_ids = TweetIdSet(CAPACITY)
+    tweet_ids.extend(ids)
+
+    start = time.perf_counter()
+    for tweet_id in new_ids:
+        tweet_ids.add(tweet_id)
+    add_time = (time.perf_counter() - start) / len(new_ids)
+
+    start = time.perf_counter()
+    for batch in queries:
+        for tweet_id in batch:
+            tweet_id not in tweet_ids
+    lookup_time = (time.perf_counter() - start) / len(queries)
+
+    return add_time, lookup_time
+
+
+def main():
+    """各サイズでリストとTweetIdSetを比較して出力する"""
+    rand = random.Random(0)
+
+    for size in SIZES:
+        ids = [rand.getrandbits(62) for _ in range(size)]
+        new_ids = [rand.getrandbits(62) for _ in range(ADD_ROUNDS)]
+        # 半分は存在するID、半分は存在しないIDで所属判定する
+        queries = [
+            [rand.choice(ids) if i % 2 else rand.getrandbits(62) for i in range(BATCH_SIZE)]
+            for _ in range(LOOKUP_ROUNDS)
+        ]
+
+        list_add, list_lookup = bench_list(ids, new_ids, queries)
+        set_add, set_lookup = bench_set(ids, new_ids, queries)
+
+        print("size: " + str(size))
+        print("  list       : add %10.2f[us], lookup(%d) %10.2f[us]" % (list_add * 1e6, BATCH_SIZE, list_lookup * 1e6))
+        print("  TweetIdSet : add %10.2f[us], lookup(%d) %10.2f[us]" % (set_add * 1e6, BATCH_SIZE, set_lookup * 1e6))
+        print("  speedup    : add %10.1fx, lookup %10.1fx" % (list_add / set_add, list_lookup / set_lookup), flush=True)
+
+
+if __name__ == '__main__':
+    main()
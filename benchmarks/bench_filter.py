@@ -0,0 +1,196 @@
+# coding: utf-8
+
+"""入出力コーパスのフィルタリングを従来の実装と行をまとめて判定する実装で比較するベンチマーク"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import os
+import sys
+import copy
+import time
+import shutil
+import tempfile
+import yaml
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from filter import TweetFilter
+from pipeline import TextPipeline
+from corpus import generate_tweets
+
+
+# 変換するツイート数
+N_TWEETS = 20000
+# 入出力コーパスの行数 (変換したツイートを繰り返して水増しする)
+N_LINES = 200000
+
+
+class LegacyFilter(TweetFilter):
+    """従来の実装で入出力コーパスをフィルタリングするクラス"""
+    def turn_filtering(self):
+        """従来の実装 (6つのファイルを1行ずつ読み込んで判定する)"""
+        cnt, cnt_ = 0, 0
+
+        # ファイルを開く
+        f_inp = open("data/" + self.inp_fp, 'r', encoding='utf-8')
+        f_tar = open("data/" + self.tar_fp, 'r', encoding='utf-8')
+        f_inp_fi = open("filtered/" + self.inp_fp, 'w', encoding='utf-8')
+        f_tar_fi = open("filtered/" + self.tar_fp, 'w', encoding='utf-8')
+
+        if os.path.isfile("data/" + self.inp_std_fp) and os.path.isfile("data/" + self.tar_std_fp):
+            std = True
+            f_inp_std = open("data/" + self.inp_std_fp, 'r', encoding='utf-8')
+            f_tar_std = open("data/" + self.tar_std_fp, 'r', encoding='utf-8')
+            f_inp_std_fi = open("filtered/" + self.inp_std_fp, 'w', encoding='utf-8')
+            f_tar_std_fi = open("filtered/" + self.tar_std_fp, 'w', encoding='utf-8')
+        else:
+            std = False
+
+        if os.path.isfile("data/" + self.inp_prt_fp) and os.path.isfile("data/" + self.tar_prt_fp):
+            prt = True
+            f_inp_prt = open("data/" + self.inp_prt_fp, 'r', encoding='utf-8')
+            f_tar_prt = open("data/" + self.tar_prt_fp, 'r', encoding='utf-8')
+            f_inp_prt_fi = open("filtered/" + self.inp_prt_fp, 'w', encoding='utf-8')
+            f_tar_prt_fi = open("filtered/" + self.tar_prt_fp, 'w', encoding='utf-8')
+        else:
+            prt = False
+
+        # ファイルから読み込む
+        line_inp = f_inp.readline()
+        line_tar = f_tar.readline()
+        line_inp_std = f_inp_std.readline() if std else None
+        line_tar_std = f_tar_std.readline() if std else None
+        line_inp_prt = f_inp_prt.readline() if prt else None
+        line_tar_prt = f_tar_prt.readline() if prt else None
+
+        while line_inp:
+            cnt += 1
+
+            # 指定した品詞を除外
+            if prt:
+                line_inp, line_inp_std, line_inp_prt = self.del_part(line_inp, line_inp_std, line_inp_prt)
+                line_tar, line_tar_std, line_tar_prt = self.del_part(line_tar, line_tar_std, line_tar_prt)
+
+            # 適切なデータであるか判定
+            if self.text_check(line_inp) and self.text_check(line_tar) and self.diff_check(line_inp, line_tar) and\
+            (not prt or (self.part_check(line_inp_prt) and self.part_check(line_tar_prt))):
+                cnt_ += 1
+
+                # ファイルに書き込む
+                f_inp_fi.write(line_inp)
+                f_tar_fi.write(line_tar)
+                if std:
+                    f_inp_std_fi.write(line_inp_std)
+                    f_tar_std_fi.write(line_tar_std)
+                if prt:
+                    f_inp_prt_fi.write(line_inp_prt)
+                    f_tar_prt_fi.write(line_tar_prt)
+
+            # ファイルから読み込む
+            line_inp = f_inp.readline()
+            line_tar = f_tar.readline()
+            line_inp_std = f_inp_std.readline() if std else None
+            line_tar_std = f_tar_std.readline() if std else None
+            line_inp_prt = f_inp_prt.readline() if prt else None
+            line_tar_prt = f_tar_prt.readline() if prt else None
+
+        # ファイルを閉じる
+        f_inp.close()
+        f_tar.close()
+        f_inp_fi.close()
+        f_tar_fi.close()
+        if std:
+            f_inp_std.close()
+            f_tar_std.close()
+            f_inp_std_fi.close()
+            f_tar_std_fi.close()
+        if prt:
+            f_inp_prt.close()
+            f_tar_prt.close()
+            f_inp_prt_fi.close()
+            f_tar_prt_fi.close()
+
+        print(self.inp_fp + "/" + self.tar_fp + ": " + str(cnt) + " -> " + str(cnt_))
+
+
+def make_corpus(config, folder):
+    """
+    合成したツイートから入出力コーパスを作成する
+    @param config 設定ファイル情報
+    @param folder 作成するフォルダ
+    """
+    pipeline = TextPipeline(config)
+    tweets = [result for result in pipeline.process_batch(generate_tweets(N_TWEETS, noise=0.0)) if result and result[0] != ""]
+
+    fn = config['filename']
+    os.makedirs(os.path.join(folder, "data"))
+    for i, suffix in enumerate(["", "_" + fn['standard_file'], "_" + fn['part_file']]):
+        lines = [tweets[j % len(tweets)][i] + "\n" for j in range(N_LINES + 1)]
+        with open(os.path.join(folder, "data", fn['input_file'] + suffix + ".txt"), 'w', encoding='utf-8') as f:
+            f.write("".join(lines[:-1]))
+        with open(os.path.join(folder, "data", fn['target_file'] + suffix + ".txt"), 'w', encoding='utf-8') as f:
+            f.write("".join(lines[1:]))
+
+
+def measure(tweet_filter):
+    """
+    フィルタリングの処理時間を計測する
+    @param tweet_filter フィルタリングを行うインスタンス
+    @return 秒数
+    @return フィルタリング結果のファイルの内容
+    """
+    if os.path.isdir("filtered"):
+        shutil.rmtree("filtered")
+    os.mkdir("filtered")
+
+    start = time.perf_counter()
+    tweet_filter.turn_filtering()
+    elapsed = time.perf_counter() - start
+
+    results = {}
+    for name in sorted(os.listdir("filtered")):
+        with open(os.path.join("filtered", name), 'r', encoding='utf-8') as f:
+            results[name] = f.read()
+    return elapsed, results
+
+
+def main():
+    """出力の一致を確認した上で、従来の実装と行をまとめて判定する実装の処理時間を出力する"""
+    config = yaml.load(stream=open(os.path.join(ROOT, "config/config.yml"), 'rt', encoding='utf-8'), Loader=yaml.SafeLoader)
+
+    # 品詞の除去と存在判定を多く行う設定も試す
+    strict = copy.deepcopy(config)
+    for key in ["filler", "impression_verb", "three_dots", "adverb"]:
+        strict['filter']['dump'][key] = False
+    for key in ["particle", "auxiliary_verb"]:
+        strict['filter']['exist'][key] = True
+
+    cwd = os.getcwd()
+    folder = tempfile.mkdtemp()
+    try:
+        make_corpus(config, folder)
+        os.chdir(folder)
+
+        for name, cfg in [("default", config), ("strict", strict)]:
+            legacy_time, legacy_results = measure(LegacyFilter(cfg))
+            chunk_time, chunk_results = measure(TweetFilter(cfg))
+
+            if legacy_results != chunk_results:
+                print("results differ")
+                sys.exit(1)
+
+            print(name + ": " + str(N_LINES) + " lines")
+            print("  legacy : %8.2f[sec]" % legacy_time)
+            print("  chunk  : %8.2f[sec]" % chunk_time)
+            print("  speedup: %8.1fx" % (legacy_time / chunk_time))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# coding: utf-8
+
+"""コーパスをシャードに分けてワーカープロセスでフィルタリングした場合の処理時間をワーカー数ごとに計測するベンチマーク"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import os
+import sys
+import copy
+import time
+import random
+import shutil
+import hashlib
+import tempfile
+import yaml
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from filter import TweetFilter
+from pipeline import TextPipeline
+from corpus_writer import CorpusLayout
+from corpus import generate_tweets
+
+
+# 変換するツイート数
+N_TWEETS = 20000
+# 入力文のファイルの行数の目安 (変換したツイートを繰り返して水増しする)
+N_LINES = 10000000
+# 一度に書き込む対話数
+WRITE_DIALOGS = 10000
+
+
+def make_corpus(config, folder, n_lines):
+    """
+    合成したツイートから入出力コーパスと対話コーパスを作成する
+    @param config 設定ファイル情報
+    @param folder 作成するフォルダ
+    @param n_lines 入力文のファイルの行数の目安
+    @return 入力文のファイルの行数
+    """
+    pipeline = TextPipeline(config)
+    tweets = [result for result in pipeline.process_batch(generate_tweets(N_TWEETS, noise=0.0)) if result and result[0] != ""]
+
+    layout = CorpusLayout(config, os.path.join(folder, "data"))
+    os.makedirs(os.path.join(folder, "data"))
+    files = {path: open(path, 'w', encoding='utf-8') for path in layout.paths()}
+
+    # 2から6発話の対話を、入力文のファイルが指定した行数になるまで書き込む
+    rand = random.Random(0)
+    lines = 0
+    while lines < n_lines:
+        buffers = {path: [] for path in files}
+        for _ in range(WRITE_DIALOGS):
+            dialog = [tweets[rand.randrange(len(tweets))] for _ in range(rand.randint(2, 6))]
+            for path, records in layout.records(dialog).items():
+                buffers[path] += records
+            lines += len(dialog) - 1
+        for path, records in buffers.items():
+            files[path].write("".join([record + "\n" for record in records]))
+
+    for f in files.values():
+        f.close()
+    return lines
+
+
+def measure(config, processes):
+    """
+    フィルタリングの処理時間を計測する
+    @param config 設定ファイル情報
+    @param processes ワーカープロセス数 (0なら並列化しない)
+    @return 秒数
+    @return フィルタリング結果の各ファイルのハッシュ値
+    """
+    if os.path.isdir("filtered"):
+        shutil.rmtree("filtered")
+
+    config = copy.deepcopy(config)
+    config['parallel']['processes'] = processes
+
+    start = time.perf_counter()
+    TweetFilter(config).filtering()
+    elapsed = time.perf_counter() - start
+
+    digests = {}
+    for name in sorted(os.listdir("filtered")):
+        digest = hashlib.sha1()
+        with open(os.path.join("filtered", name), 'rb') as f:
+            for block in iter(lambda: f.read(1048576), b""):
+                digest.update(block)
+        digests[name] = digest.hexdigest()
+    return elapsed, digests
+
+
+def main():
+    """出力の一致を確認した上で、並列化しない場合と1からCPU数までのワーカープロセスの処理時間を出力する"""
+    config = yaml.load(stream=open(os.path.join(ROOT, "config/config.yml"), 'rt', encoding='utf-8'), Loader=yaml.SafeLoader)
+    max_processes = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+    n_lines = int(sys.argv[2]) if len(sys.argv) > 2 else N_LINES
+
+    cwd = os.getcwd()
+    folder = tempfile.mkdtemp()
+    try:
+        n_lines = make_corpus(config, folder, n_lines)
+        os.chdir(folder)
+
+        size = sum([os.path.getsize(os.path.join("data", name)) for name in os.listdir("data")])
+        print("lines: " + str(n_lines) + " (" + str(size // 1048576) + "[MB])")
+
+        serial_time, serial_digests = measure(config, 0)
+        print("  serial      : %8.2f[sec]" % serial_time)
+
+        for processes in range(1, max_processes + 1):
+            pool_time, pool_digests = measure(config, processes)
+            if pool_digests != serial_digests:
+                print("results differ")
+                sys.exit(1)
+            print("  processes %d : %8.2f[sec] (%4.2fx)" % (processes, pool_time, serial_time / pool_time))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+# coding: utf-8
+
+"""形態素解析を従来の実装とMorphemeAnalyzerで比較するベンチマーク"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import os
+import re
+import sys
+import time
+import unicodedata
+import yaml
+import MeCab
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from normalizer import TextNormalizer
+from morpheme import MorphemeAnalyzer
+from corpus import generate_tweets
+
+
+# 計測するツイート数
+N_TWEETS = 10000
+
+# 従来の実装で用いる分かち書きするモジュール
+tagger = MeCab.Tagger('-Ochasen')
+
+
+def legacy_del_morpheme(text, pt):
+    """
+    従来の実装 (1行ずつparseToNodeで解析し、形態素ごとに品詞を判定する)
+    @param text ツイートデータのテキスト
+    @param pt 各品詞に割り当てるトークン
+    @return 特定の形態素を除去したツイートデータのテキスト
+    @return 標準形/表層系のテキスト
+    @return 品詞列
+    """
+    lines = text.strip().split("\n")
+    result, standard, part = "", "", ""
+
+    for line in lines:
+        add_result, add_standard, add_part = "", "", ""
+        node = tagger.parseToNode(line)
+
+        while node:
+            feature = node.feature.split(',')
+            if feature[0] == "BOS/EOS":
+                node = node.next
+                continue
+
+            if node.surface in [".", "..", "!", "?", "ノ", "ーノ", "ロ", "艸", "屮", "罒", "灬", "彡", "ヮ", "益",\
+            "皿", "タヒ", "厂", "厂厂", "啞", "卍", "ノノ", "ノノノ", "ノシ", "ノツ",\
+            "癶", "癶癶", "乁", "乁厂", "マ", "んご", "んゴ", "ンゴ", "にき", "ニキ", "ナカ", "み", "ミ"]:
+                node = node.next
+                continue
+
+            if node.surface in ["つ", "っ"] and add_result == "":
+                node = node.next
+                continue
+
+            if feature[0] == "名詞":
+                if feature[1] in ["サ変接続", "一般", "形容動詞語幹", "固有名詞"]:
+                    token = pt['noun_main']
+                else:
+                    token = pt['noun_sub']
+            elif feature[0] == "動詞":
+                if feature[1] in ["自立"]:
+                    token = pt['verb_main']
+                else:
+                    token = pt['verb_sub']
+            elif feature[0] == "形容詞":
+                if feature[1] in ["自立"]:
+                    token = pt['adjective_main']
+                else:
+                    token = pt['adjective_sub']
+            elif feature[0] == "副詞":
+                token = pt['adverb']
+            elif feature[0] == "助詞":
+                token = pt['particle']
+            elif feature[0] == "助動詞":
+                token = pt['auxiliary_verb']
+            elif feature[0] == "接続詞":
+                token = pt['conjunction']
+            elif feature[0] == "接頭詞":
+                token = pt['prefix']
+            elif feature[0] == "フィラー":
+                token = pt['filler']
+            elif feature[0] == "感動詞":
+                token = pt['impression_verb']
+            elif node.surface == "...":
+                token = pt['three_dots']
+            elif node.surface in ["。", "！", "？", "!?"]:
+                token = pt['phrase_point']
+            elif node.surface == "、":
+                token = pt['reading_point']
+            else:
+                token = pt['other']
+
+            add_result += node.surface + " "
+            if re.compile(r"[^ぁ-んァ-ヶｧ-ｳﾞ一-龠々ー～]").search(feature[6]) or\
+            token in [pt['three_dots'], pt['phrase_point'], pt['reading_point']] or\
+            node.surface in ["ー", "～"]:
+                add_standard += node.surface + " "
+            else:
+                add_standard += feature[6] + " "
+            add_part += token + " "
+
+            node = node.next
+
+        if add_result.strip() not in ["、", "。", "！", "？", "!?", "", "... 。", "... ！", "... ？", "... !?",\
+        "人 。", "つ 。", "っ 。", "笑 。", "笑 ！", "笑 ？", "笑 !?"]:
+            result += add_result
+            standard += add_standard
+            part += add_part
+
+    return result.strip(), standard.strip(), part.strip()
+
+
+def main():
+    """出力の一致を確認した上で、従来の実装とMorphemeAnalyzerの処理時間を出力する"""
+    config = yaml.load(stream=open(os.path.join(ROOT, "config/config.yml"), 'rt', encoding='utf-8'), Loader=yaml.SafeLoader)
+    pt = config['part']
+    analyzer = MorphemeAnalyzer(pt)
+
+    normalizer = TextNormalizer()
+    texts = [normalizer.normalize(unicodedata.normalize('NFKC', text)) for text in generate_tweets(N_TWEETS, noise=0.0)]
+
+    start = time.perf_counter()
+    legacy_results = [legacy_del_morpheme(text, pt) for text in texts]
+    legacy_time = (time.perf_counter() - start) / len(texts)
+
+    start = time.perf_counter()
+    analyzer_results = analyzer.analyze_batch(texts)
+    analyzer_time = (time.perf_counter() - start) / len(texts)
+
+    if legacy_results != analyzer_results:
+        print("results differ")
+        sys.exit(1)
+
+    info = analyzer.lookup.cache_info()
+    print("tweets: " + str(len(texts)) + " (cache hit rate: %.2f)" % (info.hits / (info.hits + info.misses)))
+    print("  legacy           : %8.2f[us/tweet]" % (legacy_time * 1e6))
+    print("  MorphemeAnalyzer : %8.2f[us/tweet]" % (analyzer_time * 1e6))
+    print("  speedup          : %8.1fx" % (legacy_time / analyzer_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+# coding: utf-8
+
+"""ツイートの正規化を従来の実装とTextNormalizerで比較するベンチマーク"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import os
+import re
+import sys
+import time
+import random
+import unicodedata
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from normalizer import TextNormalizer
+from corpus import generate_tweets
+
+
+# 計測するツイート数
+N_TWEETS = 20000
+# 一致を確認するランダムな記号列の数
+N_FUZZ = 100000
+FUZZ_CHARS = "、。！？!?,，.．〜～ー \n\r\t笑泣っ()（）あアｱﾞ漢a1々"
+
+
+def legacy_normalize(text):
+    """
+    従来の実装 (約40回の正規表現による置換)
+    @param text ツイートデータのテキスト
+    @return フィルタ処理を施したツイートデータのテキスト
+    """
+    text = re.sub(r"\([^笑泣嬉悲驚汗爆渋苦困死楽怒哀呆殴涙藁]+?\)", " ", text)
+    text = re.sub("[^ぁ-んァ-ヶｧ-ｳﾞ一-龠々ー～〜、。！？!?,，.．\r\n]", " ", text)
+
+    text = re.sub("[,，]", "、", text)
+    text = re.sub("[．.]", "。", text)
+    text = re.sub("〜", "～", text)
+    text = re.sub(r"、(\s*、)+|。(\s*。)+", "...", text)
+
+    text = re.sub("!+", "！", text)
+    text = re.sub(r"！(\s*！)+", "！", text)
+    text = re.sub(r"\?+", "？", text)
+    text = re.sub(r"？(\s*？)+", "？", text)
+
+    text = re.sub(r"～(\s*～)+", "～", text)
+    text = re.sub(r"ー(\s*ー)+", "ー", text)
+
+    text = re.sub("\r\n|\n|\r", "。", text)
+
+    text += "。"
+    text = re.sub(r"[、。](\s*[、。])+", "。", text)
+
+    text = re.sub(r"[。、！](\s*[。、！])+", "！", text)
+    text = re.sub(r"[。、？](\s*[。、？])+", "？", text)
+    text = re.sub(r"((！\s*)+？|(？\s*)+！)(\s*[！？])*", "!?", text)
+
+    for w in ["っ", "笑", "泣", "嬉", "悲", "驚", "汗", "爆", "渋", "苦", "困", "死", "楽", "怒", "哀", "呆", "殴", "涙", "藁"]:
+        text = re.sub(w + r"(\s*" + w + ")+", " " + w + " ", text)
+
+    text = re.sub(r"、\s*([笑泣嬉悲驚汗爆渋苦困死楽怒哀呆殴涙藁])\s*。", " \\1。", text)
+    text = re.sub(r"(。|！|？|!\?)\s*([笑泣嬉悲驚汗爆渋苦困死楽怒哀呆殴涙藁])\s*。", " \\2\\1", text)
+
+    text = re.sub("、", " 、 ", text)
+    text = re.sub("。", " 。\n", text)
+
+    text = re.sub(r"(\.\s*)+", " ... ", text)
+    text = re.sub("！", " ！\n", text)
+    text = re.sub("？", " ？\n", text)
+    text = re.sub(r"!\?", " !?\n", text)
+
+    text = re.sub(r"\n(\s*[～ー])+", "\n", text)
+
+    text = re.sub(r"^([\s\n]*[。、！？!?ー～]+)+", "", text)
+    text = re.sub("(.+?)\\1{3,}", "\\1\\1\\1", text)
+
+    return text
+
+
+def measure(normalize, texts):
+    """
+    1ツイートあたりの処理時間を計測する
+    @param normalize 正規化関数
+    @param texts テキストのリスト
+    @return 1ツイートあたりの秒数
+    @return 正規化結果のリスト
+    """
+    start = time.perf_counter()
+    results = [normalize(text) for text in texts]
+    return (time.perf_counter() - start) / len(texts), results
+
+
+def main():
+    """出力の一致を確認した上で、従来の実装とTextNormalizerの処理時間を出力する"""
+    normalizer = TextNormalizer()
+
+    # 記号の組み合わせで出力が一致するかを確認
+    rand = random.Random(0)
+    for _ in range(N_FUZZ):
+        text = "".join(rand.choice(FUZZ_CHARS) for _ in range(rand.randint(0, 16)))
+        if legacy_normalize(text) != normalizer.normalize(text):
+            print("results differ: " + repr(text))
+            sys.exit(1)
+
+    texts = [unicodedata.normalize('NFKC', text) for text in generate_tweets(N_TWEETS, noise=0.0)]
+
+    legacy_time, legacy_results = measure(legacy_normalize, texts)
+    normalizer_time, normalizer_results = measure(normalizer.normalize, texts)
+
+    if legacy_results != normalizer_results:
+        print("results differ")
+        sys.exit(1)
+
+    print("tweets: " + str(len(texts)) + " (fuzz: " + str(N_FUZZ) + ")")
+    print("  legacy         : %8.2f[us/tweet]" % (legacy_time * 1e6))
+    print("  TextNormalizer : %8.2f[us/tweet]" % (normalizer_time * 1e6))
+    print("  speedup        : %8.1fx" % (legacy_time / normalizer_time))
+
+
+if __name__ == '__main__':
+    main()
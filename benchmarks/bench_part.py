@@ -0,0 +1,140 @@
+# coding: utf-8
+
+"""品詞の除去と存在判定を従来の実装と品詞トークンを整数に変換する実装で比較するベンチマーク"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import os
+import sys
+import copy
+import time
+import numpy as np
+import yaml
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from filter import TweetFilter, PartRemoval
+from pipeline import TextPipeline
+from corpus import generate_tweets
+
+
+# 変換するツイート数
+N_TWEETS = 20000
+# 判定する行数 (変換したツイートを繰り返して水増しする)
+N_LINES = 200000
+
+
+class LegacyFilter(TweetFilter):
+    """従来の実装で品詞の除去と存在判定を行うクラス"""
+    def part_check(self, part):
+        """従来の実装 (存在しなければならない品詞ごとに品詞列を探す)"""
+        parts = part.strip().split()
+        for exist, token in zip(self.exist_list, self.token_list):
+            if exist and token not in parts:
+                return False
+        return True
+
+    def del_part(self, text, standard, part):
+        """従来の実装 (品詞ごとに token_list を探して文字列を連結する)"""
+        result_text, result_standard, result_part = "", "", ""
+        words, standards, parts = text.strip().split(), standard.strip().split() if standard else None, part.strip().split()
+
+        if standards:
+            for word, standard, part in zip(words, standards, parts):
+                if part in self.token_list:
+                    part_idx = self.token_list.index(part)
+                    if self.dump_list[part_idx]:
+                        result_text += word + " "
+                        result_standard += standard + " "
+                        result_part += part + " "
+        else:
+            for word, part in zip(words, parts):
+                if part in self.token_list:
+                    part_idx = self.token_list.index(part)
+                    if self.dump_list[part_idx]:
+                        result_text += word + " "
+                        result_part += part + " "
+
+        return result_text.strip() + "\n", result_standard.strip() + "\n" if standards else None, result_part.strip() + "\n"
+
+
+def make_lines(config):
+    """
+    合成したツイートから判定する行を作成する
+    @param config 設定ファイル情報
+    @return テキスト、標準形/表層形のテキスト、品詞列のリスト
+    """
+    pipeline = TextPipeline(config)
+    tweets = [result for result in pipeline.process_batch(generate_tweets(N_TWEETS, noise=0.0)) if result and result[0] != ""]
+    return [[tweets[j % len(tweets)][i] + "\n" for j in range(N_LINES)] for i in range(3)]
+
+
+def measure(tweet_filter, texts, standards, parts):
+    """
+    一行ずつ品詞の除去と存在判定を行う処理時間を計測する
+    @param tweet_filter 判定を行うインスタンス
+    @param texts テキストのリスト
+    @param standards 標準形/表層形のテキストのリスト
+    @param parts 品詞列のリスト
+    @return 秒数
+    @return 品詞除去された行と判定結果のリスト
+    """
+    start = time.perf_counter()
+    results = []
+    for text, standard, part in zip(texts, standards, parts):
+        text, standard, part = tweet_filter.del_part(text, standard, part)
+        results.append((text, standard, part, tweet_filter.part_check(part)))
+    return time.perf_counter() - start, results
+
+
+def measure_block(tweet_filter, texts, standards, parts):
+    """
+    行をまとめて品詞の除去と存在判定を行う処理時間を計測する
+    @param tweet_filter 判定を行うインスタンス
+    @param texts テキストのリスト
+    @param standards 標準形/表層形のテキストのリスト
+    @param parts 品詞列のリスト
+    @return 秒数
+    @return 品詞除去された行と判定結果のリスト
+    """
+    start = time.perf_counter()
+    removal = PartRemoval(texts, standards, parts, tweet_filter.coder, 0)
+    mask = removal.exist_mask(np.arange(len(texts)))
+    results = [removal.line(i) + (bool(mask[i]),) for i in range(len(texts))]
+    return time.perf_counter() - start, results
+
+
+def main():
+    """結果の一致を確認した上で、従来の実装と整数に変換する実装の処理時間を出力する"""
+    config = yaml.load(stream=open(os.path.join(ROOT, "config/config.yml"), 'rt', encoding='utf-8'), Loader=yaml.SafeLoader)
+
+    # 品詞の除去と存在判定を多く行う設定も試す
+    strict = copy.deepcopy(config)
+    for key in ["filler", "impression_verb", "three_dots", "adverb"]:
+        strict['filter']['dump'][key] = False
+    for key in ["particle", "auxiliary_verb"]:
+        strict['filter']['exist'][key] = True
+
+    texts, standards, parts = make_lines(config)
+
+    for name, cfg in [("default", config), ("strict", strict)]:
+        legacy_time, legacy_results = measure(LegacyFilter(cfg), texts, standards, parts)
+        coded_time, coded_results = measure(TweetFilter(cfg), texts, standards, parts)
+        block_time, block_results = measure_block(TweetFilter(cfg), texts, standards, parts)
+
+        if legacy_results != coded_results or legacy_results != [tuple(result) for result in block_results]:
+            print("results differ")
+            sys.exit(1)
+
+        print(name + ": " + str(N_LINES) + " lines")
+        print("  legacy : %8.2f[sec]" % legacy_time)
+        print("  coded  : %8.2f[sec] (%4.1fx)" % (coded_time, legacy_time / coded_time))
+        print("  block  : %8.2f[sec] (%4.1fx)" % (block_time, legacy_time / block_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# coding: utf-8
+
+"""本文の変換をプロセスプールで行った場合のスループットをワーカー数ごとに計測するベンチマーク"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import os
+import sys
+import time
+import yaml
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from pipeline import TextPipeline, PipelinePool
+from corpus import generate_tweets
+
+
+# 計測するツイート数
+N_TWEETS = 20000
+# プロセスプールに一度に送るツイート数
+BATCH_SIZE = 50
+
+
+def measure_inline(pipeline, texts):
+    """
+    単一プロセスでのスループットを計測する
+    @param pipeline 変換処理
+    @param texts ツイートの本文のリスト
+    @return 1秒あたりのツイート数
+    @return 変換結果のリスト
+    """
+    start = time.perf_counter()
+    results = []
+    for i in range(0, len(texts), BATCH_SIZE):
+        results += pipeline.process_batch(texts[i:i + BATCH_SIZE])
+    return len(texts) / (time.perf_counter() - start), results
+
+
+def measure_pool(config, processes, texts):
+    """
+    プロセスプールでのスループットを計測する (プロセスの起動時間は含めない)
+    @param config 設定ファイル情報
+    @param processes ワーカープロセス数
+    @param texts ツイートの本文のリスト
+    @return 1秒あたりのツイート数
+    @return 変換結果のリスト
+    """
+    pool = PipelinePool(config, processes)
+    pool.map(texts[:processes])
+
+    results = []
+    start = time.perf_counter()
+    for i in range(0, len(texts), BATCH_SIZE):
+        pool.submit(None, texts[i:i + BATCH_SIZE], lambda items, batch: results.extend(batch))
+    pool.close()
+    return len(texts) / (time.perf_counter() - start), results
+
+
+def main():
+    """単一プロセスと1からCPU数までのワーカープロセスのスループットを出力する"""
+    config = yaml.load(stream=open(os.path.join(ROOT, "config/config.yml"), 'rt', encoding='utf-8'), Loader=yaml.SafeLoader)
+    max_processes = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+
+    texts = generate_tweets(N_TWEETS)
+
+    inline_tps, inline_results = measure_inline(TextPipeline(config), texts)
+    print("tweets: " + str(len(texts)) + " (batch: " + str(BATCH_SIZE) + ")")
+    print("  inline      : %10.0f[tweets/sec]" % inline_tps)
+
+    for processes in range(1, max_processes + 1):
+        pool_tps, pool_results = measure_pool(config, processes, texts)
+        if pool_results != inline_results:
+            print("results differ")
+            sys.exit(1)
+        print("  processes %d : %10.0f[tweets/sec] (%4.2fx)" % (processes, pool_tps, pool_tps / inline_tps))
+
+
+if __name__ == '__main__':
+    main()
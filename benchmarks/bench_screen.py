@@ -0,0 +1,81 @@
+# coding: utf-8
+
+"""ツイートの除外判定を従来の実装とTextScreenerで比較するベンチマーク"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import os
+import re
+import sys
+import time
+import unicodedata
+import yaml
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from screen import TextScreener
+from corpus import generate_tweets
+
+
+# 計測するツイート数
+N_TWEETS = 20000
+
+
+def legacy_check(text):
+    """
+    従来の実装 (呼び出すたびに正規表現をコンパイルする)
+    @param text ツイートデータのテキスト
+    @return True: 適切、False: 不適切
+    """
+    if re.compile(r"((ftp|http|https):\/\/(\w+:{0,1}\w*@)?(\S+)(:[0-9]+)?(\/|\/([\w#!:.?+=&amp;%@!&#45;\/]))?)").search(text):
+        return False
+    if re.compile(r"(?:^|[^ーー゛゜々ヾヽぁ-ヶ一-龠a-zA-Z0-9&_/>]+)[#＃]([ー゛゜々ヾヽぁ-ヶ一-龠a-zA-Z0-9_]*[ー゛゜々ヾヽぁ-ヶ一-龠a-zA-Z]+[ー゛゜々ヾヽぁ-ヶ一-龠a-zA-Z0-9_]*)").search(text):
+        return False
+    if re.compile("[a-zA-Z0-9]").search(text):
+        return False
+    if re.compile("アイコン|あいこん|トプ|とぷ|ヘッダー|へっだー|たぐ|タグ|ツイ|つい|ふぉろ|フォロ|リプ|りぷ|リツ|りつ|いいね|お気に入り|ふぁぼ|ファボ|リム|りむ|ブロック|ぶろっく|スパブロ|すぱぶろ|ブロ解|ぶろ解|鍵|アカ|垢|ダイレクトメッセージ|巻き込|まきこ").search(text):
+        return False
+    if re.compile("ナカーマ|イキスギ|いきすぎ|スヤ|すや|うぇーい|ウェーイ|おなしゃす|アザッス|あざっす|ドヤ|どや|ワカリミ|わかりみ|分かりみ").search(text):
+        return False
+    return True
+
+
+def measure(check, texts):
+    """
+    判定のスループットを計測する
+    @param check 判定関数
+    @param texts テキストのリスト
+    @return 1秒あたりのツイート数
+    @return 判定結果のリスト
+    """
+    start = time.perf_counter()
+    results = [check(text) for text in texts]
+    return len(texts) / (time.perf_counter() - start), results
+
+
+def main():
+    """従来の実装とTextScreenerのスループットを出力する"""
+    config = yaml.load(stream=open(os.path.join(ROOT, "config/config.yml"), 'rt', encoding='utf-8'), Loader=yaml.SafeLoader)
+    screener = TextScreener(config['check'])
+
+    texts = [unicodedata.normalize('NFKC', text) for text in generate_tweets(N_TWEETS, noise=0.5)]
+
+    legacy_tps, legacy_results = measure(legacy_check, texts)
+    screener_tps, screener_results = measure(screener.check, texts)
+
+    if legacy_results != screener_results:
+        print("results differ")
+        sys.exit(1)
+
+    print("tweets: " + str(len(texts)) + " (accepted: " + str(sum(screener_results)) + ")")
+    print("  legacy       : %10.0f[tweets/sec]" % legacy_tps)
+    print("  TextScreener : %10.0f[tweets/sec]" % screener_tps)
+    print("  speedup      : %10.1fx" % (screener_tps / legacy_tps))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+# coding: utf-8
+
+"""ベンチマーク用に決定的な日本語ツイートの合成データを生成"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import os
+import json
+import random
+
+
+# 合成に用いる語彙
+WORDS = [
+    "今日", "明日", "昨日", "天気", "ご飯", "学校", "仕事", "電車", "映画", "音楽",
+    "友達", "先生", "猫", "犬", "ラーメン", "コーヒー", "ゲーム", "アニメ", "週末", "旅行",
+    "私", "俺", "君", "あなた", "みんな", "それ", "これ", "ここ", "本当", "最近",
+    "は", "が", "を", "に", "で", "と", "も", "の", "から", "まで",
+    "行き", "食べ", "見", "思い", "言い", "頑張り", "楽しみ", "眠い", "寒い", "暑い",
+    "すごく", "とても", "ちょっと", "やっぱり", "なんか", "まあ", "えっと", "うーん", "ねえ", "おお",
+    "です", "ます", "でした", "ました", "たい", "ない", "よね", "かな", "だよ", "ですね"
+]
+ENDINGS = ["。", "！", "？", "!", "?", "!?", "...", "。。", "!!", "？？", "〜", "ー", "、", "，", "．"]
+EMOTIONS = ["(笑)", "笑", "www", "(泣)", "っっ", "(^^)", "(´・ω・`)", "笑笑笑", "泣泣"]
+NOISE = [
+    "https://t.co/abcdEFG123", "#今日の一枚", "＃拡散希望", "abc", "123",
+    "フォロー", "リプ", "アイコン", "いいね", "わかりみ", "ドヤ", "スヤァ"
+]
+
+
+def generate_sentence(rand):
+    """
+    日本語の文を一つ生成する
+    @param rand 乱数生成器
+    @return 文
+    """
+    words = [rand.choice(WORDS) for _ in range(rand.randint(2, 12))]
+    if rand.random() < 0.2:
+        words.insert(rand.randrange(len(words) + 1), rand.choice(EMOTIONS))
+    return "".join(words) + rand.choice(ENDINGS)
+
+
+def generate_tweet(rand, noise=0.3):
+    """
+    正規化前のツイート本文を一つ生成する
+    @param rand 乱数生成器
+    @param noise URLやハッシュタグなどの除外対象を混ぜる割合
+    @return ツイート本文
+    """
+    text = "".join(generate_sentence(rand) + ("\n" if rand.random() < 0.2 else "") for _ in range(rand.randint(1, 4)))
+    if rand.random() < 0.3:
+        text = "@user_" + str(rand.randint(0, 9999)) + " " + text
+    if rand.random() < noise:
+        pos = rand.randrange(len(text) + 1)
+        text = text[:pos] + " " + rand.choice(NOISE) + " " + text[pos:]
+    return text
+
+
+def generate_tweets(n, seed=0, noise=0.3):
+    """
+    正規化前のツイート本文を指定した数だけ生成する
+    @param n 生成するツイート数
+    @param seed 乱数のシード
+    @param noise URLやハッシュタグなどの除外対象を混ぜる割合
+    @return ツイート本文のリスト
+    """
+    rand = random.Random(seed)
+    return [generate_tweet(rand, noise) for _ in range(n)]
+
+
+def generate_stream(n, seed=0, noise=0.3):
+    """
+    ストリームから流れてくる形式のツイートデータと、そのリプライ先のツイートデータを生成する
+    二人の話者が交互にリプライする2から6発話の対話を作り、最後のリプライだけをストリームに流す
+    @param n 生成する対話数
+    @param seed 乱数のシード
+    @param noise URLやハッシュタグなどの除外対象を混ぜる割合
+    @return ストリームに流れるjson形式のツイートデータのリスト (リプライでないツイートも混ぜる)
+    @return リプライ先として取得できるjson形式のツイートデータのリスト
+    """
+    rand = random.Random(seed)
+    stream, tweets = [], []
+    tweet_id = 1000000000000000000
+
+    def tweet(user, reply_to):
+        nonlocal tweet_id
+        tweet_id += rand.randint(1, 1000)
+        return json.dumps({
+            'id': tweet_id, 'id_str': str(tweet_id), 'in_reply_to_status_id': reply_to,
+            'user': {'id': user}, 'text': generate_tweet(rand, noise), 'lang': "ja"
+        }, ensure_ascii=False)
+
+    for _ in range(n):
+        users = rand.sample(range(1, 1000000), 2)
+        reply_to = None
+        for turn in range(rand.randint(2, 6)):
+            tweets.append(tweet(users[turn % 2], reply_to))
+            reply_to = tweet_id
+        stream.append(tweets[-1])
+        if rand.random() < 0.5:
+            stream.append(tweet(rand.randint(1, 1000000), None))
+    return stream, tweets
+
+
+def generate_corpus(pipeline, config, folder, n_lines, n_dialogs, seed=0):
+    """
+    変換したツイートから "data/" と同じ形式の入出力コーパスと対話コーパスを作成する
+    @param pipeline 本文を変換する TextPipeline
+    @param config 設定ファイル情報
+    @param folder 作成するフォルダ ("folder/data/" にファイルを作成する)
+    @param n_lines 入出力コーパスの行数
+    @param n_dialogs 対話コーパスの対話数
+    @param seed 乱数のシード
+    """
+    rand = random.Random(seed)
+    utterances = [result for result in pipeline.process_batch(generate_tweets(2000, seed, 0.0)) if result and result[0] != ""]
+
+    fn = config['filename']
+    data = os.path.join(folder, "data")
+    os.makedirs(data, exist_ok=True)
+
+    turns = [rand.choice(utterances) for _ in range(n_lines + 1)]
+    dialogs = [[rand.choice(utterances) for _ in range(rand.randint(2, 6))] for _ in range(n_dialogs)]
+    for i, suffix in enumerate(["", "_" + fn['standard_file'], "_" + fn['part_file']]):
+        lines = [turn[i] + "\n" for turn in turns]
+        with open(os.path.join(data, fn['input_file'] + suffix + ".txt"), 'w', encoding='utf-8') as f:
+            f.write("".join(lines[:-1]))
+        with open(os.path.join(data, fn['target_file'] + suffix + ".txt"), 'w', encoding='utf-8') as f:
+            f.write("".join(lines[1:]))
+        with open(os.path.join(data, fn['dialog_file'] + suffix + ".txt"), 'w', encoding='utf-8') as f:
+            f.write("".join(["".join([turn[i] + "\n" for turn in dialog]) + "\n" for dialog in dialogs]))
@@ -0,0 +1,364 @@
+# coding: utf-8
+
+"""
+収集処理とフィルタリングの主な処理をコーパスの大きさごとに計測し、結果をjson形式で保存して前回の結果と比較するベンチマーク
+    $ python benchmarks/suite.py --out before.json
+    $ python benchmarks/suite.py --out after.json --baseline before.json --threshold 0.1
+基準より threshold の割合を超えて遅くなった処理があれば終了コード1で終了する
+"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import io
+import os
+import sys
+import copy
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from contextlib import contextmanager, redirect_stdout
+import yaml
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from twitter import QueueListener
+from filter import TweetFilter
+from pipeline import TextPipeline
+from dedup import TweetIdSet
+from scheduler import Dialog
+from corpus import generate_tweets, generate_corpus
+
+
+# 計測するコーパスの大きさ (ツイート数、行数、対話数)
+SIZES = [1000, 10000]
+# 計測する回数 (最も速かった回を結果とする)
+REPEAT = 3
+# 遅くなったとみなす基準からの割合
+THRESHOLD = 0.1
+# ツイートIDの重複判定とチェックポイントは件数を増やして計測する
+ID_SCALE = 100
+
+
+@contextmanager
+def workspace():
+    """
+    一時フォルダをカレントディレクトリにして、終了後に削除する
+    @return 一時フォルダのパス
+    """
+    cwd = os.getcwd()
+    folder = tempfile.mkdtemp()
+    os.chdir(folder)
+    try:
+        yield folder
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(folder)
+
+
+@contextmanager
+def listener_in(config):
+    """
+    一時フォルダにファイルを保存するキューリスナーを作成し、終了後に閉じる
+    @param config 設定ファイル情報
+    @return キューリスナー
+    """
+    with workspace():
+        listener = QueueListener(config, None, api=object())
+        try:
+            yield listener
+        finally:
+            listener.close()
+
+
+def timed(func, *args):
+    """
+    関数の処理時間を計測する
+    @param func 関数
+    @param args 関数の引数
+    @return 秒数
+    """
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+class Suite():
+    """各処理をコーパスの大きさごとに計測するクラス"""
+    def __init__(self, config):
+        """
+        コンストラクタ
+        @param config 設定ファイル情報
+        """
+        # 計測に関係しない処理は行わず、変換と取得はストリームのスレッドで行う
+        self.config = copy.deepcopy(config)
+        self.config['print_progress'] = False
+        self.config['archive']['use'] = False
+        self.config['monitor']['use'] = False
+        self.config['nlp']['processes'] = 0
+        self.config['lookup']['workers'] = 0
+        self.config['parallel']['processes'] = 0
+        self.config['incremental'] = False
+        self.config['index']['use'] = False
+
+        # 計測する処理の入力を作る変換処理
+        self.pipeline = TextPipeline(self.config)
+
+        self.cases = {
+            'check': self.check, 'normalize': self.normalize, 'del_morpheme': self.del_morpheme,
+            'del_username': self.del_username, 'dedup': self.dedup, 'dump': self.dump,
+            'save_tmp': self.save_tmp, 'load_tmp': self.load_tmp,
+            'turn_filtering': self.turn_filtering, 'dialog_filtering': self.dialog_filtering, 'near_dup': self.near_dup
+        }
+
+    def texts(self, size):
+        """
+        ユーザ名を除去してNFKC正規化したツイート本文を生成する
+        @param size ツイート数
+        @return 本文のリスト
+        """
+        return [self.pipeline.clean(text) for text in generate_tweets(size)]
+
+    def check(self, size):
+        """QueueListener.check (不適切な情報を含むかの判定)"""
+        texts = self.texts(size)
+        with listener_in(self.config) as listener:
+            return timed(lambda: [listener.check(text) for text in texts]), size
+
+    def normalize(self, size):
+        """QueueListener.normalize (正規化)"""
+        with listener_in(self.config) as listener:
+            texts = [text for text in self.texts(size) if listener.check(text)]
+            return timed(lambda: [listener.normalize(text) for text in texts]), len(texts)
+
+    def del_morpheme(self, size):
+        """QueueListener.del_morpheme (形態素解析と特定の形態素の除去)"""
+        with listener_in(self.config) as listener:
+            texts = [listener.normalize(text) for text in self.texts(size) if listener.check(text)]
+            return timed(lambda: [listener.del_morpheme(text) for text in texts]), len(texts)
+
+    def del_username(self, size):
+        """QueueListener.del_username (ユーザ名の除去)"""
+        texts = generate_tweets(size)
+        with listener_in(self.config) as listener:
+            return timed(lambda: [listener.del_username(text) for text in texts]), size
+
+    def dedup(self, size):
+        """収集済みツイートIDの重複判定 (size * ID_SCALE 件を保持して、同じ数だけ判定する)"""
+        rand = random.Random(0)
+        n = size * ID_SCALE
+        tweet_ids = TweetIdSet(n)
+        tweet_ids.extend([rand.getrandbits(62) for _ in range(n)])
+        queries = [rand.getrandbits(62) for _ in range(n)]
+        return timed(lambda: [tweet_id in tweet_ids for tweet_id in queries]), n
+
+    def dialogs(self, size):
+        """
+        変換済みの発話から保存する対話を作る
+        @param size 対話数
+        @return 対話のリスト
+        """
+        rand = random.Random(0)
+        results = [result for result in self.pipeline.process_batch(generate_tweets(200, noise=0.0)) if result and result[0] != ""]
+        dialogs = []
+        for i in range(size):
+            dialog = Dialog()
+            for turn in range(rand.randint(2, 6)):
+                text, standard, part = rand.choice(results)
+                dialog.append([[i * 10 + turn + 1, turn % 2, text, i * 10 + turn], standard, part])
+            dialogs.append(dialog)
+        return dialogs
+
+    def dump(self, size):
+        """QueueListener.dump (対話データのファイルへの保存、書き出しを含む)"""
+        with listener_in(self.config) as listener:
+            dialogs = self.dialogs(size)
+
+            def run():
+                for dialog in dialogs:
+                    listener.dump(dialog)
+                listener.writer.flush()
+            return timed(run), size
+
+    def fill_ids(self, listener, size):
+        """
+        キューリスナーの収集済みツイートIDを増やす
+        @param listener キューリスナー
+        @param size 増やすツイートID数
+        """
+        rand = random.Random(0)
+        listener.tweet_ids = TweetIdSet(size)
+        listener.tweet_ids.extend([rand.getrandbits(62) for _ in range(size)])
+
+    def save_tmp(self, size):
+        """QueueListener.save_tmp (size * ID_SCALE 件のツイートIDのチェックポイントの保存)"""
+        n = size * ID_SCALE
+        with listener_in(self.config) as listener:
+            self.fill_ids(listener, n)
+            return timed(listener.save_tmp), n
+
+    def load_tmp(self, size):
+        """QueueListener.load_tmp (size * ID_SCALE 件のツイートIDのチェックポイントの読み込み)"""
+        n = size * ID_SCALE
+        with listener_in(self.config) as listener:
+            self.fill_ids(listener, n)
+            listener.save_tmp()
+            listener.tweet_ids = TweetIdSet(n)
+            elapsed = timed(listener.load_tmp)
+            if len(listener.tweet_ids) != n:
+                raise RuntimeError("checkpoint lost tweet ids")
+            return elapsed, n
+
+    def filtering(self, size, kind):
+        """
+        合成したコーパスをフィルタリングする
+        @param size 入出力コーパスの行数と対話コーパスの対話数
+        @param kind "turn" か "dialog"
+        @return 秒数
+        @return データ数
+        """
+        with workspace() as folder:
+            generate_corpus(self.pipeline, self.config, folder, size, size)
+            os.mkdir("filtered")
+            tweet_filter = TweetFilter(self.config)
+
+            # フィルタリング前後のデータ数の表示は出さない
+            with redirect_stdout(io.StringIO()):
+                return timed(tweet_filter.turn_filtering if kind == "turn" else tweet_filter.dialog_filtering), size
+
+    def turn_filtering(self, size):
+        """TweetFilter.turn_filtering (入出力コーパスのフィルタリング)"""
+        return self.filtering(size, "turn")
+
+    def dialog_filtering(self, size):
+        """TweetFilter.dialog_filtering (対話コーパスのフィルタリング)"""
+        return self.filtering(size, "dialog")
+
+    def near_dup(self, size):
+        """TweetFilter.near_dup_filtering (入出力コーパスからのほぼ同じデータの除去、索引への登録を含む)"""
+        with workspace() as folder:
+            generate_corpus(self.pipeline, self.config, folder, size, size)
+            shutil.copytree("data", "filtered")
+            tweet_filter = TweetFilter(self.config)
+            names, std, prt = tweet_filter.turn_files()
+            index = tweet_filter.near_dup_index("turn")
+            try:
+                return timed(lambda: tweet_filter.near_dup_filtering(index, "turn", names, std, prt)), size
+            finally:
+                index.close()
+
+    def run(self, names, sizes, repeat):
+        """
+        処理を計測する
+        @param names 計測する処理名のリスト
+        @param sizes コーパスの大きさのリスト
+        @param repeat 計測する回数
+        @return 処理名からコーパスの大きさごとの計測結果への辞書
+        """
+        results = {}
+        for name in names:
+            results[name] = {}
+            for size in sizes:
+                runs = [self.cases[name](size) for _ in range(repeat)]
+                seconds = min([elapsed for elapsed, _ in runs])
+                items = runs[0][1]
+                results[name][str(size)] = {
+                    'seconds': seconds, 'items': items,
+                    'usec_per_item': 1e6 * seconds / items if items else 0.0,
+                    'items_per_sec': items / seconds if seconds > 0 else 0.0
+                }
+                print("%-16s %8d: %10.4f[sec] %10.2f[usec/item] %12.0f[items/sec]" % (
+                    name, size, seconds, results[name][str(size)]['usec_per_item'], results[name][str(size)]['items_per_sec']), flush=True)
+        return results
+
+
+def git_commit():
+    """
+    計測したソースのコミットを求める
+    @return コミットのハッシュ (求められなければNone)
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """
+    基準の結果と比較する (両方にある処理と大きさのみ)
+    @param results 計測結果
+    @param baseline 基準の計測結果
+    @param threshold 遅くなったとみなす基準からの割合
+    @return 遅くなった (処理名, 大きさ, 基準との比) のリスト
+    """
+    regressions = []
+    print("")
+    print("%-16s %8s %10s %10s %8s" % ("case", "size", "baseline", "current", "ratio"))
+    for name, by_size in results.items():
+        for size, result in by_size.items():
+            base = baseline.get(name, {}).get(size)
+            if base is None or base['usec_per_item'] <= 0:
+                continue
+            ratio = result['usec_per_item'] / base['usec_per_item']
+            mark = " REGRESSION" if ratio > 1 + threshold else ""
+            print("%-16s %8s %10.2f %10.2f %7.2fx%s" % (name, size, base['usec_per_item'], result['usec_per_item'], ratio, mark))
+            if mark:
+                regressions.append((name, size, ratio))
+    return regressions
+
+
+def main():
+    """計測結果を表示してjson形式で保存し、基準が指定されれば比較する"""
+    parser = argparse.ArgumentParser(description="収集処理とフィルタリングの主な処理をコーパスの大きさごとに計測する")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="コーパスの大きさ (カンマ区切り)")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="計測する回数 (最も速かった回を結果とする)")
+    parser.add_argument("--only", help="計測する処理名 (カンマ区切り、省略時はすべて)")
+    parser.add_argument("--out", help="計測結果を保存するjsonファイル")
+    parser.add_argument("--baseline", help="比較する基準の計測結果のjsonファイル")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="遅くなったとみなす基準からの割合")
+    args = parser.parse_args()
+
+    config = yaml.load(stream=open(os.path.join(ROOT, "config/config.yml"), 'rt', encoding='utf-8'), Loader=yaml.SafeLoader)
+    suite = Suite(config)
+    names = args.only.split(",") if args.only else list(suite.cases)
+    unknown = [name for name in names if name not in suite.cases]
+    if unknown:
+        parser.error("unknown case: " + ", ".join(unknown) + " (choose from " + ", ".join(suite.cases) + ")")
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    report = {
+        'meta': {
+            'time': time.strftime("%Y-%m-%dT%H:%M:%S"), 'commit': git_commit(),
+            'python': platform.python_version(), 'platform': platform.platform(),
+            'sizes': sizes, 'repeat': args.repeat
+        },
+        'results': suite.run(names, sizes, args.repeat)
+    }
+
+    if args.out:
+        folder = os.path.dirname(os.path.abspath(args.out))
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(report['results'], baseline, args.threshold)
+        if regressions:
+            print("%d regression(s) over %.0f%%" % (len(regressions), 100 * args.threshold))
+            sys.exit(1)
+        print("no regression over %.0f%%" % (100 * args.threshold))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+# coding: utf-8
+
+"""収集の途中経過をバイナリ形式のチェックポイントとして保存・復元"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import os
+import sys
+import json
+import mmap
+import struct
+from array import array
+
+
+# スナップショットのヘッダ (マジックナンバー, ID数)
+SNAPSHOT_HEADER = struct.Struct("<8sQ")
+SNAPSHOT_MAGIC = b"TWIDRING"
+
+# 差分レコードのヘッダ (ID数)
+DELTA_HEADER = struct.Struct("<Q")
+
+
+def atomic_write(path, data):
+    """
+    一時ファイルに書き込んでから置き換えることでファイルを不可分に更新する
+    @param path 書き込むファイルパス
+    @param data 書き込むバイト列
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def to_bytes(ids):
+    """
+    ツイートIDの配列をリトルエンディアンのバイト列に変換する
+    @param ids ツイートIDの配列
+    @return バイト列
+    """
+    if sys.byteorder == "big":
+        ids = array('q', ids)
+        ids.byteswap()
+    return ids.tobytes()
+
+
+def from_bytes(data):
+    """
+    リトルエンディアンのバイト列をツイートIDの配列に変換する
+    @param data バイト列
+    @return ツイートIDの配列
+    """
+    ids = array('q')
+    ids.frombytes(data)
+    if sys.byteorder == "big":
+        ids.byteswap()
+    return ids
+
+
+class Checkpoint():
+    """
+    ツイートIDと収集数のチェックポイントを管理するクラス
+    ツイートIDは固定長のスナップショット (id.bin) と追記型の差分 (id.log) に、
+    収集数は cnt.json に保存する
+    """
+    def __init__(self, folder="tmp", snapshot_ratio=0.25):
+        """
+        コンストラクタ
+        @param folder チェックポイントを保存するフォルダ
+        @param snapshot_ratio 差分のID数が保持数に対してこの割合を超えたらスナップショットを作り直す
+        """
+        self.folder = folder
+        self.snapshot_ratio = snapshot_ratio
+
+        self.cnt_fp = os.path.join(folder, "cnt.json")
+        self.snapshot_fp = os.path.join(folder, "id.bin")
+        self.delta_fp = os.path.join(folder, "id.log")
+
+        # 旧形式のチェックポイント
+        self.old_cnt_fp = os.path.join(folder, "cnt.txt")
+        self.old_id_fp = os.path.join(folder, "id.txt")
+
+        # 保存済みのIDの総数と差分に含まれるID数
+        self.saved_total = 0
+        self.delta_cnt = 0
+
+    def save(self, tweet_ids, counters):
+        """
+        チェックポイントを保存する
+        @param tweet_ids ツイートIDの集合 (TweetIdSet)
+        @param counters 収集数などを格納した辞書
+        """
+        if not os.path.isdir(self.folder):
+            os.mkdir(self.folder)
+
+        atomic_write(self.cnt_fp, json.dumps(counters).encode('utf-8'))
+
+        new_cnt = tweet_ids.total - self.saved_total
+        if new_cnt == 0 and os.path.isfile(self.snapshot_fp):
+            return
+
+        if not os.path.isfile(self.snapshot_fp) or new_cnt > len(tweet_ids) or\
+        self.delta_cnt + new_cnt > len(tweet_ids) * self.snapshot_ratio:
+            self.save_snapshot(tweet_ids)
+        else:
+            with open(self.delta_fp, 'ab') as f:
+                f.write(DELTA_HEADER.pack(new_cnt) + to_bytes(tweet_ids.recent(new_cnt)))
+            self.delta_cnt += new_cnt
+
+        self.saved_total = tweet_ids.total
+
+    def save_snapshot(self, tweet_ids):
+        """
+        ツイートIDのスナップショットを作成し、差分を空にする
+        @param tweet_ids ツイートIDの集合 (TweetIdSet)
+        """
+        ids = tweet_ids.to_array()
+        atomic_write(self.snapshot_fp, SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(ids)) + to_bytes(ids))
+
+        with open(self.delta_fp, 'wb'):
+            pass
+        self.delta_cnt = 0
+
+    def load(self, tweet_ids):
+        """
+        チェックポイントを読み込む
+        旧形式 (cnt.txt, id.txt) しか存在しなければ読み込んだ後に新形式へ移行する
+        @param tweet_ids 読み込んだIDを追加するツイートIDの集合 (TweetIdSet)
+        @return 収集数などを格納した辞書、存在しなければNone
+        """
+        if not os.path.isdir(self.folder):
+            return None
+
+        counters, migrated = None, False
+
+        if os.path.isfile(self.cnt_fp):
+            with open(self.cnt_fp, 'r', encoding='utf-8') as f:
+                counters = json.load(f)
+        elif os.path.isfile(self.old_cnt_fp):
+            with open(self.old_cnt_fp, 'r', encoding='utf-8') as f:
+                counters = {
+                    'dig_cnt': int(f.readline().strip()),
+                    'trn_cnt': int(f.readline().strip()),
+                    'cum_time': float(f.readline().strip())
+                }
+            migrated = True
+
+        if os.path.isfile(self.snapshot_fp):
+            self.load_snapshot(tweet_ids)
+            self.load_delta(tweet_ids)
+        elif os.path.isfile(self.old_id_fp):
+            with open(self.old_id_fp, 'r', encoding='utf-8') as f:
+                tweet_ids.extend(int(line) for line in f if line.strip())
+            migrated = True
+
+        self.saved_total = tweet_ids.total
+
+        # 新形式で保存し直して旧形式のファイルを削除
+        if migrated:
+            if counters is not None:
+                atomic_write(self.cnt_fp, json.dumps(counters).encode('utf-8'))
+            self.save_snapshot(tweet_ids)
+            for fp in [self.old_cnt_fp, self.old_id_fp]:
+                if os.path.isfile(fp):
+                    os.remove(fp)
+
+        return counters
+
+    def load_snapshot(self, tweet_ids):
+        """
+        スナップショットをメモリマップして読み込む
+        @param tweet_ids 読み込んだIDを追加するツイートIDの集合 (TweetIdSet)
+        """
+        if os.path.getsize(self.snapshot_fp) < SNAPSHOT_HEADER.size:
+            return
+
+        with open(self.snapshot_fp, 'rb') as f,\
+        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, cnt = SNAPSHOT_HEADER.unpack_from(mm)
+            if magic != SNAPSHOT_MAGIC:
+                return
+            start = SNAPSHOT_HEADER.size
+            end = min(start + cnt * 8, len(mm))
+            tweet_ids.load(from_bytes(mm[start:end - (end - start) % 8]))
+
+    def load_delta(self, tweet_ids):
+        """
+        スナップショット以降の差分を順に適用する
+        書き込み途中で途切れた末尾のレコードは無視する
+        @param tweet_ids 読み込んだIDを追加するツイートIDの集合 (TweetIdSet)
+        """
+        self.delta_cnt = 0
+        if not os.path.isfile(self.delta_fp):
+            return
+
+        with open(self.delta_fp, 'rb') as f:
+            data = f.read()
+
+        pos = 0
+        while pos + DELTA_HEADER.size <= len(data):
+            cnt, = DELTA_HEADER.unpack_from(data, pos)
+            end = pos + DELTA_HEADER.size + cnt * 8
+            if end > len(data):
+                break
+            tweet_ids.extend(from_bytes(data[pos + DELTA_HEADER.size:end]))
+            self.delta_cnt += cnt
+            pos = end
+
+        # 途切れたレコードの後ろに追記しないように切り詰める
+        if pos < len(data):
+            with open(self.delta_fp, 'r+b') as f:
+                f.truncate(pos)
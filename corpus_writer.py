@@ -0,0 +1,209 @@
+# coding: utf-8
+
+"""対話データのファイルを開いたまま、バッファリングして書き込む"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import os
+import json
+import time
+import threading
+from checkpoint import atomic_write
+
+
+class CorpusWriter():
+    """
+    複数の対話データのファイルに対話単位で書き込むクラス
+    書き込んだ内容はメモリに溜めておき、まとめて全ファイルに書き出す
+    書き出しが完了した時点の各ファイルのサイズをジャーナルに記録し、
+    書き出し中に異常終了した場合は次回の起動時にそのサイズまで切り詰める
+    """
+    def __init__(self, paths, buffer_size=1048576, flush_interval=10.0, journal="data/.journal.json"):
+        """
+        コンストラクタ
+        @param paths 書き込むファイルパスのリスト
+        @param buffer_size 溜めておく最大のバイト数 (これを超えると書き出す)
+        @param flush_interval 書き出す間隔 (秒)
+        @param journal ジャーナルのファイルパス
+        """
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.journal = journal
+        self.lock = threading.RLock()
+
+        for folder in set([os.path.dirname(path) for path in paths + [journal]]):
+            if folder and not os.path.isdir(folder):
+                os.makedirs(folder)
+
+        # 途中まで書き出された対話を取り除いてからファイルを開く
+        self.recover(paths)
+        self.files = {path: open(path, 'ab') for path in paths}
+        self.sizes = {path: f.tell() for path, f in self.files.items()}
+        self.commit()
+
+        self.buffers = {path: [] for path in paths}
+        self.pending = 0
+        self.flushed_at = time.time()
+
+    def recover(self, paths):
+        """
+        ジャーナルに記録されたサイズを超えている部分をファイルから取り除く
+        @param paths 書き込むファイルパスのリスト
+        """
+        if not os.path.isfile(self.journal):
+            return
+
+        with open(self.journal, 'rt', encoding='utf-8') as f:
+            sizes = json.load(f)
+
+        for path in paths:
+            if path in sizes and os.path.isfile(path) and os.path.getsize(path) > sizes[path]:
+                with open(path, 'r+b') as f:
+                    f.truncate(sizes[path])
+
+    def commit(self):
+        """各ファイルのサイズをジャーナルに記録する"""
+        atomic_write(self.journal, json.dumps(self.sizes, ensure_ascii=False).encode('utf-8'))
+
+    def write(self, records):
+        """
+        一つの対話の内容を書き込む
+        @param records ファイルパスから書き込む行のリストへの辞書
+        """
+        with self.lock:
+            for path, lines in records.items():
+                data = "".join([line + "\n" for line in lines]).encode('utf-8')
+                self.buffers[path].append(data)
+                self.pending += len(data)
+
+            if self.pending >= self.buffer_size:
+                self.flush()
+            else:
+                self.flush_due()
+
+    def flush_due(self):
+        """
+        前回の書き出しから flush_interval 秒が経っていれば、溜めておいた内容を書き出す
+        書き込みがなくても呼ばれるように、定期的に呼び出す側から使う
+        @return 次に書き出すまでの秒数 (溜めている内容がなければNone)
+        """
+        with self.lock:
+            if not self.pending:
+                return None
+            wait = self.flushed_at + self.flush_interval - time.time()
+            if wait > 0:
+                return wait
+            self.flush()
+            return None
+
+    def flush(self):
+        """溜めておいた内容を全ファイルに書き出し、ジャーナルを更新する"""
+        with self.lock:
+            self.flushed_at = time.time()
+            if not self.pending:
+                return
+
+            for path, chunks in self.buffers.items():
+                if chunks:
+                    f = self.files[path]
+                    f.write(b"".join(chunks))
+                    f.flush()
+                    os.fsync(f.fileno())
+                    self.sizes[path] = f.tell()
+                    del chunks[:]
+
+            self.pending = 0
+            self.commit()
+
+    def close(self):
+        """溜めておいた内容を書き出してからファイルを閉じる"""
+        with self.lock:
+            self.flush()
+            for f in self.files.values():
+                f.close()
+            self.files = {}
+
+
+class CorpusLayout():
+    """設定ファイルに従って、対話データのファイルパスと各ファイルに書き込む行を決めるクラス"""
+    def __init__(self, config, folder="data"):
+        """
+        コンストラクタ
+        @param config 設定ファイル情報
+        @param folder 保存するフォルダ
+        """
+        # 保存ファイル名の情報取得
+        fn = config['filename']
+        inp_fn = fn['input_file']
+        tar_fn = fn['target_file']
+        dig_fn = fn['dialog_file']
+        std_fn = fn['standard_file']
+        prt_fn = fn['part_file']
+
+        # 保存ファイルパス
+        self.dig_fp = folder + "/" + dig_fn + ".txt"
+        self.dig_std_fp = folder + "/" + dig_fn + "_" + std_fn + ".txt"
+        self.dig_prt_fp = folder + "/" + dig_fn + "_" + prt_fn + ".txt"
+        self.inp_fp = folder + "/" + inp_fn + ".txt"
+        self.tar_fp = folder + "/" + tar_fn + ".txt"
+        self.inp_std_fp = folder + "/" + inp_fn + "_" + std_fn + ".txt"
+        self.tar_std_fp = folder + "/" + tar_fn + "_" + std_fn + ".txt"
+        self.inp_prt_fp = folder + "/" + inp_fn + "_" + prt_fn + ".txt"
+        self.tar_prt_fp = folder + "/" + tar_fn + "_" + prt_fn + ".txt"
+
+        # 保存するかどうかを取得
+        fd = config['dump']
+        self.trn_fd = fd['turn_file']
+        self.dig_fd = fd['dialog_file']
+        self.std_fd = fd['standard_file']
+        self.prt_fd = fd['part_file']
+
+    def paths(self):
+        """
+        保存するファイルパスのリストを求める
+        @return ファイルパスのリスト
+        """
+        paths = []
+        if self.dig_fd:
+            paths.append(self.dig_fp)
+            if self.std_fd:
+                paths.append(self.dig_std_fp)
+            if self.prt_fd:
+                paths.append(self.dig_prt_fp)
+        if self.trn_fd:
+            paths += [self.inp_fp, self.tar_fp]
+            if self.std_fd:
+                paths += [self.inp_std_fp, self.tar_std_fp]
+            if self.prt_fd:
+                paths += [self.inp_prt_fp, self.tar_prt_fp]
+        return paths
+
+    def records(self, tweets):
+        """
+        一つの対話を各ファイルに書き込む行に変換する
+        @param tweets 時系列順に並べた (テキスト, 標準形/表層形, 品詞列) のリスト
+        @return ファイルパスから書き込む行のリストへの辞書
+        """
+        records = {}
+
+        if self.dig_fd:
+            records[self.dig_fp] = [tweet[0] for tweet in tweets] + [""]
+            if self.std_fd:
+                records[self.dig_std_fp] = [tweet[1] for tweet in tweets] + [""]
+            if self.prt_fd:
+                records[self.dig_prt_fp] = [tweet[2] for tweet in tweets] + [""]
+
+        if self.trn_fd:
+            records[self.inp_fp] = [tweet[0] for tweet in tweets[:-1]]
+            records[self.tar_fp] = [tweet[0] for tweet in tweets[1:]]
+            if self.std_fd:
+                records[self.inp_std_fp] = [tweet[1] for tweet in tweets[:-1]]
+                records[self.tar_std_fp] = [tweet[1] for tweet in tweets[1:]]
+            if self.prt_fd:
+                records[self.inp_prt_fp] = [tweet[2] for tweet in tweets[:-1]]
+                records[self.tar_prt_fp] = [tweet[2] for tweet in tweets[1:]]
+
+        return records
@@ -0,0 +1,106 @@
+# coding: utf-8
+
+"""収集済みツイートIDの重複判定を行う容量制限付き集合"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+from array import array
+
+
+class TweetIdSet():
+    """挿入順を保持し、容量を超えると古いものから削除されるツイートIDの集合"""
+    def __init__(self, capacity=1000000):
+        """
+        コンストラクタ
+        @param capacity 保持するツイートIDの最大数
+        """
+        self.capacity = capacity
+
+        # IDを挿入順に保持するリングバッファと、所属判定用のハッシュ索引
+        self.ring = array('q')
+        self.head = 0
+        self.index = set()
+
+        # これまでに追加されたIDの総数
+        self.total = 0
+
+    def __len__(self):
+        return len(self.ring)
+
+    def __contains__(self, tweet_id):
+        return tweet_id in self.index
+
+    def __iter__(self):
+        """古いものから順にツイートIDを返す"""
+        ring, head = self.ring, self.head
+        for i in range(head, len(ring)):
+            yield ring[i]
+        for i in range(head):
+            yield ring[i]
+
+    def add(self, tweet_id):
+        """
+        ツイートIDを追加する
+        容量を超える場合は最も古いIDを削除する
+        @param tweet_id ツイートID
+        @return True: 追加した、False: すでに存在した
+        """
+        if tweet_id in self.index:
+            return False
+
+        if len(self.ring) < self.capacity:
+            self.ring.append(tweet_id)
+        else:
+            self.index.discard(self.ring[self.head])
+            self.ring[self.head] = tweet_id
+            self.head = (self.head + 1) % self.capacity
+
+        self.index.add(tweet_id)
+        self.total += 1
+        return True
+
+    def extend(self, tweet_ids):
+        """
+        複数のツイートIDを順に追加する
+        @param tweet_ids ツイートIDの列
+        """
+        for tweet_id in tweet_ids:
+            self.add(tweet_id)
+
+    def to_array(self):
+        """
+        古いものから順に並べたツイートIDの配列を返す
+        @return ツイートIDの配列
+        """
+        return self.ring[self.head:] + self.ring[:self.head]
+
+    def recent(self, n):
+        """
+        新しい方から指定した数のツイートIDを古い順に並べた配列を返す
+        @param n 取得するIDの数
+        @return ツイートIDの配列
+        """
+        n = min(n, len(self.ring))
+        if n == 0:
+            return array('q')
+        end = self.head if len(self.ring) == self.capacity else len(self.ring)
+        if n <= end:
+            return self.ring[end - n:end]
+        return self.ring[len(self.ring) - (n - end):] + self.ring[:end]
+
+    def load(self, tweet_ids):
+        """
+        空の集合に重複のないツイートIDの列をまとめて読み込む
+        @param tweet_ids 古い順に並んだ重複のないツイートIDの配列
+        """
+        if len(self.ring):
+            self.extend(tweet_ids)
+            return
+
+        self.ring = array('q', tweet_ids[len(tweet_ids) - min(len(tweet_ids), self.capacity):])
+        self.head = 0
+        self.index = set(self.ring)
+        self.total += len(self.ring)
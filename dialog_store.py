@@ -0,0 +1,246 @@
+# coding: utf-8
+
+"""対話データを一つの対話を一レコードとして保存するストアと、テキストファイルへの書き出し"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import os
+import json
+import time
+import struct
+import argparse
+import threading
+import yaml
+from corpus_writer import CorpusLayout
+
+
+# インデックスのレコード (シャード内のオフセット, バイト数)
+INDEX_RECORD = struct.Struct("<QI")
+
+
+class DialogStore():
+    """
+    対話をJSONLのシャードに一行ずつ保存し、固定長のインデックスで任意の対話を読み出すクラス
+    i番目の対話は (i // shard_size) 番目のシャードに保存され、インデックスのi番目のレコードがその位置を指す
+    シャードを書き出してからインデックスを書き出すため、インデックスにある対話は常に完全に保存されている
+    """
+    def __init__(self, folder="data/store", shard_size=100000, buffer_size=1048576, flush_interval=10.0):
+        """
+        コンストラクタ
+        @param folder 保存するフォルダ
+        @param shard_size 一つのシャードに保存する対話数
+        @param buffer_size 書き出さずに溜めておく最大のバイト数
+        @param flush_interval 書き出す間隔 (秒)
+        """
+        self.folder = folder
+        self.shard_size = shard_size
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.index_path = os.path.join(folder, "index.bin")
+        self.lock = threading.RLock()
+
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        # 書き出し途中で終了した部分を取り除く
+        self.count = self.recover()
+
+        self.pending = []
+        self.pending_size = 0
+        self.flushed_at = time.time()
+
+    def shard_path(self, shard):
+        """
+        シャードのファイルパスを求める
+        @param shard シャード番号
+        @return ファイルパス
+        """
+        return os.path.join(self.folder, "dialog_%05d.jsonl" % shard)
+
+    def recover(self):
+        """
+        インデックスとシャードの末尾にある書き出し途中の部分を取り除く
+        @return 保存済みの対話数
+        """
+        if not os.path.isfile(self.index_path):
+            open(self.index_path, 'wb').close()
+
+        with open(self.index_path, 'r+b') as f:
+            data = f.read()
+            count = len(data) // INDEX_RECORD.size
+
+            # シャードに書き出されていない対話をインデックスから取り除く
+            while count:
+                offset, length = INDEX_RECORD.unpack_from(data, (count - 1) * INDEX_RECORD.size)
+                path = self.shard_path((count - 1) // self.shard_size)
+                if os.path.isfile(path) and os.path.getsize(path) >= offset + length:
+                    break
+                count -= 1
+
+            f.truncate(count * INDEX_RECORD.size)
+
+        # インデックスにない対話をシャードから取り除く
+        shard = count // self.shard_size
+        end = 0
+        if count % self.shard_size:
+            offset, length = INDEX_RECORD.unpack_from(data, (count - 1) * INDEX_RECORD.size)
+            end = offset + length
+
+        path = self.shard_path(shard)
+        if os.path.isfile(path) and os.path.getsize(path) > end:
+            with open(path, 'r+b') as f:
+                f.truncate(end)
+
+        shard += 1
+        while os.path.isfile(self.shard_path(shard)):
+            os.remove(self.shard_path(shard))
+            shard += 1
+
+        return count
+
+    def append(self, turns):
+        """
+        一つの対話を保存する
+        @param turns 時系列順に並べた発話の辞書のリスト
+        """
+        with self.lock:
+            data = (json.dumps({'turns': turns}, ensure_ascii=False) + "\n").encode('utf-8')
+            self.pending.append(data)
+            self.pending_size += len(data)
+
+            if self.pending_size >= self.buffer_size:
+                self.flush()
+            else:
+                self.flush_due()
+
+    def flush_due(self):
+        """
+        前回の書き出しから flush_interval 秒が経っていれば、溜めておいた対話を書き出す
+        @return 次に書き出すまでの秒数 (溜めている対話がなければNone)
+        """
+        with self.lock:
+            if not self.pending:
+                return None
+            wait = self.flushed_at + self.flush_interval - time.time()
+            if wait > 0:
+                return wait
+            self.flush()
+            return None
+
+    def flush(self):
+        """溜めておいた対話をシャードに書き出してからインデックスに追加する"""
+        with self.lock:
+            self.flushed_at = time.time()
+            if not self.pending:
+                return
+
+            index = []
+            i = 0
+            while i < len(self.pending):
+                # 同じシャードに入る対話をまとめて書き出す
+                shard = (self.count + i) // self.shard_size
+                chunk = self.pending[i:(shard + 1) * self.shard_size - self.count]
+
+                with open(self.shard_path(shard), 'ab') as f:
+                    offset = f.tell()
+                    for data in chunk:
+                        index.append(INDEX_RECORD.pack(offset, len(data)))
+                        offset += len(data)
+                    f.write(b"".join(chunk))
+                    f.flush()
+                    os.fsync(f.fileno())
+                i += len(chunk)
+
+            with open(self.index_path, 'ab') as f:
+                f.write(b"".join(index))
+                f.flush()
+                os.fsync(f.fileno())
+
+            self.count += len(self.pending)
+            self.pending = []
+            self.pending_size = 0
+
+    def close(self):
+        """溜めておいた対話を書き出す"""
+        self.flush()
+
+    def __len__(self):
+        """
+        保存済みの対話数
+        @return 対話数
+        """
+        return self.count + len(self.pending)
+
+    def __getitem__(self, i):
+        """
+        i番目の対話を読み出す
+        @param i 対話の番号
+        @return 時系列順に並べた発話の辞書のリスト
+        """
+        with self.lock:
+            if i < 0:
+                i += len(self)
+            if not 0 <= i < len(self):
+                raise IndexError("dialog index out of range")
+            if i >= self.count:
+                self.flush()
+
+            with open(self.index_path, 'rb') as f:
+                f.seek(i * INDEX_RECORD.size)
+                offset, length = INDEX_RECORD.unpack(f.read(INDEX_RECORD.size))
+
+            with open(self.shard_path(i // self.shard_size), 'rb') as f:
+                f.seek(offset)
+                return json.loads(f.read(length).decode('utf-8'))['turns']
+
+    def __iter__(self):
+        """
+        保存済みの対話を先頭から順に読み出す
+        @return 時系列順に並べた発話の辞書のリストのイテレータ
+        """
+        self.flush()
+        for shard in range(-(-self.count // self.shard_size)):
+            with open(self.shard_path(shard), 'r', encoding='utf-8') as f:
+                for line in f:
+                    yield json.loads(line)['turns']
+
+
+def export_text(store, layout):
+    """
+    ストアの対話をテキストファイルに書き出す
+    @param store 対話データのストア
+    @param layout 書き出すファイルの構成
+    @return 書き出した対話数
+    """
+    paths = layout.paths()
+    for folder in set([os.path.dirname(path) for path in paths]):
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+
+    files = {path: open(path, 'w', encoding='utf-8') for path in paths}
+    cnt = 0
+    for turns in store:
+        records = layout.records([[turn['text'], turn['standard'], turn['part']] for turn in turns])
+        for path, lines in records.items():
+            files[path].write("".join([line + "\n" for line in lines]))
+        cnt += 1
+
+    for f in files.values():
+        f.close()
+    return cnt
+
+
+if __name__ == '__main__':
+    # 設定ファイルを読み込む
+    config = yaml.load(stream=open("config/config.yml", 'rt', encoding='utf-8'), Loader=yaml.SafeLoader)
+    st = config['store']
+
+    parser = argparse.ArgumentParser(description="対話データのストアをテキストファイルに書き出す")
+    parser.add_argument("--out", default="exported", help="書き出すフォルダ")
+    args = parser.parse_args()
+
+    store = DialogStore(st['folder'], st['shard_size'])
+    print(st['folder'] + " -> " + args.out + ": " + str(export_text(store, CorpusLayout(config, args.out))))
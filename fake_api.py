@@ -0,0 +1,142 @@
+# coding: utf-8
+
+"""statuses/lookup だけを返す試験用のローカルのAPIサーバ"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import json
+import math
+import time
+import threading
+from collections import deque
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class LookupHandler(BaseHTTPRequestHandler):
+    """statuses/lookup のリクエストを処理するクラス"""
+    def do_GET(self):
+        """GETリクエストを処理する"""
+        fake = self.server.fake
+        url = urlparse(self.path)
+        if url.path != "/1.1/statuses/lookup.json":
+            self.respond(404, {'errors': [{'code': 34, 'message': "Sorry, that page does not exist."}]})
+            return
+
+        # 注入された失敗があれば先に返す
+        fault = fake.next_fault()
+        if fault == "drop":
+            self.close_connection = True
+            self.connection.close()
+            return
+        if fault is not None:
+            self.respond(fault, {'errors': [{'message': "injected"}]})
+            return
+
+        remaining, reset_at = fake.use_call()
+        if remaining < 0:
+            self.respond(429, {'errors': [{'code': 88, 'message': "Rate limit exceeded"}]}, 0, reset_at)
+            return
+
+        ids = [int(tweet_id) for tweet_id in parse_qs(url.query).get('id', [""])[0].split(",") if tweet_id]
+        self.respond(200, fake.find(ids), remaining, reset_at)
+
+    def respond(self, status, body, remaining=None, reset_at=None):
+        """
+        レスポンスを返す
+        @param status ステータスコード
+        @param body jsonにする本文
+        @param remaining 時間枠の残りの呼び出し回数 (Noneならヘッダに含めない)
+        @param reset_at 時間枠がリセットされる時刻
+        """
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', "application/json; charset=utf-8")
+        self.send_header('Content-Length', str(len(data)))
+        if remaining is not None:
+            self.send_header('x-rate-limit-limit', str(self.server.fake.rate_limit))
+            self.send_header('x-rate-limit-remaining', str(remaining))
+            self.send_header('x-rate-limit-reset', str(int(math.ceil(reset_at))))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        """アクセスログを出力しない"""
+        return
+
+
+class FakeAPIServer():
+    """
+    記録したツイートを statuses/lookup として返すローカルのAPIサーバ
+    時間枠あたりの呼び出し回数を数えてレスポンスヘッダに残り回数を含め、使い切ると429を返す
+    試験のためにステータスコードや接続の切断を注入できる
+    """
+    def __init__(self, find, rate_limit=900, window=900, port=0, clock=time.time):
+        """
+        コンストラクタ
+        @param find ツイートIDのリストを受け取って、見つかったツイートの構造体のリストを返す関数
+        @param rate_limit 時間枠あたりの呼び出し回数の上限
+        @param window 時間枠の秒数
+        @param port 待ち受けるポート番号 (0なら空いているポート)
+        @param clock 現在時刻 (UNIX時間) を返す関数
+        """
+        self.find = find
+        self.clock = clock
+        self.rate_limit = rate_limit
+        self.window = window
+        self.lock = threading.Lock()
+        self.faults = deque()
+
+        self.window_start = clock()
+        self.used = 0
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), LookupHandler)
+        self.server.daemon_threads = True
+        self.server.fake = self
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-api", daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        """
+        APIのURL
+        @return URL
+        """
+        return "http://127.0.0.1:%d/1.1" % self.server.server_address[1]
+
+    def inject(self, *faults):
+        """
+        次のリクエストから順に返す失敗を注入する
+        @param faults ステータスコードか、接続を切断する "drop"
+        """
+        with self.lock:
+            self.faults.extend(faults)
+
+    def next_fault(self):
+        """
+        注入された失敗を一つ取り出す
+        @return ステータスコードか "drop" (なければNone)
+        """
+        with self.lock:
+            return self.faults.popleft() if self.faults else None
+
+    def use_call(self):
+        """
+        呼び出し回数を一回使う
+        @return 時間枠の残りの呼び出し回数 (使い切っていれば負)、時間枠がリセットされる時刻
+        """
+        with self.lock:
+            now = self.clock()
+            if now >= self.window_start + self.window:
+                self.window_start = now
+                self.used = 0
+            self.used += 1
+            return self.rate_limit - self.used, self.window_start + self.window
+
+    def close(self):
+        """サーバを終了する"""
+        self.server.shutdown()
+        self.server.server_close()
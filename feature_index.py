@@ -0,0 +1,401 @@
+# coding: utf-8
+
+"""発話ごとの特徴量を索引として保存し、索引の判定だけでフィルタリングする"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import os
+import json
+import hashlib
+import mmap
+from itertools import islice
+import numpy as np
+import yaml
+from checkpoint import atomic_write
+from filter import CHUNK_LINES, JOURNAL_FILE, TweetFilter, LineBlock, PartRemoval, open_range, last_boundary, count_lines, split_spans
+
+
+# 索引のレコード (各ファイルの行の先頭のバイト位置、品詞除去後の単語数、文数、文単位の長さの最小と最大、含まれる品詞のビット列、空行かどうか)
+# 品詞のビット列は PartCoder の番号のビットで表す
+FEATURE = np.dtype([
+    ('offsets', '<u8', (3,)), ('words', '<u2'), ('sents', '<u2'),
+    ('sent_min', '<i2'), ('sent_max', '<i2'), ('parts', '<u4'), ('blank', '?')
+])
+
+
+def line_features(tweet_filter, texts, standards, parts):
+    """
+    複数の行の特徴量を求める
+    @param tweet_filter 品詞の除去に用いるフィルタ
+    @param texts 空白で分かち書きされたテキストのリスト
+    @param standards 標準形/表層形のテキストのリスト (存在しなければNone)
+    @param parts 品詞列のリスト (存在しなければNone)
+    @return 特徴量の配列 (offsetsは求めない)
+    """
+    features = np.zeros(len(texts), dtype=FEATURE)
+    if parts is not None:
+        removal = PartRemoval(texts, standards, parts, tweet_filter.coder, 0)
+        words = removal.lens
+        block = LineBlock([removal.line(i)[0] for i in range(len(texts))])
+        features['parts'] = removal.part_bits()
+    else:
+        block = LineBlock(texts)
+        words = block.count_words()
+
+    sents, sent_mins, sent_maxs = block.sent_stats()
+    limit = np.iinfo(np.int16)
+    features['words'] = np.minimum(words, np.iinfo(np.uint16).max)
+    features['sents'] = np.minimum(sents, np.iinfo(np.uint16).max)
+    features['sent_min'] = np.clip(sent_mins, limit.min, limit.max)
+    features['sent_max'] = np.clip(sent_maxs, limit.min, limit.max)
+    features['blank'] = [text == "\n" for text in texts]
+    return features
+
+
+def line_starts(lines, offset):
+    """
+    読み込んだ各行の先頭のバイト位置を求める
+    @param lines 行のリスト (足りない行は空文字列)
+    @param offset 先頭の行のバイト位置
+    @return バイト位置の配列
+    @return 読み込んだ行の末尾のバイト位置
+    """
+    data = "".join(lines).encode('utf-8')
+    ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10)
+    starts = np.concatenate(([0], ends + 1))[:len(lines)]
+    starts = np.concatenate((starts, np.full(len(lines) - len(starts), len(data), dtype=starts.dtype)))
+    return offset + starts, offset + len(data)
+
+
+class FeatureIndex():
+    """
+    コーパスの各行の特徴量をファイルごとに固定長のレコードとして保存するクラス
+    特徴量は品詞除去の設定に依存するため、filter の dump と part の設定が変わると作り直す
+    収集中のファイルに追加された行は、次に更新した際に索引の末尾に追加される
+    """
+    def __init__(self, tweet_filter, folder="data/index"):
+        """
+        コンストラクタ
+        @param tweet_filter フィルタリングの設定を持つフィルタ
+        @param folder 保存するフォルダ
+        """
+        self.filter = tweet_filter
+        self.folder = folder
+        self.state_path = os.path.join(folder, "state.json")
+
+        content = json.dumps({'dump': tweet_filter.config['filter']['dump'], 'part': tweet_filter.config['part']}, sort_keys=True, ensure_ascii=False)
+        self.fingerprint = hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        self.state = {'fingerprint': self.fingerprint, 'streams': {}}
+        if os.path.isfile(self.state_path):
+            with open(self.state_path, 'rt', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('fingerprint') == self.fingerprint:
+                self.state = state
+
+    def index_path(self, name):
+        """
+        索引のファイルパスを求める
+        @param name テキストのファイル名
+        @return ファイルパス
+        """
+        return os.path.join(self.folder, name + ".idx")
+
+    def recover(self, names):
+        """
+        索引の状態を確認し、保存されていない末尾のレコードを取り除く
+        @param names テキスト、標準形/表層形、品詞列のファイル名のリスト (存在しなければNone)
+        @return 索引済みの行数と各ファイルの索引済みのバイト位置 (作り直す場合は0)
+        """
+        stream = self.state['streams'].get(names[0])
+        path = self.index_path(names[0])
+
+        if stream is not None and stream['files'] == names and os.path.isfile(path) and\
+        os.path.getsize(path) >= stream['rows'] * FEATURE.itemsize and\
+        all([name is None or os.path.getsize("data/" + name) >= offset for name, offset in zip(names, stream['offsets'])]):
+            with open(path, 'r+b') as f:
+                f.truncate(stream['rows'] * FEATURE.itemsize)
+            return stream['rows'], stream['offsets']
+
+        open(path, 'wb').close()
+        return 0, [0, 0, 0]
+
+    def update(self, names):
+        """
+        コーパスに追加された行の特徴量を索引に追加する
+        収集中のファイルは、ジャーナルに記録された書き出し済みの位置までの完全な行のみを索引にする
+        @param names テキスト、標準形/表層形、品詞列のファイル名のリスト (存在しなければNone)
+        @return 索引済みの行数
+        """
+        rows, offsets = self.recover(names)
+
+        committed = {}
+        if os.path.isfile(JOURNAL_FILE):
+            with open(JOURNAL_FILE, 'rt', encoding='utf-8') as f:
+                committed = json.load(f)
+
+        end = last_boundary("data/" + names[0], b"\n", offsets[0], committed.get("data/" + names[0]))
+        with open("data/" + names[0], 'rb') as f:
+            n_lines = count_lines(f, [end], offsets[0])[0]
+        opened = [open_range("data/" + name, offset, n_lines) if name is not None else None for name, offset in zip(names, offsets)]
+
+        with open(self.index_path(names[0]), 'ab') as f_idx:
+            while True:
+                # テキストのファイルを基準に、各ファイルから同じ行数を読み込む (足りない行は空文字列)
+                texts = list(islice(opened[0][1], CHUNK_LINES))
+                if not texts:
+                    break
+                lines = [texts] + [list(islice(f[1], len(texts))) if f is not None else None for f in opened[1:]]
+                lines = [chunk + [""] * (len(texts) - len(chunk)) if chunk is not None else None for chunk in lines]
+
+                features = line_features(self.filter, lines[0], lines[1], lines[2])
+                for j, chunk in enumerate(lines):
+                    if chunk is not None:
+                        features['offsets'][:, j], offsets[j] = line_starts(chunk, offsets[j])
+
+                f_idx.write(features.tobytes())
+                rows += len(texts)
+            f_idx.flush()
+            os.fsync(f_idx.fileno())
+
+        for f in opened:
+            if f is not None:
+                f[0].close()
+
+        self.state['streams'][names[0]] = {'files': names, 'rows': rows, 'offsets': offsets}
+        atomic_write(self.state_path, json.dumps(self.state, ensure_ascii=False).encode('utf-8'))
+        return rows
+
+    def features(self, name):
+        """
+        索引を読み込む
+        @param name テキストのファイル名
+        @return 特徴量の配列
+        """
+        rows = self.state['streams'][name]['rows']
+        if not rows:
+            return np.zeros(0, dtype=FEATURE)
+        return np.memmap(self.index_path(name), dtype=FEATURE, mode='r', shape=(rows,))
+
+    def read_lines(self, name, indices):
+        """
+        索引を用いて指定した行だけを読み込む
+        @param name テキストのファイル名
+        @param indices 昇順に並んだ行番号の配列
+        @return テキスト、標準形/表層形、品詞列の行のリスト (存在しないファイルはNone)
+        """
+        stream = self.state['streams'][name]
+        offsets = self.features(name)['offsets']
+
+        # 各行の末尾は次の行の先頭 (最後の行は索引済みの位置)
+        following = indices + 1
+        has_next = following < len(offsets)
+        following[~has_next] = 0
+
+        results = []
+        for j, file_name in enumerate(stream['files']):
+            if file_name is None:
+                results.append(None)
+                continue
+
+            starts = offsets[indices, j]
+            ends = np.where(has_next, offsets[following, j], stream['offsets'][j])
+            if starts.size == 0 or int(ends.max()) == 0:
+                results.append([""] * len(indices))
+                continue
+
+            with open("data/" + file_name, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    results.append([mm[start:end].decode('utf-8') for start, end in zip(starts.tolist(), ends.tolist())])
+        return results
+
+
+class IndexFilter(TweetFilter):
+    """特徴量の索引の判定でフィルタリングし、残った行のテキストだけを読み込むクラス"""
+    def __init__(self, config):
+        """
+        コンストラクタ
+        @param config 設定ファイルの情報
+        """
+        super().__init__(config)
+        self.index = FeatureIndex(self, config['index']['folder'])
+
+    def streams(self):
+        """
+        索引を作るファイル名を求める
+        @return 各コーパスの (テキスト, 標準形/表層形, 品詞列) のファイル名のリスト (存在しなければNone) の辞書
+        """
+        streams = {}
+        if os.path.isfile("data/" + self.inp_fp) and os.path.isfile("data/" + self.tar_fp):
+            names, std, prt = self.turn_files()
+            streams['inp'] = [names[0], names[2] if std else None, names[-2] if prt else None]
+            streams['tar'] = [names[1], names[3] if std else None, names[-1] if prt else None]
+        if os.path.isfile("data/" + self.dig_fp):
+            names, std, prt = self.dialog_files()
+            streams['dig'] = [names[0], names[1] if std else None, names[-1] if prt else None]
+        return streams
+
+    def text_mask(self, features):
+        """
+        text_check と同じ判定を索引の各行にまとめて行う
+        @param features 特徴量の配列
+        @return 適切な行がTrueの配列
+        """
+        words, sents = features['words'], features['sents']
+        return (self.len_min <= words) & (words <= self.len_max) &\
+            (self.sent_min <= sents) & (sents <= self.sent_max) &\
+            (self.sent_len_min <= features['sent_min']) & (features['sent_max'] <= self.sent_len_max)
+
+    def part_mask(self, features):
+        """
+        part_check と同じ判定を索引の各行にまとめて行う
+        @param features 特徴量の配列
+        @return 適切な行がTrueの配列
+        """
+        return (features['parts'] & self.coder.exist_bits) == self.coder.exist_bits
+
+    def removed_lines(self, name, indices):
+        """
+        指定した行を読み込んで指定した品詞を除去する
+        @param name テキストのファイル名
+        @param indices 昇順に並んだ行番号の配列
+        @return テキスト、標準形/表層形、品詞列の行のリスト (存在しないファイルはNone)
+        """
+        texts, standards, parts = self.index.read_lines(name, indices)
+        if parts is None:
+            return texts, standards, parts
+
+        removal = PartRemoval(texts, standards, parts, self.coder, 0)
+        results = [removal.line(i) for i in range(len(indices))]
+        return [result[0] for result in results], [result[1] for result in results] if standards is not None else None,\
+            [result[2] for result in results]
+
+    def turn_filtering(self):
+        """入出力コーパスを索引の判定でフィルタリングする"""
+        streams = self.streams()
+        inp_names, tar_names = streams['inp'], streams['tar']
+        self.index.update(inp_names)
+        self.index.update(tar_names)
+
+        # 両方の索引がある行だけを判定する
+        inp, tar = self.index.features(inp_names[0]), self.index.features(tar_names[0])
+        n = min(len(inp), len(tar))
+        inp, tar = inp[:n], tar[:n]
+
+        mask = self.text_mask(inp) & self.text_mask(tar) &\
+            (np.abs(inp['words'].astype(np.int64) - tar['words']) <= self.len_diff)
+        if inp_names[2] is not None:
+            mask &= self.part_mask(inp) & self.part_mask(tar)
+        indices = np.flatnonzero(mask)
+
+        # 残った行だけを読み込んで書き込む
+        files_fi = [[open("filtered/" + name, 'w', encoding='utf-8') if name is not None else None for name in names] for names in [inp_names, tar_names]]
+        for k in range(0, len(indices), CHUNK_LINES):
+            chunk = indices[k:k + CHUNK_LINES]
+            for names, files in zip([inp_names, tar_names], files_fi):
+                for lines, f in zip(self.removed_lines(names[0], chunk), files):
+                    if f is not None:
+                        f.write("".join(lines))
+
+        for files in files_fi:
+            for f in files:
+                if f is not None:
+                    f.close()
+
+        print(self.inp_fp + "/" + self.tar_fp + ": " + str(n) + " -> " + str(len(indices)))
+
+    def dialog_filtering(self):
+        """対話コーパスを索引の判定でフィルタリングする"""
+        names = self.streams()['dig']
+        self.index.update(names)
+        features = self.index.features(names[0])
+
+        ok = self.text_mask(features) & ~features['blank']
+        if names[2] is not None:
+            ok &= self.part_mask(features)
+        blank = features['blank']
+        cnt = int(np.count_nonzero(blank))
+
+        # 空行で区切られた対話を TweetFilter.split_dialog と同じ区間に分け、保存する対話の先頭の行番号と発話数を求める
+        spans = split_spans(zip(ok.tolist(), blank.tolist(), features['words'].tolist()), self.len_diff, True)
+        dialogs = [(start, size) for start, size in spans if 1 < size and self.turn_min < size and size - 1 <= self.turn_max]
+
+        # 保存する対話の行だけを読み込んで書き込む
+        files_fi = [open("filtered/" + name, 'w', encoding='utf-8') if name is not None else None for name in names]
+        for k in range(0, len(dialogs), CHUNK_LINES):
+            chunk = dialogs[k:k + CHUNK_LINES]
+            indices = np.concatenate([np.arange(start, start + size) for start, size in chunk])
+            ends = set(np.cumsum([size for _, size in chunk]).tolist())
+            for lines, f in zip(self.removed_lines(names[0], indices), files_fi):
+                if f is not None:
+                    f.write("".join([line + "\n" if j + 1 in ends else line for j, line in enumerate(lines)]))
+
+        for f in files_fi:
+            if f is not None:
+                f.close()
+
+        print(self.dig_fp + ": " + str(cnt) + " -> " + str(len(dialogs)))
+
+    def filtering(self):
+        """
+        保存してあるすべてのコーパスを、索引を更新してからフィルタリングする
+        filteredフォルダを作り直すため、差分のフィルタリングの状態を消さないよう incremental とは併用しない
+        """
+        # 差分のフィルタリングを行う設定なら終了
+        if self.incremental:
+            print("index is not used with incremental filtering (run with --full)")
+            return
+
+        # dataフォルダがなければ終了
+        if not os.path.isdir("data"):
+            print("no data folder")
+            return
+
+        # filteredフォルダがなければ作成する
+        if not os.path.isdir("filtered"):
+            os.mkdir("filtered")
+
+        # filteredフォルダ内のファイルをすべて削除
+        for root, _, files in os.walk("filtered", topdown=False):
+            for name in files:
+                os.remove(os.path.join(root, name))
+
+        streams = self.streams()
+        if not streams:
+            print("no filtered file")
+            return
+
+        # 入出力コーパスをフィルタリングする
+        if 'inp' in streams:
+            self.turn_filtering()
+
+        # 対話コーパスをフィルタリングする
+        if 'dig' in streams:
+            self.dialog_filtering()
+
+        # ほぼ同じデータを取り除く
+        if self.near_dup['use']:
+            jobs = []
+            if 'inp' in streams:
+                jobs.append(("turn",) + self.turn_files() + (self.inp_fp + "/" + self.tar_fp,))
+            if 'dig' in streams:
+                jobs.append(("dialog",) + self.dialog_files() + (self.dig_fp,))
+            for index in self.near_dup_removal(jobs, {}):
+                index.commit()
+                index.close()
+
+
+if __name__ == '__main__':
+    # 設定ファイルを読み込む
+    config = yaml.load(stream=open("config/config.yml", 'rt', encoding='utf-8'), Loader=yaml.SafeLoader)
+
+    # 索引を更新する
+    index_filter = IndexFilter(config)
+    for names in index_filter.streams().values():
+        print(names[0] + ": " + str(index_filter.index.update(names)))
@@ -7,10 +7,545 @@ __date__ = "29 Apr 2019"
 
 
 # 必要なモジュールをインポート
+import io
 import os
 import yaml
 import re
+import json
+import shutil
+import hashlib
+import argparse
+import tempfile
+import multiprocessing
+from itertools import islice, repeat, compress
+import numpy as np
 import MeCab
+from checkpoint import atomic_write
+from profiler import Profiler, PROFILE_MODES
+from near_dup import NearDupIndex, BATCH_ITEMS, join_tokens
+
+
+# 一度に読み込む行数
+CHUNK_LINES = 65536
+
+# シャードの境界を探す際に一度に読み込むバイト数
+BLOCK_SIZE = 16777216
+
+# 差分フィルタリングの状態を保存するファイル
+STATE_FILE = "filtered/.state.json"
+
+# ほぼ同じデータを探す索引 (コーパスの種類ごと)
+NEAR_DUP_FILE = "filtered/.near_dup_%s.sqlite"
+
+# 入出力コーパスでほぼ同じかどうかを比べる列 (0: 入力文、1: 目標文)
+TURN_KEYS = {'input': [0], 'target': [1], 'pair': [0, 1]}
+
+# 収集中の対話データの書き出しが完了した位置が記録されたジャーナル
+JOURNAL_FILE = "data/.journal.json"
+
+# 文の区切り (UTF-8のバイト列)
+SENT_SEPS = [sep.encode('utf-8') for sep in ["。", "！", "？", "!?"]]
+
+
+def open_range(path, offset=0, n_lines=None):
+    """
+    ファイルの指定したバイト位置から指定した行数だけを読み込むイテレータを作る
+    @param path ファイルパス
+    @param offset 読み込みを始めるバイト位置 (行の先頭)
+    @param n_lines 読み込む行数 (Noneならファイルの末尾まで)
+    @return 開いたファイル
+    @return 行のイテレータ
+    """
+    f = open(path, 'rb')
+    f.seek(offset)
+    f = io.TextIOWrapper(f, encoding='utf-8')
+    return f, islice(f, n_lines)
+
+
+def find_bytes(f, sep, start):
+    """
+    ファイルの指定したバイト位置以降で最初に現れるバイト列の位置を求める
+    @param f バイナリモードで開いたファイル
+    @param sep 探すバイト列
+    @param start 探し始めるバイト位置
+    @return バイト列の位置 (見つからなければ-1)
+    """
+    f.seek(start)
+    pos, rest = start, b""
+    while True:
+        block = f.read(BLOCK_SIZE)
+        if not block:
+            return -1
+        found = (rest + block).find(sep)
+        if found >= 0:
+            return pos - len(rest) + found
+        pos += len(block)
+        rest = (rest + block)[-(len(sep) - 1):] if len(sep) > 1 else b""
+
+
+def last_boundary(path, sep, start, limit=None):
+    """
+    ファイルの指定した範囲で最後に現れる区切りの直後の位置を求める
+    @param path ファイルパス
+    @param sep 区切りのバイト列
+    @param start 範囲の先頭のバイト位置
+    @param limit 範囲の末尾のバイト位置 (Noneならファイルサイズ)
+    @return 区切りの直後のバイト位置 (区切りがなければ範囲の先頭)
+    """
+    size = os.path.getsize(path)
+    end = size if limit is None else min(limit, size)
+    with open(path, 'rb') as f:
+        while start < end:
+            pos = max(start, end - BLOCK_SIZE)
+            f.seek(pos)
+            found = f.read(end - pos).rfind(sep)
+            if found >= 0:
+                return pos + found + len(sep)
+            if pos == start:
+                break
+            end = pos + len(sep) - 1
+    return start
+
+
+def count_lines(f, bounds, start=0):
+    """
+    ファイルの指定したバイト位置から各バイト位置までにある行数を求める
+    @param f バイナリモードで開いたファイル
+    @param bounds 昇順に並んだバイト位置のリスト
+    @param start 数え始めるバイト位置
+    @return 行数のリスト
+    """
+    f.seek(start)
+    counts, pos, lines = [], start, 0
+    for bound in bounds:
+        while pos < bound:
+            block = f.read(min(BLOCK_SIZE, bound - pos))
+            if not block:
+                break
+            lines += block.count(b"\n")
+            pos += len(block)
+        counts.append(lines)
+    return counts
+
+
+def line_offsets(path, starts, offset=0):
+    """
+    ファイルの指定したバイト位置から数えた各行番号の行の先頭のバイト位置を求める
+    @param path ファイルパス
+    @param starts 昇順に並んだ行番号のリスト
+    @param offset 数え始めるバイト位置 (行の先頭)
+    @return バイト位置のリスト (行が足りなければファイルサイズ)
+    """
+    offsets = [offset for start in starts if start == 0]
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        pos, lines = offset, 0
+        while len(offsets) < len(starts):
+            block = f.read(BLOCK_SIZE)
+            if not block:
+                break
+            n, ends = block.count(b"\n"), None
+            while len(offsets) < len(starts) and starts[len(offsets)] <= lines + n:
+                if ends is None:
+                    ends = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == 10)
+                offsets.append(pos + int(ends[starts[len(offsets)] - lines - 1]) + 1)
+            pos += len(block)
+            lines += n
+    return offsets + [os.path.getsize(path)] * (len(starts) - len(offsets))
+
+
+def plan_shards(paths, sep, n_shards, offsets=None, end=None):
+    """
+    行ごとに対応するファイルを、基準のファイルに区切りが現れる位置でほぼ同じバイト数のシャードに分ける
+    @param paths ファイルパスのリスト (先頭が基準のファイル)
+    @param sep シャードの境界とする区切り (この直後で分ける)
+    @param n_shards シャード数
+    @param offsets 各ファイルの分け始めるバイト位置のリスト (Noneなら先頭から)
+    @param end 基準のファイルの分け終わるバイト位置 (行の先頭、Noneならファイルの末尾まで)
+    @return 各シャードの (各ファイルの読み込みを始めるバイト位置のリスト, 行数) のリスト (endがNoneなら最後のシャードの行数はNone)
+    @return 各ファイルの分け終わるバイト位置のリスト (endがNoneならファイルサイズ)
+    """
+    offsets = offsets or [0] * len(paths)
+    size = os.path.getsize(paths[0]) if end is None else end
+    with open(paths[0], 'rb') as f:
+        bounds = [offsets[0]]
+        for i in range(1, n_shards):
+            pos = find_bytes(f, sep, max(offsets[0] + (size - offsets[0]) * i // n_shards, bounds[-1]))
+            if pos < 0 or size <= pos + len(sep):
+                break
+            if bounds[-1] < pos + len(sep):
+                bounds.append(pos + len(sep))
+        starts = count_lines(f, bounds + [size], offsets[0])
+
+    # 末尾まで読み込む場合は、最後の改行のない行も含めるため行数を指定しない
+    n_lines = [b - a for a, b in zip(starts, starts[1:])]
+    if end is None:
+        n_lines[-1] = None
+
+    # 各シャードの先頭の行 (範囲を指定した場合は末尾の次の行も) の各ファイルでの位置
+    if end is None:
+        lines = [line_offsets(path, starts[:-1], offset) for path, offset in zip(paths[1:], offsets[1:])]
+        return [([bounds[i]] + [offset[i] for offset in lines], n_lines[i]) for i in range(len(bounds))],\
+            [os.path.getsize(path) for path in paths]
+
+    lines = [line_offsets(path, starts, offset) for path, offset in zip(paths[1:], offsets[1:])]
+    return [([bounds[i]] + [offset[i] for offset in lines], n_lines[i]) for i in range(len(bounds))],\
+        [end] + [offset[-1] for offset in lines]
+
+
+def concat_files(srcs, dest, append=False):
+    """
+    複数のファイルを順につなげて一つのファイルにする
+    @param srcs つなげるファイルパスのリスト
+    @param dest 書き込むファイルパス
+    @param append ファイルの末尾に追加するかどうか
+    """
+    with open(dest, 'ab' if append else 'wb') as f:
+        for src in srcs:
+            with open(src, 'rb') as f_src:
+                shutil.copyfileobj(f_src, f)
+
+
+def read_dialogs(f_dig, f_std=None, f_prt=None):
+    """
+    並行するファイルから対話を一つずつ読み込むジェネレータ (保持するのは読み込み中の対話のみ)
+    @param f_dig 対話の行のイテレータ
+    @param f_std 標準形/表層形の行のイテレータ (Noneなら読み込まない)
+    @param f_prt 品詞列の行のイテレータ (Noneなら読み込まない)
+    @return 対話の各発話の (テキスト, 標準形/表層形, 品詞列) の行のリスト
+    @return 空行で終わったかどうか (Falseならファイルの末尾で終わった)
+    """
+    dialog = []
+    for line in f_dig:
+        line_std = next(f_std, "") if f_std is not None else None
+        line_prt = next(f_prt, "") if f_prt is not None else None
+        if line == "\n":
+            yield dialog, True
+            dialog = []
+        else:
+            dialog.append((line, line_std, line_prt))
+    if dialog:
+        yield dialog, False
+
+
+def split_spans(items, len_diff, first=False):
+    """
+    発話の列を、適切な発話が続き単語数の差が一定以下に収まる区間に分けるジェネレータ
+    @param items 各発話の (適切かどうか, 空行かどうか, 単語数) のイテレータ
+    @param len_diff 区間の単語数の最大と最小の差の上限
+    @param first 列の先頭が対話の先頭かどうか (単語数の最小値を0として始める)
+    @return 区間の最初の発話の番号と発話数 (書き込むかどうかは発話数で決める)
+    """
+    # 単語数の最小値 (Noneなら区間が空)、最大値、区間の最初の発話の番号と発話数
+    low, high, start, size = 0 if first else None, 0, 0, 0
+
+    for i, (ok, blank, length) in enumerate(items):
+        if blank or not ok:
+            yield start, size
+            low, start, size = None, i + 1, 0
+        elif low is None:
+            low = high = length
+            start, size = i, 1
+        else:
+            if low > length:
+                low = length
+            elif high < length:
+                high = length
+
+            if high - low <= len_diff:
+                size += 1
+            else:
+                yield start, size
+                low, high, start, size = length, length, i, 1
+
+    yield start, size
+
+
+def is_joined(text):
+    """
+    改行で終わる各行が " ".join(line.split()) + "\\n" の形になっているかを分割せずに判定する
+    (空白以外の空白文字は印字可能でないため isprintable で除外できる)
+    @param text 改行で終わる行をつなげた文字列
+    @return True: なっている、False: なっていない可能性がある
+    """
+    return not ("  " in text or " \n" in text or "\n " in text or text[:1] == " ") and text.replace("\n", "").isprintable()
+
+
+class LineBlock():
+    """
+    空白で分かち書きされた複数の行を一つのバイト列にまとめ、行ごとの集計を配列で求めるクラス
+    各行は " ".join(line.split()) + "\\n" の形にそろえて扱う
+    """
+    def __init__(self, lines):
+        """
+        コンストラクタ
+        @param lines 行のリスト
+        """
+        text = "".join(lines)
+        if text.count("\n") != len(lines):
+            lines = [line if line[-1:] == "\n" else line + "\n" for line in lines]
+            text = "".join(lines)
+        if not is_joined(text):
+            lines = [" ".join(line.split()) + "\n" for line in lines]
+            text = "".join(lines)
+
+        self.lines = lines
+        self.text = text
+        self.data = text.encode('utf-8')
+        self.bytes = np.frombuffer(self.data, dtype=np.uint8)
+        self.ends = np.flatnonzero(self.bytes == 10)
+        self.starts = np.concatenate(([0], self.ends + 1))[:-1]
+
+    def count_words(self):
+        """
+        各行の単語数を求める
+        @return 単語数の配列
+        """
+        spaces = np.diff(np.searchsorted(np.flatnonzero(self.bytes == 32), self.ends), prepend=0)
+        return np.where(self.ends > self.starts, spaces + 1, 0)
+
+    def token_ids(self, table):
+        """
+        各単語を番号に変換する
+        @param table 単語から128未満の番号への辞書
+        @return 単語の番号の配列 (辞書にない単語は-1)
+        @return 各単語が含まれる行番号の配列
+        """
+        words = self.count_words()
+        ids = np.fromiter(map(table.get, self.text.split(), repeat(-1)), dtype=np.int8, count=int(words.sum()))
+        return ids, np.repeat(np.arange(len(words)), words)
+
+    def sent_stats(self):
+        """
+        re.split で文に区切った場合の各行の文数と、文単位の長さ (単語数 + 1) の最小と最大を求める
+        末尾の空の文は長さに含めず、長さを求める文がない行は最小が十分大きく、最大が十分小さい値になる
+        @return 文数、文単位の長さの最小、文単位の長さの最大の配列
+        """
+        data = self.bytes
+        n = len(data)
+        if not n:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        # 区切りの先頭と、区切りに含まれるバイト
+        sep = np.zeros(n, dtype=bool)
+        inside = np.zeros(n, dtype=bool)
+        for pattern in SENT_SEPS:
+            k = len(pattern)
+            if n < k:
+                continue
+            match = np.ones(n - k + 1, dtype=bool)
+            for j, byte in enumerate(pattern):
+                match &= data[j:n - k + 1 + j] == byte
+            heads = np.flatnonzero(match)
+            sep[heads] = True
+            for j in range(k):
+                inside[heads + j] = True
+
+        # 単語の先頭となるバイト
+        newline = data == 10
+        content = ~(inside | newline | (data == 32))
+        word_head = content & ~np.concatenate(([False], content[:-1]))
+
+        # 各バイトが何番目の文に含まれるか (行が変わると文も変わる)
+        line_of = np.cumsum(newline) - newline
+        piece_of = np.cumsum(sep) - sep + line_of
+
+        n_lines = len(self.ends)
+        seps = np.bincount(line_of[sep], minlength=n_lines)
+        lens = np.bincount(piece_of[word_head], minlength=int(seps.sum()) + n_lines) + 1
+
+        # 各行の最初と最後の文
+        first = np.concatenate(([0], np.cumsum(seps + 1)[:-1]))
+        last = first + seps
+
+        # 区切りで終わる行と空行は末尾の文が空になる
+        empty = (self.ends == self.starts) | inside[np.maximum(self.ends - 1, 0)]
+        lens_min, lens_max = lens.copy(), lens.copy()
+        lens_min[last[empty]] = np.iinfo(np.int64).max
+        lens_max[last[empty]] = np.iinfo(np.int64).min
+
+        return seps + 1, np.minimum.reduceat(lens_min, first), np.maximum.reduceat(lens_max, first)
+
+
+class PartCoder():
+    """
+    品詞トークンを小さな整数に変換し、品詞の除去と存在の判定を表の参照とビット演算で行うクラス
+    同じトークンが複数の品詞に割り当てられている場合は、先頭の品詞の番号と設定を用いる
+    """
+    def __init__(self, token_list, dump_list, exist_list):
+        """
+        コンストラクタ
+        @param token_list 各品詞のトークンのリスト
+        @param dump_list 各品詞を残すかどうかのリスト
+        @param exist_list 各品詞が存在しなければならないかどうかのリスト
+        """
+        # 品詞トークンの番号 (token_list で最初に現れる位置)
+        self.ids = {}
+        for i, token in enumerate(token_list):
+            self.ids.setdefault(token, i)
+        self.width = len(token_list)
+
+        # 番号から残すかどうかへの表 (末尾は未知のトークンの番号-1に対応する)
+        self.keep = np.zeros(self.width + 1, dtype=bool)
+        for i in self.ids.values():
+            self.keep[i] = dump_list[i]
+        self.keep_tokens = frozenset([token for token, i in self.ids.items() if dump_list[i]])
+
+        # 品詞トークンのビットと、存在しなければならない品詞トークンのビット列
+        self.bits = {token: 1 << i for token, i in self.ids.items()}
+        self.exist_bits = 0
+        for token, exist in zip(token_list, exist_list):
+            if exist:
+                self.exist_bits |= self.bits[token]
+
+    def line_bits(self, tokens):
+        """
+        品詞トークンのリストに含まれる品詞をビット列で表す
+        @param tokens 品詞トークンのリスト
+        @return ビット列
+        """
+        return sum(map(self.bits.get, set(tokens), repeat(0)))
+
+    def check(self, tokens):
+        """
+        存在しなければならない品詞トークンがすべて含まれているかを判定する
+        @param tokens 品詞トークンのリスト
+        @return True: 含まれている、False: 含まれていない
+        """
+        return self.line_bits(tokens) & self.exist_bits == self.exist_bits
+
+
+class PartRemoval():
+    """複数の行から指定した品詞をまとめて除去するクラス"""
+    def __init__(self, texts, standards, parts, coder, len_min):
+        """
+        コンストラクタ
+        除去しても長さが足りない行は品詞除去を行わず、除去する品詞を含まない行は元の行をそのまま使う
+        @param texts 空白で分かち書きされたテキストのリスト
+        @param standards 標準形/表層形のテキストのリスト (存在しなければNone)
+        @param parts 品詞列のリスト
+        @param coder 品詞トークンの番号と設定
+        @param len_min 全体の長さの最小
+        """
+        self.coder = coder
+
+        self.texts = LineBlock(texts)
+        self.standards = LineBlock(standards) if standards is not None else None
+        self.parts = LineBlock(parts)
+
+        n_words = self.texts.count_words()
+        n_tokens = self.parts.count_words()
+        self.n_stds = self.standards.count_words() if self.standards is not None else np.zeros_like(n_tokens)
+
+        # 各行の単語数がそろっていれば、残る単語数は残す品詞トークンの数になる
+        self.ids, self.rows = self.parts.token_ids(coder.ids)
+        self.keep = coder.keep[self.ids]
+        kept = np.bincount(self.rows[self.keep], minlength=len(n_tokens))
+        self.aligned = (n_words == n_tokens) & ((self.n_stds == 0) | (self.n_stds == n_tokens))
+        self.identity = self.aligned & (kept == n_tokens)
+
+        # そろっていなければ、残る単語数は各行の単語数の最小を超えない (標準形/表層形の行が空の場合は del_part と同様に使わない)
+        bound = np.minimum(n_words, n_tokens)
+        bound = np.where(self.n_stds > 0, np.minimum(bound, self.n_stds), bound)
+        self.lens = np.where(self.aligned, kept, bound)
+
+        # そろっていない行は一行ずつ品詞除去を行う
+        self.kept = {}
+        for i in np.flatnonzero(~self.aligned & (self.lens >= len_min)):
+            self.kept[i] = self.remove(i)
+            self.lens[i] = len(self.kept[i][0])
+
+    def remove(self, i):
+        """
+        一行から指定した品詞を除去する
+        @param i 行番号
+        @return 品詞除去された単語のリスト、標準形/表層形のリスト、品詞のリスト
+        """
+        keep = self.coder.keep_tokens
+        words, tokens = self.texts.lines[i].split(), self.parts.lines[i].split()
+        if self.n_stds[i]:
+            kept = [node for node in zip(words, self.standards.lines[i].split(), tokens) if node[2] in keep]
+            return [node[0] for node in kept], [node[1] for node in kept], [node[2] for node in kept]
+        kept = [node for node in zip(words, tokens) if node[1] in keep]
+        return [node[0] for node in kept], [], [node[1] for node in kept]
+
+    def line(self, i):
+        """
+        品詞除去された行を求める
+        @param i 行番号
+        @return 品詞除去されたテキスト、標準形/表層形のテキスト、品詞列
+        """
+        if self.identity[i]:
+            standard = self.standards.lines[i] if self.n_stds[i] else "\n"
+            return self.texts.lines[i], standard, self.parts.lines[i]
+        words, stds, tokens = self.kept[i] if i in self.kept else self.remove(i)
+        return " ".join(words) + "\n", " ".join(stds) + "\n", " ".join(tokens) + "\n"
+
+    def part_bits(self):
+        """
+        品詞除去後の各行に含まれる品詞トークンをビット列で表す (PartCoder の番号のビット)
+        @return 各行のビット列の配列
+        """
+        # 各行に残るトークンの番号の出現を数え、現れた番号のビットを足し合わせる
+        width = self.coder.width
+        codes = self.rows[self.keep] * width + self.ids[self.keep]
+        present = np.bincount(codes, minlength=len(self.lens) * width).reshape(len(self.lens), width) > 0
+        bits = (present.astype(np.uint32) << np.arange(width, dtype=np.uint32)).sum(axis=1, dtype=np.uint32)
+
+        # 各行の単語数がそろっていない行は品詞除去後の品詞で求める
+        for i in self.kept:
+            bits[i] = self.coder.line_bits(self.kept[i][2])
+        return bits
+
+    def exist_mask(self, indices):
+        """
+        part_check と同じ判定を複数の行にまとめて行う
+        @param indices 判定する行番号の配列
+        @return 適切な行がTrueの配列
+        """
+        exist_bits = self.coder.exist_bits
+        return (self.part_bits()[indices] & exist_bits) == exist_bits
+
+
+class DialogWriter():
+    """対話を書き込むファイルごとに行を溜め、一定の行数ごとにまとめて書き込むクラス"""
+    def __init__(self, paths, mode='w'):
+        """
+        コンストラクタ
+        @param paths 対話、標準形/表層形、品詞列の順に書き込むファイルパスのリスト (Noneなら書き込まない)
+        @param mode ファイルを開くモード
+        """
+        self.files = [open(path, mode, encoding='utf-8') if path else None for path in paths]
+        self.bufs = [[] if path else None for path in paths]
+        self.n_lines = 0
+
+    def write(self, dialog):
+        """
+        対話を一つ書き込む
+        @param dialog 各発話の (テキスト, 標準形/表層形, 品詞列) の行のリスト
+        """
+        for i, buf in enumerate(self.bufs):
+            if buf is not None:
+                buf.extend([tweet[i] for tweet in dialog])
+                buf.append("\n")
+        self.n_lines += len(dialog) + 1
+        if self.n_lines >= CHUNK_LINES:
+            self.flush()
+
+    def flush(self):
+        """溜めた行をファイルに書き込む"""
+        for f, buf in zip(self.files, self.bufs):
+            if buf:
+                f.write("".join(buf))
+                del buf[:]
+        self.n_lines = 0
+
+    def close(self):
+        """溜めた行を書き込んでファイルを閉じる"""
+        self.flush()
+        for f in self.files:
+            if f is not None:
+                f.close()
 
 
 class TweetFilter():
@@ -39,6 +574,16 @@ class TweetFilter():
         self.inp_prt_fp = inp_fn + "_" + prt_fn + ".txt"
         self.tar_prt_fp = tar_fn + "_" + prt_fn + ".txt"
 
+        # 並列化の設定を取得
+        self.config = config
+        self.processes = config['parallel']['processes']
+        self.shard_bytes = config['parallel']['shard_bytes']
+        self.incremental = config['incremental']
+
+        # フィルタリング内容が変わったかを判定するための値
+        content = json.dumps({'filter': config['filter'], 'part': config['part']}, sort_keys=True, ensure_ascii=False)
+        self.fingerprint = hashlib.sha1(content.encode('utf-8')).hexdigest()
+
         # フィルタリング内容を取得
         fi = config['filter']
         fi_len = fi['length']
@@ -52,6 +597,9 @@ class TweetFilter():
         self.turn_max = fi_len['turn_max']
         self.len_diff = fi_len['len_diff']
 
+        # ほぼ同じデータの除去の設定を取得
+        self.near_dup = fi['near_dup']
+
         fi_dp = fi['dump']
         self.dump_list = [
             fi_dp['noun_main'], fi_dp['verb_main'], fi_dp['adjective_main'],
@@ -83,6 +631,9 @@ class TweetFilter():
             pt['reading_point'], pt['other']
         ]
 
+        # 品詞トークンの番号と、残す品詞と存在しなければならない品詞の設定
+        self.coder = PartCoder(self.token_list, self.dump_list, self.exist_list)
+
     def text_check(self, text):
         """
         テキストをフィルタリングする
@@ -90,7 +641,15 @@ class TweetFilter():
         @return True: 適切、False: 不適切
         """
         text = text.strip()
-        words = text.split()
+        return self.words_check(text, text.split())
+
+    def words_check(self, text, words):
+        """
+        単語に分割済みのテキストをフィルタリングする
+        @param text 前後の空白を除いたテキスト
+        @param words テキストの単語のリスト
+        @return True: 適切、False: 不適切
+        """
         if len(words) < self.len_min or self.len_max < len(words):
             return False
 
@@ -113,11 +672,7 @@ class TweetFilter():
         @param part 品詞列
         @return True: 適切、False: 不適切
         """
-        parts = part.strip().split()
-        for exist, token in zip(self.exist_list, self.token_list):
-            if exist and token not in parts:
-                return False
-        return True
+        return self.coder.check(part.split())
 
     def diff_check(self, inp, tar):
         """
@@ -140,213 +695,399 @@ class TweetFilter():
         @return 品詞除去された標準形/表層形のテキスト
         @return 品詞除去された品詞列
         """
-        result_text, result_standard, result_part = "", "", ""
-        words, standards, parts = text.strip().split(), standard.strip().split() if standard else None, part.strip().split()
+        keep = self.coder.keep_tokens
+        words, standards, parts = text.split(), standard.split() if standard else None, part.split()
 
+        # 残す品詞の単語だけを選び、それぞれ一度の join で連結する (zip で最も短い列にそろえる)
         if standards:
-            for word, standard, part in zip(words, standards, parts):
-                if part in self.token_list:
-                    part_idx = self.token_list.index(part)
-                    if self.dump_list[part_idx]:
-                        result_text += word + " "
-                        result_standard += standard + " "
-                        result_part += part + " "
-        else:
-            for word, part in zip(words, parts):
-                if part in self.token_list:
-                    part_idx = self.token_list.index(part)
-                    if self.dump_list[part_idx]:
-                        result_text += word + " "
-                        result_part += part + " "
+            kept = [node for node in zip(words, standards, parts) if node[2] in keep]
+            return " ".join([node[0] for node in kept]) + "\n", " ".join([node[1] for node in kept]) + "\n",\
+                " ".join([node[2] for node in kept]) + "\n"
+
+        kept = [node for node in zip(words, parts) if node[1] in keep]
+        return " ".join([node[0] for node in kept]) + "\n", None, " ".join([node[1] for node in kept]) + "\n"
 
-        return result_text.strip() + "\n", result_standard.strip() + "\n" if standards else None, result_part.strip() + "\n"
+    def sent_mask(self, block):
+        """
+        text_check の文に関する判定を複数の行にまとめて行う
+        @param block 判定する行
+        @return 適切な行がTrueの配列
+        """
+        sents, sent_mins, sent_maxs = block.sent_stats()
+        return (self.sent_min <= sents) & (sents <= self.sent_max) &\
+            (self.sent_len_min <= sent_mins) & (sent_maxs <= self.sent_len_max)
+
+    def turn_files(self):
+        """
+        入出力コーパスのファイル名を求める
+        @return ファイル名のリスト (入力文、目標文、標準形/表層形、品詞列の順で、存在するもののみ)
+        @return 標準形/表層形のファイルが存在するかどうか
+        @return 品詞列のファイルが存在するかどうか
+        """
+        names = [self.inp_fp, self.tar_fp]
+
+        std = os.path.isfile("data/" + self.inp_std_fp) and os.path.isfile("data/" + self.tar_std_fp)
+        if std:
+            names += [self.inp_std_fp, self.tar_std_fp]
+
+        prt = os.path.isfile("data/" + self.inp_prt_fp) and os.path.isfile("data/" + self.tar_prt_fp)
+        if prt:
+            names += [self.inp_prt_fp, self.tar_prt_fp]
+
+        return names, std, prt
 
     def turn_filtering(self):
         """入出力コーパスをフィルタリングする"""
+        names, std, prt = self.turn_files()
+        cnt, cnt_ = self.filter_turns(names, std, prt)
+        print(self.inp_fp + "/" + self.tar_fp + ": " + str(cnt) + " -> " + str(cnt_))
+
+    def filter_turns(self, names, std, prt, offsets=None, n_lines=None, folder="filtered", append=False):
+        """
+        入出力コーパスを一定の行数ずつまとめてフィルタリングする
+        @param names turn_files で求めたファイル名のリスト
+        @param std 標準形/表層形のファイルが存在するかどうか
+        @param prt 品詞列のファイルが存在するかどうか
+        @param offsets 各ファイルの読み込みを始めるバイト位置のリスト (Noneなら先頭から)
+        @param n_lines 入力文のファイルから読み込む行数 (Noneなら末尾まで)
+        @param folder 書き込むフォルダ
+        @param append ファイルの末尾に追加するかどうか
+        @return フィルタリング前のデータ数
+        @return フィルタリング後のデータ数
+        """
         cnt, cnt_ = 0, 0
 
         # ファイルを開く
-        f_inp = open("data/" + self.inp_fp, 'r', encoding='utf-8')
-        f_tar = open("data/" + self.tar_fp, 'r', encoding='utf-8')
-        f_inp_fi = open("filtered/" + self.inp_fp, 'w', encoding='utf-8')
-        f_tar_fi = open("filtered/" + self.tar_fp, 'w', encoding='utf-8')
-
-        if os.path.isfile("data/" + self.inp_std_fp) and os.path.isfile("data/" + self.tar_std_fp):
-            std = True
-            f_inp_std = open("data/" + self.inp_std_fp, 'r', encoding='utf-8')
-            f_tar_std = open("data/" + self.tar_std_fp, 'r', encoding='utf-8')
-            f_inp_std_fi = open("filtered/" + self.inp_std_fp, 'w', encoding='utf-8')
-            f_tar_std_fi = open("filtered/" + self.tar_std_fp, 'w', encoding='utf-8')
-        else:
-            std = False
-
-        if os.path.isfile("data/" + self.inp_prt_fp) and os.path.isfile("data/" + self.tar_prt_fp):
-            prt = True
-            f_inp_prt = open("data/" + self.inp_prt_fp, 'r', encoding='utf-8')
-            f_tar_prt = open("data/" + self.tar_prt_fp, 'r', encoding='utf-8')
-            f_inp_prt_fi = open("filtered/" + self.inp_prt_fp, 'w', encoding='utf-8')
-            f_tar_prt_fi = open("filtered/" + self.tar_prt_fp, 'w', encoding='utf-8')
-        else:
-            prt = False
+        opened = [open_range("data/" + name, offset, n_lines) for name, offset in zip(names, offsets or [0] * len(names))]
+        files = [lines for _, lines in opened]
+        files_fi = [open(folder + "/" + name, 'a' if append else 'w', encoding='utf-8') for name in names]
+        f_inp = files[0]
 
-        # ファイルから読み込む
-        line_inp = f_inp.readline()
-        line_tar = f_tar.readline()
-        line_inp_std = f_inp_std.readline() if std else None
-        line_tar_std = f_tar_std.readline() if std else None
-        line_inp_prt = f_inp_prt.readline() if prt else None
-        line_tar_prt = f_tar_prt.readline() if prt else None
-
-        while line_inp:
-            cnt += 1
+        while True:
+            # 入力文のファイルを基準に、各ファイルから同じ行数を読み込む (足りない行は空文字列)
+            inp = list(islice(f_inp, CHUNK_LINES))
+            if not inp:
+                break
+            n = len(inp)
+            lines = [inp] + [list(islice(f, n)) for f in files[1:]]
+            lines = [chunk + [""] * (n - len(chunk)) for chunk in lines]
+            cnt += n
 
             # 指定した品詞を除外
             if prt:
-                line_inp, line_inp_std, line_inp_prt = self.del_part(line_inp, line_inp_std, line_inp_prt)
-                line_tar, line_tar_std, line_tar_prt = self.del_part(line_tar, line_tar_std, line_tar_prt)
-
-            # 適切なデータであるか判定
-            if self.text_check(line_inp) and self.text_check(line_tar) and self.diff_check(line_inp, line_tar) and\
-            (not prt or (self.part_check(line_inp_prt) and self.part_check(line_tar_prt))):
-                cnt_ += 1
-
-                # ファイルに書き込む
-                f_inp_fi.write(line_inp)
-                f_tar_fi.write(line_tar)
-                if std:
-                    f_inp_std_fi.write(line_inp_std)
-                    f_tar_std_fi.write(line_tar_std)
-                if prt:
-                    f_inp_prt_fi.write(line_inp_prt)
-                    f_tar_prt_fi.write(line_tar_prt)
-
-            # ファイルから読み込む
-            line_inp = f_inp.readline()
-            line_tar = f_tar.readline()
-            line_inp_std = f_inp_std.readline() if std else None
-            line_tar_std = f_tar_std.readline() if std else None
-            line_inp_prt = f_inp_prt.readline() if prt else None
-            line_tar_prt = f_tar_prt.readline() if prt else None
+                inp = PartRemoval(lines[0], lines[2] if std else None, lines[-2], self.coder, self.len_min)
+                tar = PartRemoval(lines[1], lines[3] if std else None, lines[-1], self.coder, self.len_min)
+                inp_lens, tar_lens = inp.lens, tar.lens
+            else:
+                inp, tar = LineBlock(lines[0]), LineBlock(lines[1])
+                inp_lens, tar_lens = inp.count_words(), tar.count_words()
+
+            # 適切なデータであるか、計算量の少ない判定から順に残った行だけを判定
+            mask = (self.len_min <= inp_lens) & (inp_lens <= self.len_max) &\
+                (self.len_min <= tar_lens) & (tar_lens <= self.len_max) &\
+                (np.abs(inp_lens - tar_lens) <= self.len_diff)
+
+            if prt and self.coder.exist_bits:
+                indices = np.flatnonzero(mask)
+                mask[indices] = inp.exist_mask(indices) & tar.exist_mask(indices)
+
+            indices = np.flatnonzero(mask)
+            if prt:
+                # 残った行だけを品詞除去後の行に置き換える
+                for j, removal in [(0, inp), (1, tar)]:
+                    results = {i: removal.line(i) for i in indices}
+                    lines[j] = {i: result[0] for i, result in results.items()}
+                    lines[j - 2] = {i: result[2] for i, result in results.items()}
+                    if std:
+                        lines[j + 2] = {i: result[1] for i, result in results.items()}
+                inp_texts = [lines[0][i] for i in indices]
+                tar_texts = [lines[1][i] for i in indices]
+            else:
+                inp_texts = [inp.lines[i] for i in indices]
+                tar_texts = [tar.lines[i] for i in indices]
+
+            mask[indices] = self.sent_mask(LineBlock(inp_texts)) & self.sent_mask(LineBlock(tar_texts))
+            indices = np.flatnonzero(mask)
+            cnt_ += len(indices)
+
+            # ファイルにまとめて書き込む
+            for chunk, f in zip(lines, files_fi):
+                f.write("".join([chunk[i] for i in indices]))
 
         # ファイルを閉じる
-        f_inp.close()
-        f_tar.close()
-        f_inp_fi.close()
-        f_tar_fi.close()
+        for f in [f for f, _ in opened] + files_fi:
+            f.close()
+
+        return cnt, cnt_
+
+    def dialog_files(self):
+        """
+        対話コーパスのファイル名を求める
+        @return ファイル名のリスト (対話、標準形/表層形、品詞列の順で、存在するもののみ)
+        @return 標準形/表層形のファイルが存在するかどうか
+        @return 品詞列のファイルが存在するかどうか
+        """
+        names = [self.dig_fp]
+
+        std = os.path.isfile("data/" + self.dig_std_fp)
         if std:
-            f_inp_std.close()
-            f_tar_std.close()
-            f_inp_std_fi.close()
-            f_tar_std_fi.close()
+            names.append(self.dig_std_fp)
+
+        prt = os.path.isfile("data/" + self.dig_prt_fp)
         if prt:
-            f_inp_prt.close()
-            f_tar_prt.close()
-            f_inp_prt_fi.close()
-            f_tar_prt_fi.close()
+            names.append(self.dig_prt_fp)
 
-        print(self.inp_fp + "/" + self.tar_fp + ": " + str(cnt) + " -> " + str(cnt_))
+        return names, std, prt
 
     def dialog_filtering(self):
         """対話コーパスをフィルタリングする"""
+        names, std, prt = self.dialog_files()
+        cnt, cnt_ = self.filter_dialogs(names, std, prt)
+        print(self.dig_fp + ": " + str(cnt) + " -> " + str(cnt_))
+
+    def filter_dialogs(self, names, std, prt, offsets=None, n_lines=None, folder="filtered", initial=True, append=False):
+        """
+        対話コーパスをフィルタリングする
+        @param names dialog_files で求めたファイル名のリスト
+        @param std 標準形/表層形のファイルが存在するかどうか
+        @param prt 品詞列のファイルが存在するかどうか
+        @param offsets 各ファイルの読み込みを始めるバイト位置のリスト (Noneなら先頭から)
+        @param n_lines 対話のファイルから読み込む行数 (Noneなら末尾まで)
+        @param folder 書き込むフォルダ
+        @param initial ファイルの先頭から読み込むかどうか (Falseなら空行の直後から読み込む)
+        @param append ファイルの末尾に追加するかどうか
+        @return フィルタリング前のデータ数
+        @return フィルタリング後のデータ数
+        """
         cnt, cnt_ = 0, 0
 
         # ファイルを開く
-        f_dig = open("data/" + self.dig_fp, 'r', encoding='utf-8')
-        f_dig_fi = open("filtered/" + self.dig_fp, 'w', encoding='utf-8')
+        opened = [open_range("data/" + name, offset, n_lines) for name, offset in zip(names, offsets or [0] * len(names))]
+        dialogs = read_dialogs(opened[0][1], opened[1][1] if std else None, opened[-1][1] if prt else None)
+        writer = DialogWriter([folder + "/" + self.dig_fp, folder + "/" + self.dig_std_fp if std else None,
+                               folder + "/" + self.dig_prt_fp if prt else None], 'a' if append else 'w')
 
-        if os.path.isfile("data/" + self.dig_std_fp):
-            std = True
-            f_dig_std = open("data/" + self.dig_std_fp, 'r', encoding='utf-8')
-            f_dig_std_fi = open("filtered/" + self.dig_std_fp, 'w', encoding='utf-8')
-        else:
-            std = False
+        # 空行の直後から読み込む場合は、空行を読み込んだ後と同じ状態から始める
+        first = initial
+        for dialog, closed in dialogs:
+            cnt += closed
+            for queue in self.split_dialog(dialog, prt, first):
+                len_queue = len(queue)
+                if 1 < len_queue and self.turn_min < len_queue and len_queue - 1 <= self.turn_max:
+                    cnt_ += 1
+                    writer.write(queue)
+            first = False
+
+        # ファイルを閉じる
+        for f, _ in opened:
+            f.close()
+        writer.close()
+
+        return cnt, cnt_
 
-        if os.path.isfile("data/" + self.dig_prt_fp):
-            prt = True
-            f_dig_prt = open("data/" + self.dig_prt_fp, 'r', encoding='utf-8')
-            f_dig_prt_fi = open("filtered/" + self.dig_prt_fp, 'w', encoding='utf-8')
+    def utterance(self, line, line_std, line_prt, prt):
+        """
+        発話を一度だけ単語に分割し、品詞の除去と判定に使い回す
+        @param line 空白で分かち書きされたテキストの行
+        @param line_std 標準形/表層形の行
+        @param line_prt 品詞列の行
+        @param prt 品詞列のファイルが存在するかどうか
+        @return 品詞除去した (テキスト, 標準形/表層形, 品詞列) の行
+        @return 単語数 (不適切な発話ならNone)
+        """
+        words = line.split()
+        if not prt:
+            return (line, line_std, None), len(words) if self.words_check(line.strip(), words) else None
+
+        # del_part と同じく残す品詞の単語だけを選ぶ (残すかどうかの列を最も短い列にそろえて各列に使う)
+        standards, parts = line_std.split() if line_std else None, line_prt.split()
+        mask = list(map(self.coder.keep_tokens.__contains__, parts))
+        if standards:
+            del mask[min(len(words), len(standards)):]
+            line_std = " ".join(compress(standards, mask)) + "\n"
         else:
-            prt = False
+            del mask[len(words):]
+            line_std = None
+        words, parts = list(compress(words, mask)), list(compress(parts, mask))
 
-        # ファイルから読み込む
-        line_dig = f_dig.readline()
-        line_dig_std = f_dig_std.readline() if std else None
-        line_dig_prt = f_dig_prt.readline() if prt else None
+        text = " ".join(words)
+        tweet = (text + "\n", line_std, " ".join(parts) + "\n")
+        return tweet, len(words) if self.words_check(text, words) and self.coder.check(parts) else None
 
-        min, max, queue, buf = 0, 0, [], []
+    def split_dialog(self, dialog, prt, first=False):
+        """
+        対話を適切な発話が続き、単語数の差が一定以下に収まる区間に分けるジェネレータ
+        @param dialog 各発話の (テキスト, 標準形/表層形, 品詞列) の行のリスト
+        @param prt 品詞列のファイルが存在するかどうか
+        @param first ファイルの先頭の対話かどうか (単語数の最小値を0として始める)
+        @return 区間の発話のリスト (書き込むかどうかは発話数で決める)
+        """
+        tweets, items = [], []
+        for line, line_std, line_prt in dialog:
+            tweet, length = self.utterance(line, line_std, line_prt, prt)
+            tweets.append(tweet)
+            items.append((length is not None, False, length))
 
-        while line_dig:
-            dump = False
+        for start, size in split_spans(items, self.len_diff, first):
+            yield tweets[start:start + size]
 
-            if line_dig == "\n":
-                cnt += 1
-                dump, min, buf = True, -1, []
+    def near_dup_index(self, kind):
+        """
+        ほぼ同じデータを探す索引を開く
+        @param kind "turn": 入出力コーパス、"dialog": 対話コーパス
+        @return 索引
+        """
+        nd = self.near_dup
+        return NearDupIndex(NEAR_DUP_FILE % kind, nd['shingle'], nd['bands'], nd['rows'], nd['threshold'], nd['max_copies'])
+
+    def near_dup_filtering(self, index, kind, names, std, prt, starts=None):
+        """
+        フィルタリングの結果からほぼ同じデータを取り除く
+        結果の各ファイルの指定した位置以降を読み込み、索引の判定で残ったデータだけを一時フォルダに書き出してから書き戻す
+        @param index near_dup_index で開いた索引 (判定したデータは索引に登録される)
+        @param kind "turn": 入出力コーパス、"dialog": 対話コーパス
+        @param names turn_files か dialog_files で求めたファイル名のリスト
+        @param std 標準形/表層形のファイルが存在するかどうか
+        @param prt 品詞列のファイルが存在するかどうか
+        @param starts 各ファイルの取り除き始めるバイト位置のリスト (Noneなら先頭から)
+        @return 取り除く前のデータ数
+        @return 取り除いた後のデータ数
+        """
+        cnt, cnt_ = 0, 0
+        starts = starts or [0] * len(names)
+        folder = tempfile.mkdtemp(dir="filtered")
+        opened = [open_range("filtered/" + name, start) for name, start in zip(names, starts)]
+        try:
+            if kind == "turn":
+                # 入出力文の組を一度に読み込む行数ずつ判定する
+                cols = TURN_KEYS[self.near_dup['turn_key']]
+                files = [open(os.path.join(folder, name), 'w', encoding='utf-8') for name in names]
+                while True:
+                    lines = [list(islice(f, CHUNK_LINES)) for _, f in opened]
+                    if not lines[0]:
+                        break
+                    keep = index.check([join_tokens([lines[col][i] for col in cols]) for i in range(len(lines[0]))])
+                    indices = [i for i, ok in enumerate(keep) if ok]
+                    cnt, cnt_ = cnt + len(keep), cnt_ + len(indices)
+                    for chunk, f in zip(lines, files):
+                        f.write("".join([chunk[i] for i in indices]))
+                for f in files:
+                    f.close()
             else:
-                # 指定した品詞を除外
-                if prt:
-                    line_dig, line_dig_std, line_dig_prt = self.del_part(line_dig, line_dig_std, line_dig_prt)
-
-                # 適切なデータであるか判定
-                if self.text_check(line_dig) and (not prt or self.part_check(line_dig_prt)):
-                    length = len(line_dig.split())
-                    if min == -1:
-                        min = max = length
-                        queue.append([line_dig, line_dig_std, line_dig_prt])
-                    else:
-                        if min > length:
-                            min = length
-                        elif max < length:
-                            max = length
-
-                        if max - min <= self.len_diff:
-                            queue.append([line_dig, line_dig_std, line_dig_prt])
-                        else:
-                            dump, min, max, buf = True, length, length, [[line_dig, line_dig_std, line_dig_prt]]
-                else:
-                    dump, min, buf = True, -1, []
+                # 対話の全発話をつなげて判定する
+                dialogs = read_dialogs(opened[0][1], opened[1][1] if std else None, opened[-1][1] if prt else None)
+                writer = DialogWriter([os.path.join(folder, self.dig_fp), os.path.join(folder, self.dig_std_fp) if std else None,
+                                       os.path.join(folder, self.dig_prt_fp) if prt else None])
+                while True:
+                    batch = [dialog for dialog, _ in islice(dialogs, BATCH_ITEMS)]
+                    if not batch:
+                        break
+                    keep = index.check([join_tokens([tweet[0] for tweet in dialog]) for dialog in batch])
+                    for dialog, ok in zip(batch, keep):
+                        if ok:
+                            cnt_ += 1
+                            writer.write(dialog)
+                    cnt += len(batch)
+                writer.close()
 
-            # ファイルから読み込む
-            line_dig = f_dig.readline()
-            line_dig_std = f_dig_std.readline() if std else None
-            line_dig_prt = f_dig_prt.readline() if prt else None
+            # 取り除き始める位置以降を、残ったデータで置き換える
+            for f, _ in opened:
+                f.close()
+            for name, start in zip(names, starts):
+                with open("filtered/" + name, 'r+b') as f:
+                    f.truncate(start)
+                concat_files([os.path.join(folder, name)], "filtered/" + name, True)
+        finally:
+            for f, _ in opened:
+                f.close()
+            shutil.rmtree(folder)
 
-            if not line_dig:
-                dump = True
+        return cnt, cnt_
 
-            # ファイルに書き込む
-            if dump:
-                len_queue = len(queue)
-                if 1 < len_queue and self.turn_min < len_queue and len_queue - 1 <= self.turn_max:
-                    cnt_ += 1
+    def near_dup_removal(self, jobs, starts):
+        """
+        各コーパスのフィルタリングの結果からほぼ同じデータを取り除く
+        索引への登録は確定しないため、結果の状態を保存した後に索引を commit する
+        @param jobs 各コーパスの (種類, ファイル名のリスト, 標準形/表層形の有無, 品詞列の有無, 表示名) のリスト
+        @param starts 各ファイルの取り除き始めるバイト位置の辞書 (ないファイルは先頭から)
+        @return 開いた索引のリスト
+        """
+        indexes = []
+        for kind, names, std, prt, label in jobs:
+            index = self.near_dup_index(kind)
+            indexes.append(index)
+            cnt, cnt_ = self.near_dup_filtering(index, kind, names, std, prt, [starts.get(name, 0) for name in names])
+            print(label + " (near_dup): " + str(cnt) + " -> " + str(cnt_))
+        return indexes
 
-                    for tweet in queue:
-                        f_dig_fi.write(tweet[0])
-                        if std:
-                            f_dig_std_fi.write(tweet[1])
-                        if prt:
-                            f_dig_prt_fi.write(tweet[2])
+    def parallel_filtering(self, plans, append):
+        """
+        入出力コーパスと対話コーパスのシャードを同時にワーカープロセスでフィルタリングし、各シャードの結果を元の順につなげる
+        @param plans 各コーパスの (種類, ファイル名のリスト, 標準形/表層形の有無, 品詞列の有無, シャードのリスト) のリスト
+        @param append 結果をファイルの末尾に追加するかどうか
+        @return 各コーパスの (フィルタリング前のデータ数, フィルタリング後のデータ数) のリスト
+        """
+        folder = tempfile.mkdtemp(dir="filtered")
+        pool = multiprocessing.Pool(self.processes, init_worker, (self.config,))
+        try:
+            # すべてのシャードを依頼してから、依頼した順に結果をつなげる
+            tasks = []
+            for kind, names, std, prt, shards in plans:
+                results = []
+                for i, (offsets, n_lines) in enumerate(shards):
+                    shard_folder = os.path.join(folder, kind + "_%05d" % i)
+                    os.mkdir(shard_folder)
+                    args = (kind, names, std, prt, offsets, n_lines, shard_folder, i == 0 and offsets[0] == 0)
+                    results.append((shard_folder, pool.apply_async(filter_in_worker, args)))
+                tasks.append(results)
 
-                    f_dig_fi.write("\n")
-                    if std:
-                        f_dig_std_fi.write("\n")
-                    if prt:
-                        f_dig_prt_fi.write("\n")
-                queue = buf
+            counts = []
+            for (_, names, _, _, _), results in zip(plans, tasks):
+                cnts = [result.get() for _, result in results]
+                for name in names:
+                    concat_files([os.path.join(shard_folder, name) for shard_folder, _ in results], "filtered/" + name, append)
+                counts.append((sum([cnt[0] for cnt in cnts]), sum([cnt[1] for cnt in cnts])))
+            return counts
+        finally:
+            pool.close()
+            pool.join()
+            shutil.rmtree(folder)
 
-        # ファイルを閉じる
-        f_dig.close()
-        f_dig_fi.close()
-        if std:
-            f_dig_std.close()
-            f_dig_std_fi.close()
-        if prt:
-            f_dig_prt.close()
-            f_dig_prt_fi.close()
+    def load_state(self, names):
+        """
+        前回の差分フィルタリングの状態を読み込み、書き出し途中の結果を取り除く
+        フィルタリング内容が変わった場合や、対話データが前回より短くなった場合は使えない
+        @param names フィルタリングするファイル名のリスト
+        @return 状態 (使えなければNone)
+        """
+        if not os.path.isfile(STATE_FILE):
+            return None
+        try:
+            with open(STATE_FILE, 'rt', encoding='utf-8') as f:
+                state = json.load(f)
+        except ValueError:
+            return None
 
-        print(self.dig_fp + ": " + str(cnt) + " -> " + str(cnt_))
+        if state.get('fingerprint') != self.fingerprint or sorted(state['sources']) != sorted(names):
+            return None
+        for name, offset in state['sources'].items():
+            if os.path.getsize("data/" + name) < offset:
+                return None
+        for name, size in state['outputs'].items():
+            if not os.path.isfile("filtered/" + name) or os.path.getsize("filtered/" + name) < size:
+                return None
+
+        # 前回の状態を保存した後に追加された結果を取り除く
+        for name, size in state['outputs'].items():
+            with open("filtered/" + name, 'r+b') as f:
+                f.truncate(size)
+        return state
 
     def filtering(self):
-        """保存してあるすべてのコーパスをフィルタリングする"""
+        """
+        保存してあるすべてのコーパスをフィルタリングする
+        差分フィルタリングでは、前回のフィルタリング以降に追加された対話データのみをフィルタリングして結果に追加する
+        """
         # dataフォルダがなければ終了
         if not os.path.isdir("data"):
             print("no data folder")
@@ -356,25 +1097,104 @@ class TweetFilter():
         if not os.path.isdir("filtered"):
             os.mkdir("filtered")
 
-        # filteredフォルダ内のファイルをすべて削除
-        for root, _, files in os.walk("filtered", topdown=False):
-            for name in files:
-                os.remove(os.path.join(root, name))
-
-        filtered = False
-
-        # 入出力コーパスをフィルタリングする
+        jobs = []
         if os.path.isfile("data/" + self.inp_fp) and os.path.isfile("data/" + self.tar_fp):
-            filtered = True
-            self.turn_filtering()
-
-        # 対話コーパスをフィルタリングする
+            jobs.append(("turn",) + self.turn_files() + (b"\n", self.inp_fp + "/" + self.tar_fp))
         if os.path.isfile("data/" + self.dig_fp):
-            filtered = True
-            self.dialog_filtering()
+            jobs.append(("dialog",) + self.dialog_files() + (b"\n\n", self.dig_fp))
 
-        if not filtered:
+        if not jobs:
             print("no filtered file")
+            return
+
+        state = self.load_state([name for job in jobs for name in job[1]]) if self.incremental else None
+        if state is None:
+            # filteredフォルダ内のファイルをすべて削除
+            for root, _, files in os.walk("filtered", topdown=False):
+                for name in files:
+                    os.remove(os.path.join(root, name))
+            state = {'fingerprint': self.fingerprint, 'sources': {}, 'outputs': {}}
+
+        # 差分フィルタリングでは、収集中のファイルの書き出しが完了した位置までの、完全な行と対話のみをフィルタリングする
+        committed = {}
+        if self.incremental and os.path.isfile(JOURNAL_FILE):
+            with open(JOURNAL_FILE, 'rt', encoding='utf-8') as f:
+                committed = json.load(f)
+
+        plans, ends = [], {}
+        for kind, names, std, prt, sep, _ in jobs:
+            paths = ["data/" + name for name in names]
+            offsets = [state['sources'].get(name, 0) for name in names]
+            end = last_boundary(paths[0], sep, offsets[0], committed.get(paths[0])) if self.incremental else None
+            size = (os.path.getsize(paths[0]) if end is None else end) - offsets[0]
+            n_shards = max(self.processes, -(-size // self.shard_bytes)) if self.processes > 0 else 1
+            shards, shard_ends = plan_shards(paths, sep, n_shards, offsets, end)
+            plans.append((kind, names, std, prt, shards))
+            ends.update(zip(names, shard_ends))
+
+        if self.processes > 0:
+            # ワーカープロセスで同時にフィルタリングする
+            counts = self.parallel_filtering(plans, self.incremental)
+        else:
+            # 入出力コーパス、対話コーパスの順にフィルタリングする
+            counts = []
+            for kind, names, std, prt, shards in plans:
+                (offsets, n_lines), = shards
+                if kind == "turn":
+                    counts.append(self.filter_turns(names, std, prt, offsets, n_lines, append=self.incremental))
+                else:
+                    counts.append(self.filter_dialogs(names, std, prt, offsets, n_lines, initial=offsets[0] == 0, append=self.incremental))
+
+        for (_, _, _, _, _, label), (cnt, cnt_) in zip(jobs, counts):
+            print(label + ": " + str(cnt) + " -> " + str(cnt_))
+
+        # 今回追加された結果からほぼ同じデータを取り除く
+        indexes = []
+        if self.near_dup['use']:
+            indexes = self.near_dup_removal([(kind, names, std, prt, label) for kind, names, std, prt, _, label in jobs], state['outputs'])
+
+        # 次回のフィルタリングを始める位置と、その時点の結果のサイズを保存する
+        if self.incremental:
+            state['sources'] = ends
+            state['outputs'] = {name: os.path.getsize("filtered/" + name) for job in jobs for name in job[1]}
+            atomic_write(STATE_FILE, json.dumps(state, ensure_ascii=False).encode('utf-8'))
+
+        # 状態を保存してから索引への登録を確定する (途中で止まっても、取り除かれていない結果が索引に残らない)
+        for index in indexes:
+            index.commit()
+            index.close()
+
+
+# ワーカープロセスごとのフィルタ
+worker_filter = None
+
+
+def init_worker(config):
+    """
+    ワーカープロセスの初期化 (プロセスごとにフィルタを作成する)
+    @param config 設定ファイルの情報
+    """
+    global worker_filter
+    worker_filter = TweetFilter(config)
+
+
+def filter_in_worker(kind, names, std, prt, offsets, n_lines, folder, initial):
+    """
+    ワーカープロセスでシャードをフィルタリングする
+    @param kind "turn": 入出力コーパス、"dialog": 対話コーパス
+    @param names 各コーパスのファイル名のリスト
+    @param std 標準形/表層形のファイルが存在するかどうか
+    @param prt 品詞列のファイルが存在するかどうか
+    @param offsets 各ファイルの読み込みを始めるバイト位置のリスト
+    @param n_lines 基準のファイルから読み込む行数 (Noneなら末尾まで)
+    @param folder 書き込むフォルダ
+    @param initial ファイルの先頭のシャードかどうか
+    @return フィルタリング前のデータ数
+    @return フィルタリング後のデータ数
+    """
+    if kind == "turn":
+        return worker_filter.filter_turns(names, std, prt, offsets, n_lines, folder)
+    return worker_filter.filter_dialogs(names, std, prt, offsets, n_lines, folder, initial)
 
 
 def filtering_twitter_corpus(config):
@@ -382,13 +1202,99 @@ def filtering_twitter_corpus(config):
     収集した対話データをフィルタリング
     @param config 設定ファイルの情報
     """
-    f = TweetFilter(config)
+    if config['index']['use']:
+        # 索引はこのモジュールの処理を用いて作るため、使う場合のみ読み込む
+        from feature_index import IndexFilter
+        f = IndexFilter(config)
+    else:
+        f = TweetFilter(config)
     f.filtering()
 
 
+def sample_corpus(config, folder, limit):
+    """
+    コーパスの先頭の一部を、対応する標準形/表層形と品詞列のファイルとともにフォルダの "data/" に複製する
+    @param config 設定ファイルの情報
+    @param folder 複製先のフォルダ
+    @param limit 入出力コーパスの行数と、対話コーパスの対話数
+    """
+    f = TweetFilter(config)
+    groups = []
+    if os.path.isfile("data/" + f.inp_fp) and os.path.isfile("data/" + f.tar_fp):
+        groups.append((f.turn_files()[0], False))
+    if os.path.isfile("data/" + f.dig_fp):
+        groups.append((f.dialog_files()[0], True))
+
+    os.makedirs(folder + "/data", exist_ok=True)
+    for names, dialog in groups:
+        # 基準のファイルで limit 個のデータが終わる行数を求め、他のファイルも同じ行数だけ複製する
+        n_lines, cnt = 0, 0
+        with open("data/" + names[0], 'rb') as src:
+            for line in src:
+                n_lines += 1
+                if not dialog or line == b"\n":
+                    cnt += 1
+                    if cnt >= limit:
+                        break
+
+        for name in names:
+            with open("data/" + name, 'rb') as src, open(folder + "/data/" + name, 'wb') as dest:
+                dest.writelines(islice(src, n_lines))
+
+
+def profile_filtering(config, limit, mode="cprofile", prefix="profile/filter"):
+    """
+    コーパスの先頭の一部のフィルタリングをプロファイルする
+    一時フォルダに複製したコーパスを一つのプロセスで最初からフィルタリングし、結果は破棄する
+    @param config 設定ファイルの情報
+    @param limit 入出力コーパスの行数と、対話コーパスの対話数
+    @param mode プロファイラの種類 ("cprofile" か "sample")
+    @param prefix 計測結果を書き出すファイルパスの拡張子を除いた部分
+    """
+    config['parallel']['processes'] = 0
+    config['incremental'] = False
+    prefix = os.path.abspath(prefix)
+
+    folder = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        sample_corpus(config, folder, limit)
+        os.chdir(folder)
+        with Profiler(mode) as profiler:
+            filtering_twitter_corpus(config)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(folder)
+
+    for path in profiler.write(prefix):
+        print("profile: " + path)
+
+
 if __name__ == '__main__':
     # 設定ファイルを読み込む
     config = yaml.load(stream=open("config/config.yml", 'rt', encoding='utf-8'), Loader=yaml.SafeLoader)
 
+    parser = argparse.ArgumentParser(description="収集した対話データをフィルタリングする")
+    parser.add_argument("--processes", type=int, help="フィルタリングを行うワーカープロセス数 (0なら並列化しない)")
+    parser.add_argument("--incremental", action='store_true', default=None, help="前回以降に追加された対話データのみをフィルタリングする")
+    parser.add_argument("--full", action='store_false', dest='incremental', help="すべての対話データをフィルタリングし直す")
+    parser.add_argument("--index", action='store_true', help="発話ごとの特徴量の索引を用いてフィルタリングする")
+    parser.add_argument("--near-dup", action='store_true', help="フィルタリングの結果からほぼ同じ発話や対話を取り除く")
+    parser.add_argument("--profile", nargs='?', const="cprofile", choices=PROFILE_MODES, help="コーパスの先頭の一部のフィルタリングをプロファイルする (省略時は cprofile)")
+    parser.add_argument("--limit", type=int, default=100000, help="プロファイルする入出力コーパスの行数と対話コーパスの対話数")
+    parser.add_argument("--profile-out", default="profile/filter", help="プロファイルの結果を書き出すファイルパスの拡張子を除いた部分")
+    args = parser.parse_args()
+    if args.processes is not None:
+        config['parallel']['processes'] = args.processes
+    if args.incremental is not None:
+        config['incremental'] = args.incremental
+    if args.index:
+        config['index']['use'] = True
+    if args.near_dup:
+        config['filter']['near_dup']['use'] = True
+
     # フィルタ処理開始
-    filtering_twitter_corpus(config)
+    if args.profile:
+        profile_filtering(config, args.limit, args.profile, args.profile_out)
+    else:
+        filtering_twitter_corpus(config)
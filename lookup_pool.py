@@ -0,0 +1,93 @@
+# coding: utf-8
+
+"""リプライ先の取得をストリームのスレッドから切り離して並行に行うワーカープール"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import time
+import queue
+import threading
+
+
+class LookupPool():
+    """キューに積まれたバッチを複数のワーカースレッドで取得処理するクラス"""
+    def __init__(self, lookup, workers=2, max_pending=4, on_error=None, retry_delay=1.0):
+        """
+        コンストラクタ
+        @param lookup バッチを受け取ってリプライ先の取得と処理を行う関数
+        @param workers 同時に取得処理を行うワーカー数 (0ならsubmitを呼んだスレッドで処理する)
+        @param max_pending 処理待ちにできるバッチの最大数 (これを超えるとsubmitが待たされる)
+        @param on_error 取得処理で例外が発生した際にバッチと例外を受け取る関数
+        @param retry_delay 例外が発生した後にワーカーが待機する秒数
+        """
+        self.lookup = lookup
+        self.workers = workers
+        self.on_error = on_error
+        self.retry_delay = retry_delay
+
+        self.tasks = queue.Queue(max_pending)
+        self.threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self.work, name="lookup-" + str(i), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, batch):
+        """
+        バッチを処理待ちに積む
+        処理待ちが満杯の場合は空きができるまで待つ
+        @param batch 対話のリスト
+        """
+        if self.workers == 0:
+            self.run(batch)
+        else:
+            self.tasks.put(batch)
+
+    def pending(self):
+        """
+        処理待ちのバッチ数を返す
+        @return バッチ数
+        """
+        return self.tasks.qsize()
+
+    def work(self):
+        """ワーカースレッドの処理"""
+        while True:
+            batch = self.tasks.get()
+            try:
+                if batch is None:
+                    return
+                if not self.run(batch):
+                    time.sleep(self.retry_delay)
+            finally:
+                self.tasks.task_done()
+
+    def run(self, batch):
+        """
+        バッチを処理する
+        @param batch 対話のリスト
+        @return True: 成功、False: 失敗
+        """
+        try:
+            self.lookup(batch)
+        except Exception as e:
+            if self.on_error is None:
+                raise
+            self.on_error(batch, e)
+            return False
+        return True
+
+    def join(self):
+        """処理待ちのバッチがすべて処理されるまで待つ"""
+        self.tasks.join()
+
+    def close(self):
+        """処理待ちのバッチをすべて処理してからワーカーを終了する"""
+        for _ in self.threads:
+            self.tasks.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
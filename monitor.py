@@ -0,0 +1,428 @@
+# coding: utf-8
+
+"""収集処理の段階ごとの処理時間と件数、除外理由、キューの長さを集計し、Prometheus形式とjson形式で公開する"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import os
+import json
+import time
+import bisect
+import functools
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from checkpoint import atomic_write
+
+
+# 処理時間のヒストグラムの区切り (秒)
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+# 公開する指標の名前の接頭辞
+PREFIX = "twitter_"
+
+
+class Measure():
+    """with 文の間の処理時間を段階の処理時間として記録するクラス"""
+    __slots__ = ("monitor", "stage", "items", "start")
+
+    def __init__(self, monitor, stage, items):
+        """
+        コンストラクタ
+        @param monitor 記録先の PipelineMonitor
+        @param stage 段階名
+        @param items 処理した件数
+        """
+        self.monitor = monitor
+        self.stage = stage
+        self.items = items
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.monitor.observe(self.stage, time.perf_counter() - self.start, self.items)
+        return False
+
+
+class NullMeasure():
+    """何も記録しない with 文のためのクラス"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_MEASURE = NullMeasure()
+
+
+class NullMonitor():
+    """集計しない場合に使う、何もしないモニタ"""
+    enabled = False
+
+    def measure(self, stage, items=1):
+        """
+        何も記録しない
+        @return with 文で使うオブジェクト
+        """
+        return NULL_MEASURE
+
+    def wrap(self, stage, func):
+        """
+        何も記録しない
+        @return 関数そのもの
+        """
+        return func
+
+    def observe(self, stage, seconds, items=1):
+        return
+
+    def count(self, name, n=1, **labels):
+        return
+
+    def gauge(self, name, func, **labels):
+        return
+
+    def section(self, name, func):
+        return
+
+    def merge(self, delta):
+        return
+
+    def drain(self):
+        return None
+
+
+NULL_MONITOR = NullMonitor()
+
+
+class PipelineMonitor():
+    """
+    段階ごとの処理時間のヒストグラムと件数、名前とラベルごとの計数、呼び出し時に値を求めるゲージを持つクラス
+    (複数のスレッドから呼ばれる)
+    """
+    enabled = True
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        コンストラクタ
+        @param buckets 処理時間のヒストグラムの区切り (秒、昇順)
+        """
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+        # 段階名から [区切りごとの件数, 合計秒数, 回数, 処理した件数] への辞書
+        self.stages = {}
+        # (名前, ラベルのタプル) から計数への辞書
+        self.counters = {}
+        # (名前, ラベルのタプル) から値を求める関数への辞書
+        self.gauges = {}
+        # 名前から統計の辞書を求める関数への辞書
+        self.sections = {}
+
+    def measure(self, stage, items=1):
+        """
+        with 文の間の処理時間を記録する
+        @param stage 段階名
+        @param items 処理した件数
+        @return with 文で使うオブジェクト
+        """
+        return Measure(self, stage, items)
+
+    def wrap(self, stage, func):
+        """
+        関数の処理時間を記録する関数を作る (呼び出しごとの with 文より負荷が小さい)
+        @param stage 段階名
+        @param func 関数
+        @return 処理時間を記録する関数
+        """
+        observe, perf_counter = self.observe, time.perf_counter
+
+        @functools.wraps(func)
+        def measured(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(stage, perf_counter() - start)
+        return measured
+
+    def observe(self, stage, seconds, items=1):
+        """
+        段階の処理時間を記録する
+        @param stage 段階名
+        @param seconds 処理時間 (秒)
+        @param items 処理した件数
+        """
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            hist = self.stages.get(stage)
+            if hist is None:
+                hist = self.stages[stage] = [[0] * (len(self.buckets) + 1), 0.0, 0, 0]
+            hist[0][i] += 1
+            hist[1] += seconds
+            hist[2] += 1
+            hist[3] += items
+
+    def count(self, name, n=1, **labels):
+        """
+        計数を増やす
+        @param name 名前
+        @param n 増やす数
+        @param labels ラベル
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def gauge(self, name, func, **labels):
+        """
+        公開する時に値を求めるゲージを登録する
+        @param name 名前
+        @param func 値を返す関数
+        @param labels ラベル
+        """
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = func
+
+    def section(self, name, func):
+        """
+        公開する時に求める統計の辞書を登録する (数値の項目はゲージとしても公開する)
+        @param name 名前
+        @param func 統計の辞書を返す関数
+        """
+        with self.lock:
+            self.sections[name] = func
+
+    def drain(self):
+        """
+        これまでの処理時間と計数を取り出して空にする (ワーカープロセスから親プロセスに渡す)
+        @return 処理時間と計数の辞書
+        """
+        with self.lock:
+            delta = {'stages': self.stages, 'counters': self.counters}
+            self.stages = {}
+            self.counters = {}
+        return delta
+
+    def merge(self, delta):
+        """
+        ワーカープロセスで記録した処理時間と計数を足し合わせる
+        @param delta drain で取り出した辞書 (Noneなら何もしない)
+        """
+        if not delta:
+            return
+        with self.lock:
+            for stage, (counts, seconds, calls, items) in delta['stages'].items():
+                hist = self.stages.get(stage)
+                if hist is None:
+                    hist = self.stages[stage] = [[0] * (len(self.buckets) + 1), 0.0, 0, 0]
+                hist[0] = [a + b for a, b in zip(hist[0], counts)]
+                hist[1] += seconds
+                hist[2] += calls
+                hist[3] += items
+            for key, n in delta['counters'].items():
+                self.counters[key] = self.counters.get(key, 0) + n
+
+    def collect(self):
+        """
+        公開する時点の値を集める
+        @return 処理時間、計数、ゲージ、統計のそれぞれの複製
+        """
+        with self.lock:
+            stages = {stage: [list(hist[0])] + hist[1:] for stage, hist in self.stages.items()}
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            sections = dict(self.sections)
+        gauges = {key: func() for key, func in gauges.items()}
+        sections = {name: func() for name, func in sections.items()}
+        return stages, counters, gauges, sections
+
+    def snapshot(self):
+        """
+        json形式で保存する集計結果を求める
+        @return 集計結果の辞書
+        """
+        stages, counters, gauges, sections = self.collect()
+        result = {'time': time.time(), 'uptime': time.time() - self.started, 'stages': {}, 'counters': {}, 'gauges': {}}
+        for stage, (counts, seconds, calls, items) in sorted(stages.items()):
+            result['stages'][stage] = {
+                'calls': calls, 'items': items, 'seconds': seconds,
+                'mean': seconds / calls if calls else 0.0,
+                'p50': self.quantile(counts, calls, 0.5),
+                'p99': self.quantile(counts, calls, 0.99),
+                'buckets': dict(zip([str(le) for le in self.buckets] + ["+Inf"], counts))
+            }
+        for (name, labels), value in sorted(counters.items()):
+            result['counters'].setdefault(name, {})[",".join("%s=%s" % label for label in labels)] = value
+        for (name, labels), value in sorted(gauges.items()):
+            result['gauges'].setdefault(name, {})[",".join("%s=%s" % label for label in labels)] = value
+        result.update(sections)
+        return result
+
+    def quantile(self, counts, calls, q):
+        """
+        ヒストグラムから分位点のおおよその値を求める (分位点を含む区切りの上限)
+        @param counts 区切りごとの件数
+        @param calls 全体の件数
+        @param q 分位 (0から1)
+        @return 秒数 (最後の区切りを超える場合は最後の区切り、件数がなければ0)
+        """
+        if calls == 0:
+            return 0.0
+        rank = q * calls
+        total = 0
+        for le, n in zip(self.buckets, counts):
+            total += n
+            if total >= rank:
+                return le
+        return self.buckets[-1]
+
+    def prometheus(self):
+        """
+        Prometheus形式のテキストを作る
+        @return テキスト
+        """
+        stages, counters, gauges, sections = self.collect()
+        lines = []
+
+        name = PREFIX + "stage_seconds"
+        lines.append("# HELP " + name + " Time spent in each stage of the collector.")
+        lines.append("# TYPE " + name + " histogram")
+        for stage, (counts, seconds, calls, items) in sorted(stages.items()):
+            total = 0
+            for le, n in zip([repr(le) for le in self.buckets] + ["+Inf"], counts):
+                total += n
+                lines.append('%s_bucket{stage="%s",le="%s"} %d' % (name, stage, le, total))
+            lines.append('%s_sum{stage="%s"} %r' % (name, stage, seconds))
+            lines.append('%s_count{stage="%s"} %d' % (name, stage, calls))
+
+        name = PREFIX + "stage_items_total"
+        lines.append("# HELP " + name + " Items processed by each stage of the collector.")
+        lines.append("# TYPE " + name + " counter")
+        for stage, hist in sorted(stages.items()):
+            lines.append('%s{stage="%s"} %d' % (name, stage, hist[3]))
+
+        lines.extend(self.family(counters, "counter", "_total"))
+        lines.extend(self.family(gauges, "gauge", ""))
+
+        # 統計の数値の項目はゲージとする
+        flat = {}
+        for section, stats in sections.items():
+            for key, value in (stats or {}).items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    flat[(section + "_" + key, ())] = value
+        lines.extend(self.family(flat, "gauge", ""))
+
+        return "\n".join(lines) + "\n"
+
+    def family(self, values, kind, suffix):
+        """
+        同じ名前の計数かゲージをまとめてPrometheus形式の行にする
+        @param values (名前, ラベルのタプル) から値への辞書
+        @param kind "counter" か "gauge"
+        @param suffix 名前の末尾に付ける文字列
+        @return 行のリスト
+        """
+        lines = []
+        last = None
+        for (name, labels), value in sorted(values.items()):
+            full = PREFIX + name + suffix
+            if name != last:
+                lines.append("# TYPE " + full + " " + kind)
+                last = name
+            label = "{" + ",".join('%s="%s"' % label for label in labels) + "}" if labels else ""
+            lines.append("%s%s %r" % (full, label, value))
+        return lines
+
+
+class MonitorHandler(BaseHTTPRequestHandler):
+    """集計結果を返すHTTPのリクエストを処理するクラス"""
+    def do_GET(self):
+        """GETリクエストを処理する"""
+        monitor = self.server.monitor
+        if self.path == "/metrics":
+            self.respond(monitor.prometheus().encode('utf-8'), "text/plain; version=0.0.4; charset=utf-8")
+        elif self.path == "/metrics.json":
+            self.respond(json.dumps(monitor.snapshot(), ensure_ascii=False).encode('utf-8'), "application/json; charset=utf-8")
+        else:
+            self.send_error(404)
+
+    def respond(self, data, content_type):
+        """
+        レスポンスを返す
+        @param data 本文のバイト列
+        @param content_type Content-Type
+        """
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        """アクセスログを出力しない"""
+        return
+
+
+class MonitorExporter():
+    """集計結果をローカルホストのHTTPで公開し、一定間隔でjson形式のファイルに書き出すクラス"""
+    def __init__(self, monitor, port=9108, snapshot_file="data/monitor.json", snapshot_interval=60.0):
+        """
+        コンストラクタ
+        @param monitor 公開する PipelineMonitor
+        @param port 待ち受けるポート番号 (0なら公開しない)
+        @param snapshot_file 書き出すファイルパス (空なら書き出さない)
+        @param snapshot_interval 書き出す間隔 (秒)
+        """
+        self.monitor = monitor
+        self.snapshot_file = snapshot_file
+        self.snapshot_interval = snapshot_interval
+        self.stopped = threading.Event()
+
+        self.server = None
+        if port:
+            self.server = ThreadingHTTPServer(("127.0.0.1", port), MonitorHandler)
+            self.server.daemon_threads = True
+            self.server.monitor = monitor
+            threading.Thread(target=self.server.serve_forever, name="monitor-http", daemon=True).start()
+
+        self.thread = None
+        if snapshot_file:
+            folder = os.path.dirname(snapshot_file)
+            if folder and not os.path.isdir(folder):
+                os.makedirs(folder)
+            self.thread = threading.Thread(target=self.work, name="monitor-snapshot", daemon=True)
+            self.thread.start()
+
+    def work(self):
+        """一定間隔で集計結果を書き出すスレッドの処理"""
+        while not self.stopped.wait(self.snapshot_interval):
+            self.write()
+
+    def write(self):
+        """集計結果をファイルに書き出す"""
+        try:
+            atomic_write(self.snapshot_file, json.dumps(self.monitor.snapshot(), ensure_ascii=False, indent=2).encode('utf-8'))
+        except Exception as e:
+            print('ON MONITOR ERROR:', e)
+
+    def close(self):
+        """公開を終了し、最後の集計結果を書き出す"""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.write()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
@@ -0,0 +1,151 @@
+# coding: utf-8
+
+"""ツイートのテキストを形態素解析し、特定の形態素の除去と品詞分類を行う"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import re
+from functools import lru_cache
+import MeCab
+
+
+# 形態素ごとに「表層形 FIELD_SEP 素性 NODE_END」、文末に EOS_MARK を出力する分かち書きの設定
+FIELD_SEP = "\x1f"
+NODE_END = "\x1e"
+EOS_MARK = "\x1d"
+TAGGER_ARGS = "--node-format=%m" + FIELD_SEP + "%H" + NODE_END +\
+    " --unk-format=%m" + FIELD_SEP + "%H" + NODE_END + " --eos-format=" + EOS_MARK
+
+# 除去する表層形
+JUNK_SURFACES = frozenset([
+    ".", "..", "!", "?", "ノ", "ーノ", "ロ", "艸", "屮", "罒", "灬", "彡", "ヮ", "益",
+    "皿", "タヒ", "厂", "厂厂", "啞", "卍", "ノノ", "ノノノ", "ノシ", "ノツ",
+    "癶", "癶癶", "乁", "乁厂", "マ", "んご", "んゴ", "ンゴ", "にき", "ニキ", "ナカ", "み", "ミ"
+])
+# 文頭にある場合に除去する表層形
+HEAD_SURFACES = frozenset(["つ", "っ"])
+# これだけで構成される文は除去する
+JUNK_LINES = frozenset([
+    "、", "。", "！", "？", "!?", "", "... 。", "... ！", "... ？", "... !?",
+    "人 。", "つ 。", "っ 。", "笑 。", "笑 ！", "笑 ？", "笑 !?"
+])
+PHRASE_POINTS = frozenset(["。", "！", "？", "!?"])
+# 標準形に記号などを含むかどうか
+NOT_KANA = re.compile("[^ぁ-んァ-ヶｧ-ｳﾞ一-龠々ー～]")
+
+
+class MorphemeAnalyzer():
+    """形態素解析と品詞分類を行うクラス"""
+    def __init__(self, part_config, cache_size=100000):
+        """
+        コンストラクタ
+        @param part_config 各品詞に割り当てるトークン
+        @param cache_size 形態素ごとの品詞と標準形を記憶しておく数
+        """
+        self.tagger = MeCab.Tagger(TAGGER_ARGS)
+
+        pt = part_config
+        self.three_dots_token = pt['three_dots']
+        self.phrase_point_token = pt['phrase_point']
+        self.reading_point_token = pt['reading_point']
+        self.other_token = pt['other']
+        self.point_tokens = frozenset([self.three_dots_token, self.phrase_point_token, self.reading_point_token])
+
+        # (品詞, 品詞細分類) からトークンへの変換表
+        self.pos_table = {}
+        for sub in ["サ変接続", "一般", "形容動詞語幹", "固有名詞"]:
+            self.pos_table[("名詞", sub)] = pt['noun_main']
+        self.pos_table[("動詞", "自立")] = pt['verb_main']
+        self.pos_table[("形容詞", "自立")] = pt['adjective_main']
+
+        # 品詞細分類によらない品詞からトークンへの変換表
+        self.pos_default = {
+            "名詞": pt['noun_sub'],
+            "動詞": pt['verb_sub'],
+            "形容詞": pt['adjective_sub'],
+            "副詞": pt['adverb'],
+            "助詞": pt['particle'],
+            "助動詞": pt['auxiliary_verb'],
+            "接続詞": pt['conjunction'],
+            "接頭詞": pt['prefix'],
+            "フィラー": pt['filler'],
+            "感動詞": pt['impression_verb']
+        }
+
+        # (表層形, 素性) ごとに分類結果を記憶する
+        self.lookup = lru_cache(maxsize=cache_size)(self.classify)
+
+    def classify(self, surface, feature):
+        """
+        形態素の品詞トークンと標準形/表層形を求める
+        @param surface 表層形
+        @param feature 素性
+        @return (品詞トークン, 標準形/表層形)、除去する形態素ならNone
+        """
+        if surface in JUNK_SURFACES:
+            return None
+
+        feature = feature.split(',')
+
+        token = self.pos_table.get((feature[0], feature[1]))
+        if token is None:
+            token = self.pos_default.get(feature[0])
+        if token is None:
+            if surface == "...":
+                token = self.three_dots_token
+            elif surface in PHRASE_POINTS:
+                token = self.phrase_point_token
+            elif surface == "、":
+                token = self.reading_point_token
+            else:
+                token = self.other_token
+
+        if NOT_KANA.search(feature[6]) or token in self.point_tokens or surface in ["ー", "～"]:
+            return token, surface
+        return token, feature[6]
+
+    def analyze(self, text):
+        """
+        テキストから特定の形態素を除去する
+        @param text 正規化したテキスト
+        @return 特定の形態素を除去したテキスト
+        @return 標準形/表層系のテキスト
+        @return 品詞列
+        """
+        return self.analyze_batch([text])[0]
+
+    def analyze_batch(self, texts):
+        """
+        複数のテキストから特定の形態素をまとめて除去する
+        @param texts 正規化したテキストのリスト
+        @return (特定の形態素を除去したテキスト, 標準形/表層系のテキスト, 品詞列) のリスト
+        """
+        parse, lookup = self.tagger.parse, self.lookup
+        results = []
+
+        for text in texts:
+            result, standard, part = [], [], []
+
+            for line in text.strip().split("\n"):
+                words, standards, parts = [], [], []
+
+                for row in parse(line)[:-1].split(NODE_END)[:-1]:
+                    surface, feature = row.split(FIELD_SEP)
+                    node = lookup(surface, feature)
+                    if node is None or (not words and surface in HEAD_SURFACES):
+                        continue
+                    words.append(surface)
+                    parts.append(node[0])
+                    standards.append(node[1])
+
+                if " ".join(words) not in JUNK_LINES:
+                    result += words
+                    standard += standards
+                    part += parts
+
+            results.append((" ".join(result), " ".join(standard), " ".join(part)))
+
+        return results
@@ -0,0 +1,196 @@
+# coding: utf-8
+
+"""MinHash の署名と LSH の帯による索引で、ほぼ同じ発話や対話を探す"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import json
+import zlib
+import sqlite3
+import numpy as np
+
+
+# 一度に署名を求めて索引と照合するデータ数
+BATCH_ITEMS = 2048
+
+# 署名の値を求めるハッシュ関数の法 (メルセンヌ素数 2^61-1)
+MERSENNE_PRIME = (1 << 61) - 1
+
+# SQLite のページのキャッシュの大きさ (KiB)
+CACHE_KIB = 262144
+
+# 帯のキーを符号付き64ビット整数に収めるマスク
+KEY_MASK = (1 << 63) - 1
+
+
+def join_tokens(texts):
+    """
+    複数のテキストの単語を、境界を表すトークンを挟んで一つのリストにつなげる
+    @param texts 空白で分かち書きされたテキストのリスト
+    @return 単語のリスト
+    """
+    tokens = []
+    for i, text in enumerate(texts):
+        if i > 0:
+            tokens.append("\n")
+        tokens.extend(text.split())
+    return tokens
+
+
+def shingle_hashes(tokens, shingle):
+    """
+    単語の n-gram (シングル) をそれぞれ32ビットのハッシュ値にする
+    @param tokens 単語のリスト
+    @param shingle n-gram の単語数 (単語数が足りなければ全体を一つのシングルとする)
+    @return ハッシュ値のリスト
+    """
+    if len(tokens) <= shingle:
+        return [zlib.crc32(" ".join(tokens).encode('utf-8'))]
+    return [zlib.crc32(" ".join(tokens[i:i + shingle]).encode('utf-8')) for i in range(len(tokens) - shingle + 1)]
+
+
+class NearDupIndex():
+    """
+    データの MinHash の署名を LSH の帯に分け、帯ごとのキーと署名を SQLite に保存する索引
+    帯のキーが一つでも一致したデータのみ署名を比べるため、すべてのデータどうしを比べずに済む
+    索引には重複でないデータだけを代表として登録し、代表ごとにほぼ同じデータの出現回数を数える
+    """
+    def __init__(self, path, shingle=2, bands=16, rows=4, threshold=0.8, max_copies=1, seed=0):
+        """
+        コンストラクタ
+        @param path SQLite のファイルパス
+        @param shingle n-gram の単語数
+        @param bands 帯の数
+        @param rows 一つの帯に含まれる署名の値の数
+        @param threshold ほぼ同じとみなす推定 Jaccard 係数の下限
+        @param max_copies ほぼ同じデータを残す最大の数 (1なら最初の一つだけ残す)
+        @param seed ハッシュ関数を決める乱数のシード
+        """
+        self.shingle = shingle
+        self.bands = bands
+        self.rows = rows
+        self.threshold = threshold
+        self.max_copies = max(max_copies, 1)
+
+        # 署名を求めるハッシュ関数 (a*h+b) mod p の係数と、帯の値をキーにまとめる係数 (帯ごとに異なるため、キーだけで帯も区別できる)
+        rand = np.random.RandomState(seed)
+        self.a = rand.randint(1, 1 << 32, size=(bands * rows, 1), dtype=np.uint64)
+        self.b = rand.randint(0, 1 << 32, size=(bands * rows, 1), dtype=np.uint64)
+        self.mix = rand.randint(1, 1 << 63, size=(bands, rows), dtype=np.uint64) | np.uint64(1)
+
+        # 一つのトランザクションで多くの行を追加するため、ページのキャッシュを大きくする
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA cache_size = -%d" % CACHE_KIB)
+        self.db.execute("CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, signature BLOB, copies INTEGER)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS buckets (key INTEGER, item INTEGER, PRIMARY KEY (key, item)) WITHOUT ROWID")
+        self.db.commit()
+        self.next_id = (self.db.execute("SELECT max(id) FROM items").fetchone()[0] or 0) + 1
+
+    def signatures(self, token_lists):
+        """
+        複数のデータの MinHash の署名をまとめて求める
+        @param token_lists 各データの単語のリスト
+        @return 署名の配列 (データ数 x 帯の数*帯の値の数)
+        """
+        hashes = [shingle_hashes(tokens, self.shingle) for tokens in token_lists]
+        starts = np.cumsum([0] + [len(h) for h in hashes[:-1]])
+        flat = np.fromiter([h for hs in hashes for h in hs], dtype=np.uint64)
+
+        # a, b, h が32ビット未満なので a*h+b は64ビットに収まる
+        values = (self.a * flat + self.b) % np.uint64(MERSENNE_PRIME) & np.uint64(0xffffffff)
+        return np.minimum.reduceat(values, starts, axis=1).T.astype(np.uint32)
+
+    def band_keys(self, sigs):
+        """
+        署名を帯に分け、帯ごとの値を一つのキーにまとめる
+        @param sigs 署名の配列
+        @return キーの配列 (データ数 x 帯の数)
+        """
+        # 64ビットで桁あふれした分は捨てる
+        bands = sigs.reshape(len(sigs), self.bands, self.rows).astype(np.uint64)
+        return ((bands * self.mix).sum(axis=2) & np.uint64(KEY_MASK)).astype(np.int64)
+
+    def candidates(self, keys):
+        """
+        帯のキーが一致する登録済みの代表を探す
+        @param keys キーの配列
+        @return キーから代表のIDのリストへの辞書
+        @return 代表のIDから [署名, 出現回数] への辞書
+        """
+        # キーのリストを一つの JSON の配列として渡し、索引の順に引く
+        buckets, reps = {}, {}
+        for key, item, signature, copies in self.db.execute(
+            "SELECT b.key, i.id, i.signature, i.copies FROM json_each(?) j "
+            "CROSS JOIN buckets b ON b.key = j.value JOIN items i ON i.id = b.item",
+            (json.dumps(sorted(set(keys.ravel().tolist()))),)
+        ):
+            buckets.setdefault(key, []).append(item)
+            if item not in reps:
+                reps[item] = [np.frombuffer(signature, dtype=np.uint32), copies]
+        return buckets, reps
+
+    def check(self, token_lists):
+        """
+        データがほぼ同じデータの出現回数の上限を超えていないかを判定し、索引に登録する
+        登録は commit するまで確定しない
+        @param token_lists 各データの単語のリスト (先頭から順に出現したものとみなす)
+        @return 残すデータがTrueのリスト
+        """
+        keep = []
+        for i in range(0, len(token_lists), BATCH_ITEMS):
+            keep.extend(self.check_batch(token_lists[i:i + BATCH_ITEMS]))
+        return keep
+
+    def check_batch(self, token_lists):
+        """
+        一度に照合する数のデータを判定する
+        @param token_lists 各データの単語のリスト
+        @return 残すデータがTrueのリスト
+        """
+        if not token_lists:
+            return []
+        sigs = self.signatures(token_lists)
+        keys = self.band_keys(sigs)
+        buckets, reps = self.candidates(keys)
+
+        keep, new_items, new_rows, changed = [], [], [], set()
+        for i, (sig, row) in enumerate(zip(sigs, keys.tolist())):
+            # 帯のキーが一致した代表のうち、最も古いものから署名の一致率を比べる
+            cands = set([item for key in row if key in buckets for item in buckets[key]])
+            match = next((item for item in sorted(cands) if np.count_nonzero(reps[item][0] == sig) >= self.threshold * len(sig)), None) if cands else None
+
+            if match is not None:
+                reps[match][1] += 1
+                changed.add(match)
+                keep.append(reps[match][1] <= self.max_copies)
+                continue
+
+            # 重複でなければ新しい代表として登録する
+            item = self.next_id
+            self.next_id += 1
+            reps[item] = [sig, 1]
+            new_items.append(item)
+            new_rows.append(i)
+            for key in row:
+                buckets.setdefault(key, []).append(item)
+            keep.append(True)
+
+        new = set(new_items)
+        self.db.executemany("INSERT INTO items VALUES (?, ?, ?)", [(item, reps[item][0].tobytes(), reps[item][1]) for item in new_items])
+        # 索引の同じページへの追加がまとまるように、キーの順に並べ替えてから追加する
+        new_keys = keys[new_rows].ravel()
+        order = np.argsort(new_keys, kind='stable')
+        self.db.executemany("INSERT INTO buckets VALUES (?, ?)", zip(new_keys[order].tolist(), np.repeat(new_items, self.bands)[order].tolist()))
+        self.db.executemany("UPDATE items SET copies = ? WHERE id = ?", [(reps[item][1], item) for item in changed if item not in new])
+        return keep
+
+    def commit(self):
+        """登録を確定する"""
+        self.db.commit()
+
+    def close(self):
+        """確定していない登録を破棄して閉じる"""
+        self.db.close()
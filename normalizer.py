@@ -0,0 +1,127 @@
+# coding: utf-8
+
+"""ツイートのテキストを正規化する処理をまとめてあらかじめコンパイルしたもの"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import re
+from collections import Counter
+
+
+# 感情を表す文字
+EMOTIONS = "笑泣嬉悲驚汗爆渋苦困死楽怒哀呆殴涙藁"
+
+# 残す文字以外
+DISALLOWED = "[^ぁ-んァ-ヶｧ-ｳﾞ一-龠々ー～〜、。！？!?,，.．\r\n]"
+
+# 句読点などの統一
+CHAR_MAP = [(",", "、"), ("，", "、"), (".", "。"), ("．", "。"), ("〜", "～"), ("!", "！"), ("?", "？")]
+# 改行を句点に置き換え
+NEWLINE_MAP = [("\r\n", "。"), ("\n", "。"), ("\r", "。")]
+# 読点と句点の前後に空白と改行を入れる
+POINT_MAP = [("、", " 、 "), ("。", " 。\n")]
+# 感嘆符と疑問符の前後に空白と改行を入れる
+MARK_MAP = [("！", " ！\n"), ("？", " ？\n")]
+
+
+def replace_all(text, pairs):
+    """
+    文字列の置換を順に行う
+    置換後の文字列が後の置換対象を含まない場合、文字単位の変換表と同じ結果になる
+    @param text テキスト
+    @param pairs 置換前と置換後の文字列の組のリスト
+    @return 置換したテキスト
+    """
+    for old, new in pairs:
+        if old in text:
+            text = text.replace(old, new)
+    return text
+
+
+class TextNormalizer():
+    """
+    ツイートデータのテキストに正規化などのフィルタ処理を行うクラス
+    置換規則は一度だけコンパイルし、文字単位の置換は str.replace で行う
+    """
+    def __init__(self):
+        """コンストラクタ"""
+        # 感情を表す文字以外を含む括弧書き
+        self.paren = re.compile("\\([^" + EMOTIONS + "]+?\\)")
+
+        # 残す文字以外を空白に置き換える
+        self.disallowed = re.compile(DISALLOWED)
+
+        # 連続する記号をまとめる
+        self.repeat_point = re.compile("([、。])(?:\\s*\\1)+")
+        self.repeat_mark = re.compile("([！？～ー])(?:\\s*\\1)+")
+        self.repeat_emotion = re.compile("([っ" + EMOTIONS + "])(?:\\s*\\1)+")
+
+        # 句読点と感嘆符、疑問符の組み合わせをまとめる
+        self.point_run = re.compile("[、。](\\s*[、。])+")
+        self.exclamation_run = re.compile("[。、！](\\s*[。、！])+")
+        self.question_run = re.compile("[。、？](\\s*[。、？])+")
+        self.exclamation_question = re.compile("((！\\s*)+？|(？\\s*)+！)(\\s*[！？])*")
+
+        # 文末の感情を表す文字の位置を整える
+        self.reading_emotion = re.compile("、\\s*([" + EMOTIONS + "])\\s*。")
+        self.phrase_emotion = re.compile("(。|！|？|!\\?)\\s*([" + EMOTIONS + "])\\s*。")
+
+        self.dots = re.compile("(\\.\\s*)+")
+        self.line_head_bar = re.compile("\\n(\\s*[～ー])+")
+        self.head_marks = re.compile("^([\\s\\n]*[。、！？!?ー～]+)+")
+        self.repeat_phrase = re.compile("(.+?)\\1{3,}")
+
+    def normalize(self, text):
+        """
+        ツイートデータのテキストに正規化などのフィルタ処理を行う
+        @param text ツイートデータのテキスト
+        @return フィルタ処理を施したツイートデータのテキスト
+        """
+        text = self.paren.sub(" ", text)
+        text = replace_all(self.disallowed.sub(" ", text), CHAR_MAP)
+
+        text = self.repeat_point.sub("...", text)
+        text = self.repeat_mark.sub("\\1", text)
+
+        text = replace_all(text, NEWLINE_MAP)
+
+        text += "。"
+        text = self.point_run.sub("。", text)
+
+        text = self.exclamation_run.sub("！", text)
+        text = self.question_run.sub("？", text)
+        if "！" in text and "？" in text:
+            text = self.exclamation_question.sub("!?", text)
+
+        text = self.repeat_emotion.sub(" \\1 ", text)
+
+        text = self.reading_emotion.sub(" \\1。", text)
+        text = self.phrase_emotion.sub(" \\2\\1", text)
+
+        text = replace_all(text, POINT_MAP)
+        text = self.dots.sub(" ... ", text)
+        text = replace_all(text, MARK_MAP)
+        text = text.replace("!?", " !?\n")
+
+        text = self.line_head_bar.sub("\n", text)
+
+        text = self.head_marks.sub("", text)
+        if self.may_repeat(text):
+            text = self.repeat_phrase.sub("\\1\\1\\1", text)
+
+        return text
+
+    def may_repeat(self, text):
+        """
+        同じ文字列が4回以上繰り返されている可能性があるかを判定する
+        繰り返しは一行の中に収まり、その行には同じ2文字の並びが3回以上現れる
+        @param text ツイートデータのテキスト
+        @return True: 可能性がある、False: 繰り返しは存在しない
+        """
+        for line in text.split("\n"):
+            if len(line) >= 4 and max(Counter(zip(line, line[1:])).values()) >= 3:
+                return True
+        return False
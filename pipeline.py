@@ -0,0 +1,192 @@
+# coding: utf-8
+
+"""ツイートの本文から対話データの発話を作る処理と、それを複数のプロセスで行うプール"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import re
+import queue
+import threading
+import unicodedata
+import multiprocessing
+from screen import TextScreener
+from normalizer import TextNormalizer
+from morpheme import MorphemeAnalyzer
+from monitor import PipelineMonitor, NULL_MONITOR
+
+
+class TextPipeline():
+    """ツイートの本文を (テキスト, 標準形/表層形, 品詞列) に変換するクラス"""
+    def __init__(self, config, monitor=NULL_MONITOR):
+        """
+        コンストラクタ
+        @param config 設定ファイル情報
+        @param monitor 段階ごとの処理時間と除外理由を記録する PipelineMonitor
+        """
+        self.monitor = monitor
+        self.username = re.compile(r"(^|\s)(@|＠)(\w+)")
+        self.screener = TextScreener(config['check'])
+        self.normalizer = TextNormalizer()
+        self.analyzer = MorphemeAnalyzer(config['part'])
+
+    def del_username(self, text):
+        """
+        ツイートデータのテキストからユーザ名を除去
+        @param text ツイートデータのテキスト
+        @return ユーザ名を除去したツイートデータのテキスト
+        """
+        return self.username.sub("", text)
+
+    def clean(self, text):
+        """
+        ツイートの本文をNFKC正規化してユーザ名を除去する
+        @param text ツイートの本文
+        @return 除去後のテキスト
+        """
+        return self.del_username(unicodedata.normalize('NFKC', text))
+
+    def process_batch(self, texts):
+        """
+        複数のツイートの本文をまとめて変換する
+        @param texts ツイートの本文のリスト
+        @return (テキスト, 標準形/表層形, 品詞列) のリスト (不適切な本文はNone)
+        """
+        if self.monitor.enabled:
+            return self.process_measured(texts)
+        texts = [self.clean(text) for text in texts]
+        oks = [self.screener.check(text) for text in texts]
+        morphemes = iter(self.analyzer.analyze_batch([self.normalizer.normalize(text) for text, ok in zip(texts, oks) if ok]))
+        return [next(morphemes) if ok else None for ok in oks]
+
+    def process_measured(self, texts):
+        """
+        process_batch と同じ変換を、段階 (check、normalize、del_morpheme) ごとの処理時間と除外理由を記録しながら行う
+        @param texts ツイートの本文のリスト
+        @return (テキスト, 標準形/表層形, 品詞列) のリスト (不適切な本文はNone)
+        """
+        monitor = self.monitor
+        texts = [self.clean(text) for text in texts]
+
+        # 抵触した規則ごとに数える
+        with monitor.measure("check", len(texts)):
+            reasons = [self.screener.screen(text) for text in texts]
+        for reason in reasons:
+            if reason is not None:
+                monitor.count("rejects", reason=reason)
+
+        kept = [text for text, reason in zip(texts, reasons) if reason is None]
+        with monitor.measure("normalize", len(kept)):
+            kept = [self.normalizer.normalize(text) for text in kept]
+        with monitor.measure("del_morpheme", len(kept)):
+            morphemes = self.analyzer.analyze_batch(kept)
+
+        empty = sum([1 for result in morphemes if result[0] == ""])
+        if empty:
+            monitor.count("rejects", empty, reason="empty")
+
+        morphemes = iter(morphemes)
+        return [next(morphemes) if reason is None else None for reason in reasons]
+
+
+# ワーカープロセスごとの変換処理
+worker_pipeline = None
+
+
+def init_worker(config, measured=False):
+    """
+    ワーカープロセスの初期化 (プロセスごとに形態素解析器を作成する)
+    @param config 設定ファイル情報
+    @param measured True なら段階ごとの処理時間と除外理由を記録する
+    """
+    global worker_pipeline
+    worker_pipeline = TextPipeline(config, PipelineMonitor() if measured else NULL_MONITOR)
+
+
+def process_in_worker(texts):
+    """
+    ワーカープロセスで本文を変換する
+    @param texts ツイートの本文のリスト
+    @return (テキスト, 標準形/表層形, 品詞列) のリスト (不適切な本文はNone)
+    @return このバッチで記録した処理時間と除外理由 (記録しなければNone)
+    """
+    return worker_pipeline.process_batch(texts), worker_pipeline.monitor.drain()
+
+
+class PipelinePool():
+    """本文の変換をプロセスプールで行い、結果を依頼した順に受け渡すクラス"""
+    def __init__(self, config, processes, max_pending=None, monitor=NULL_MONITOR):
+        """
+        コンストラクタ
+        @param config 設定ファイル情報
+        @param processes ワーカープロセス数
+        @param max_pending 結果を待てる非同期のバッチの最大数 (これを超えるとsubmitが待たされる)
+        @param monitor ワーカープロセスで記録した処理時間と除外理由を集める PipelineMonitor
+        """
+        self.processes = processes
+        self.monitor = monitor
+        self.pool = multiprocessing.Pool(processes, init_worker, (config, monitor.enabled))
+
+        self.slots = threading.BoundedSemaphore(max_pending or processes * 2)
+        self.results = queue.Queue()
+        self.collector = threading.Thread(target=self.collect, name="pipeline-collector", daemon=True)
+        self.collector.start()
+
+    def map(self, texts):
+        """
+        本文を変換し終わるまで待って結果を返す
+        @param texts ツイートの本文のリスト
+        @return (テキスト, 標準形/表層形, 品詞列) のリスト (不適切な本文はNone)
+        """
+        if not texts:
+            return []
+        size = -(-len(texts) // self.processes)
+        chunks = [texts[i:i + size] for i in range(0, len(texts), size)]
+        results = []
+        for chunk, delta in self.pool.map(process_in_worker, chunks):
+            self.monitor.merge(delta)
+            results.extend(chunk)
+        return results
+
+    def submit(self, items, texts, callback):
+        """
+        本文の変換を非同期に依頼する
+        結果は依頼した順に callback(items, results) として集約スレッドから渡される
+        @param items 結果と一緒に渡すデータ
+        @param texts ツイートの本文のリスト
+        @param callback 結果を受け取る関数
+        """
+        self.slots.acquire()
+        self.results.put((self.pool.apply_async(process_in_worker, (texts,)), items, callback))
+
+    def collect(self):
+        """依頼した順に結果を待って受け渡す集約スレッドの処理"""
+        while True:
+            entry = self.results.get()
+            if entry is None:
+                self.results.task_done()
+                return
+
+            result, items, callback = entry
+            try:
+                results, delta = result.get()
+                self.monitor.merge(delta)
+                callback(items, results)
+            except Exception as e:
+                print('ON PIPELINE ERROR:', e)
+            finally:
+                self.slots.release()
+                self.results.task_done()
+
+    def join(self):
+        """依頼済みの変換がすべて受け渡されるまで待つ"""
+        self.results.join()
+
+    def close(self):
+        """依頼済みの変換をすべて受け渡してからワーカープロセスを終了する"""
+        self.results.put(None)
+        self.collector.join()
+        self.pool.close()
+        self.pool.join()
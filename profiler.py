@@ -0,0 +1,263 @@
+# coding: utf-8
+
+"""処理をcProfileかサンプリングで計測し、関数ごとの処理時間の一覧とフレームグラフ用のスタックを書き出すプロファイラ"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import os
+import io
+import sys
+import time
+import pstats
+import cProfile
+import threading
+from collections import Counter
+
+
+# プロファイラの種類
+PROFILE_MODES = ("cprofile", "sample")
+
+# スレッドごとに cProfile を有効にする必要があるか (3.12 以降は一つのプロファイラで全スレッドを計測する)
+PER_THREAD = sys.version_info < (3, 12)
+
+# 待機中とみなすスレッドの最も内側の関数のファイル (サンプリングでは数えない)
+IDLE_FILES = ("threading.py", "queue.py", "selectors.py", "socket.py", "ssl.py")
+
+
+def frame_label(code):
+    """
+    フレームグラフに表示する関数名を求める
+    @param code 関数のコードオブジェクト
+    @return "関数名 (ファイル名:行番号)"
+    """
+    return "%s (%s:%d)" % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+class StackSampler():
+    """一定間隔で全スレッドのスタックを調べ、同じスタックの出現回数を数えるクラス"""
+    def __init__(self, interval=0.005):
+        """
+        コンストラクタ
+        @param interval 調べる間隔 (秒)
+        """
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """サンプリングを始める"""
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.work, name="profiler-sampler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """サンプリングを終える"""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def work(self):
+        """サンプリングを行うスレッドの処理"""
+        own = threading.get_ident()
+        names = {}
+        while not self.stopped.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own or os.path.basename(frame.f_code.co_filename) in IDLE_FILES:
+                    continue
+
+                # 外側の関数から順に並べる
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame.f_code))
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack.append(names.get(ident, "thread-" + str(ident)))
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        """
+        フレームグラフ用のスタックを作る (flamegraph.pl や speedscope で読み込める形式)
+        @return "スレッド名;外側の関数;...;内側の関数 回数" の行のリスト
+        """
+        return ["%s %d" % (";".join(stack), n) for stack, n in sorted(self.stacks.items(), key=lambda item: -item[1])]
+
+    def report(self, top=40):
+        """
+        関数ごとの出現回数の一覧を作る
+        @param top 表示する関数の数
+        @return 一覧のテキスト
+        """
+        self_counts, total_counts = Counter(), Counter()
+        for stack, n in self.stacks.items():
+            self_counts[stack[-1]] += n
+            for label in set(stack[1:]):
+                total_counts[label] += n
+        total = sum(self.stacks.values()) or 1
+
+        lines = ["%d samples every %g[sec] (threads waiting in %s are not counted)" % (self.samples, self.interval, ", ".join(IDLE_FILES)), ""]
+        lines.append("%8s %7s %8s %7s  function" % ("self", "self%", "total", "total%"))
+        for label, n in self_counts.most_common(top):
+            lines.append("%8d %6.1f%% %8d %6.1f%%  %s" % (n, 100.0 * n / total, total_counts[label], 100.0 * total_counts[label] / total, label))
+        lines.append("")
+        lines.append("%8s %7s  function" % ("total", "total%"))
+        for label, n in total_counts.most_common(top):
+            lines.append("%8d %6.1f%%  %s" % (n, 100.0 * n / total, label))
+        return "\n".join(lines) + "\n"
+
+
+class Profiler():
+    """
+    処理をcProfileかサンプリングで計測するクラス
+    cProfileではスレッドごとにプロファイラを作って合算し、いずれの場合もフレームグラフ用にスタックをサンプリングする
+    計測を始める前からあるスレッドは、呼び出したスレッドを除いて cProfile では計測しない
+    """
+    def __init__(self, mode="cprofile", interval=0.005):
+        """
+        コンストラクタ
+        @param mode "cprofile": すべての関数呼び出しを計測する、"sample": スタックのサンプリングのみ (負荷が小さい)
+        @param interval サンプリングの間隔 (秒)
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError("unknown profile mode: " + str(mode))
+        self.mode = mode
+        self.sampler = StackSampler(interval)
+        self.lock = threading.Lock()
+        self.profiles = []
+        self.elapsed = 0.0
+        self.start_time = None
+
+        # 計測を終えたかどうか (各スレッドはこれを見て自分のプロファイラを外す)、終えた時点の結果
+        self.stopping = False
+        self.snapshot = None
+
+        # cProfile で計測したスレッドと、計測を始める前からあって計測しないスレッドの名前
+        self.threads = []
+        self.skipped = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def start(self):
+        """計測を始める"""
+        # サンプリングのスレッドは cProfile で計測しないように先に作る
+        self.sampler.start()
+        if self.mode == "cprofile":
+            if PER_THREAD:
+                # 計測中に作られたスレッドでも、最初の呼び出しでそのスレッド用のプロファイラに切り替える
+                current = threading.current_thread()
+                self.skipped = [thread.name for thread in threading.enumerate() if thread is not current and thread is not self.sampler.thread]
+                threading.setprofile(self.thread_start)
+            self.main_profile = self.enable(cProfile.Profile())
+        self.start_time = time.perf_counter()
+
+    def thread_start(self, frame, event, arg):
+        """新しいスレッドで最初に呼ばれるプロファイル関数"""
+        self.enable(cProfile.Profile(self.thread_timer))
+
+    def thread_timer(self):
+        """
+        計測を始めた後に作られたスレッドのプロファイラの時計
+        計測を終えていれば、次に呼ばれたときにそのスレッド自身がプロファイラを外す
+        (他のスレッドの disable ではそのスレッドのプロファイラは止まらない)
+        @return 時刻 (秒)
+        """
+        if self.stopping:
+            sys.setprofile(None)
+        return time.perf_counter()
+
+    def enable(self, profile):
+        """
+        呼び出したスレッドで cProfile を有効にする
+        @param profile プロファイラ
+        @return プロファイラ
+        """
+        with self.lock:
+            self.profiles.append(profile)
+            self.threads.append(threading.current_thread().name)
+        profile.enable()
+        return profile
+
+    def stop(self):
+        """計測を終える"""
+        self.elapsed = time.perf_counter() - self.start_time
+        if self.mode == "cprofile":
+            threading.setprofile(None)
+            self.stopping = True
+            self.main_profile.disable()
+
+            # 終えた時点の結果を残す (まだ動いているスレッドは、次の呼び出しでプロファイラを外すまで計測を続けるため)
+            self.snapshot = self.merge()
+        self.sampler.stop()
+
+    def merge(self):
+        """
+        全スレッドの cProfile の結果を合算する
+        @return pstats.Stats (cProfile を使っていなければNone)
+        """
+        with self.lock:
+            profiles = list(self.profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0], stream=io.StringIO())
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+    def stats(self):
+        """
+        計測を終えた時点の cProfile の結果を求める
+        @return pstats.Stats (cProfile を使っていなければNone)
+        """
+        return self.snapshot
+
+    def write(self, prefix, top=40):
+        """
+        計測結果を書き出す
+        "prefix.txt" に関数ごとの処理時間の一覧、"prefix.folded" にフレームグラフ用のスタック、
+        cProfile を使った場合は "prefix.prof" に pstats 形式の結果を書き出す
+        @param prefix 書き出すファイルパスの拡張子を除いた部分
+        @param top 一覧に表示する関数の数
+        @return 書き出したファイルパスのリスト
+        """
+        folder = os.path.dirname(prefix)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        paths = []
+        report = ["mode: %s, elapsed: %.2f[sec]" % (self.mode, self.elapsed)]
+        if self.mode == "cprofile":
+            if PER_THREAD:
+                report.append("cProfile threads: " + ", ".join(self.threads))
+                report.append("not profiled by cProfile (started before profiling): " + (", ".join(self.skipped) or "none"))
+            else:
+                report.append("cProfile threads: all")
+        report.append("")
+        stats = self.stats()
+        if stats is not None:
+            # 関数自身の処理時間の順と、呼び出した関数を含む処理時間の順
+            for key in ("tottime", "cumulative"):
+                stats.stream = io.StringIO()
+                stats.sort_stats(key).print_stats(top)
+                report.append(stats.stream.getvalue())
+            stats.dump_stats(prefix + ".prof")
+            paths.append(prefix + ".prof")
+        report.append(self.sampler.report(top))
+
+        with open(prefix + ".txt", 'w', encoding='utf-8') as f:
+            f.write("\n".join(report))
+        with open(prefix + ".folded", 'w', encoding='utf-8') as f:
+            f.write("\n".join(self.sampler.collapsed()) + "\n")
+        return [prefix + ".txt", prefix + ".folded"] + paths
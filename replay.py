@@ -0,0 +1,356 @@
+# coding: utf-8
+
+"""記録したストリームのツイートをキューリスナーに最大速度で流し込み、収集処理の速度を計測する"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import os
+import copy
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from contextlib import contextmanager
+import yaml
+from tweepy.models import Status
+from twitter import QueueListener
+from archive import open_shard
+from api_client import LookupClient
+from fake_api import FakeAPIServer
+
+
+# 記録ファイルとして読み込む拡張子
+RECORD_SUFFIXES = (".json", ".jsonl", ".json.gz", ".jsonl.gz", ".jsonl.zst")
+
+
+def record_files(path):
+    """
+    記録ファイルのパスを求める
+    @param path 記録ファイルか、記録ファイルのシャードを含むフォルダのパス (アーカイブの種類ごとのフォルダ)
+    @return 記録ファイルのパスのリスト (フォルダの場合は名前順)
+    """
+    if os.path.isdir(path):
+        return [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(RECORD_SUFFIXES)]
+    return [path]
+
+
+def iter_records(paths):
+    """
+    記録したストリームのデータを一行ずつ読み込む
+    @param paths 記録ファイルかフォルダのパスのリスト
+    @return json形式のデータを返すイテレータ (空行は飛ばす)
+    """
+    for path in paths:
+        for fp in record_files(path):
+            # 書き込み途中で終了したシャードは、読めたところまでの完全な行を返す
+            try:
+                with open_shard(fp) as f:
+                    for line in f:
+                        if not line.endswith("\n") and not is_json(line):
+                            break
+                        if line.strip():
+                            yield line
+            except EOFError:
+                pass
+
+
+def is_json(data):
+    """
+    json形式として読み込めるかを判定する
+    @param data 文字列
+    @return True: 読み込める、False: 読み込めない
+    """
+    try:
+        json.loads(data)
+    except ValueError:
+        return False
+    return True
+
+
+class StageTimer():
+    """処理の段階ごとの累積時間と回数を記録するクラス (複数のスレッドから呼ばれる)"""
+    def __init__(self):
+        """コンストラクタ"""
+        self.lock = threading.Lock()
+        self.times = {}
+        self.counts = {}
+
+    def add(self, stage, elapsed):
+        """
+        段階の処理時間を加える
+        @param stage 段階の名前
+        @param elapsed 秒数
+        """
+        with self.lock:
+            self.times[stage] = self.times.get(stage, 0.0) + elapsed
+            self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    @contextmanager
+    def measure(self, stage):
+        """
+        with 文の中の処理時間を段階の処理時間として加える
+        @param stage 段階の名前
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def report(self):
+        """
+        記録した順に各段階の処理時間を求める
+        @return 段階の名前から回数と秒数への辞書
+        """
+        with self.lock:
+            return {stage: {'count': self.counts[stage], 'seconds': self.times[stage]} for stage in self.times}
+
+
+class ReplayAPI():
+    """記録したツイートからリプライ先を返す、statuses_lookup だけを持つ偽のAPI"""
+    def __init__(self, timer, latency=0.0):
+        """
+        コンストラクタ
+        @param timer 処理時間を記録する StageTimer
+        @param latency 一回の取得ごとに待機する秒数 (実際のAPIの応答時間の模擬)
+        """
+        self.timer = timer
+        self.latency = latency
+        self.table = {}
+        self.calls = 0
+        self.hits = 0
+
+        # HTTPで取得する場合のクライアント (Noneなら直接返す)
+        self.client = None
+
+    @property
+    def bucket(self):
+        """
+        呼び出しの間隔を空けるクライアントのトークンバケット
+        @return TokenBucket (HTTPで取得しなければNone)
+        """
+        return self.client.bucket if self.client is not None else None
+
+    def load(self, paths):
+        """
+        記録ファイルのツイートを取得できるツイートとして読み込む
+        @param paths 記録ファイルかフォルダのパスのリスト
+        @return 読み込んだツイート数
+        """
+        cnt = 0
+        for data in iter_records(paths):
+            raw = json.loads(data)
+            if 'id' in raw and 'user' in raw and 'text' in raw:
+                self.table[raw['id']] = (raw.get('in_reply_to_status_id'), raw['user']['id'], raw['text'])
+                cnt += 1
+        return cnt
+
+    def find(self, ids):
+        """
+        ツイートIDのリストに対応するツイートの構造体を求める
+        @param ids ツイートIDのリスト
+        @return 記録されていたツイートの構造体のリスト
+        """
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+        statuses = []
+        for tweet_id in ids:
+            tweet = self.table.get(tweet_id)
+            if tweet:
+                statuses.append({
+                    'id': tweet_id, 'id_str': str(tweet_id), 'in_reply_to_status_id': tweet[0],
+                    'user': {'id': tweet[1]}, 'text': tweet[2]
+                })
+
+        with self.timer.lock:
+            self.calls += 1
+            self.hits += len(statuses)
+        return statuses
+
+    def statuses_lookup(self, id_, *args, **kwargs):
+        """
+        ツイートIDのリストに対応するツイートを返す
+        @param id_ ツイートIDのリスト
+        @return 記録されていたツイートのリスト
+        """
+        with self.timer.measure("lookup"):
+            if self.client is not None:
+                return self.client.statuses_lookup(id_)
+            return [Status.parse(None, raw) for raw in self.find(id_)]
+
+
+class ReplayListener(QueueListener):
+    """段階ごとの処理時間を記録するキューリスナー"""
+    def __init__(self, config, api, timer):
+        """
+        コンストラクタ
+        @param config 設定ファイル情報
+        @param api リプライ先の取得に用いるAPI
+        @param timer 処理時間を記録する StageTimer
+        """
+        self.timer = timer
+        super(ReplayListener, self).__init__(config, None, api)
+
+    def on_data(self, data):
+        """ツイートデータを処理する時間を記録する"""
+        with self.timer.measure("on_data"):
+            return super(ReplayListener, self).on_data(data)
+
+    def process(self, texts):
+        """本文を変換する時間を記録する"""
+        with self.timer.measure("process"):
+            return super(ReplayListener, self).process(texts)
+
+    def trace(self, batch, ids, replys, cached=None):
+        """リプライ先を対話に追加する時間を記録する"""
+        with self.timer.measure("trace"):
+            return super(ReplayListener, self).trace(batch, ids, replys, cached)
+
+    def dump(self, dialog):
+        """対話データを保存する時間を記録する"""
+        with self.timer.measure("dump"):
+            return super(ReplayListener, self).dump(dialog)
+
+
+def replay(config, records, lookups=None, latency=0.0, limit=None, rate_limit=False, http=False, monitor=False):
+    """
+    記録したストリームのデータをキューリスナーに流し込み、収集処理の速度を計測する
+    対話データやチェックポイントはカレントディレクトリの "data/" と "tmp/" に保存される
+    @param config 設定ファイル情報
+    @param records ストリームの記録ファイルかフォルダのパスのリスト
+    @param lookups リプライ先の記録ファイルかフォルダのパスのリスト (Noneならストリームの記録を用いる)
+    @param latency リプライ先の一回の取得ごとに待機する秒数
+    @param limit 流し込むデータ数の最大 (Noneなら制限しない)
+    @param rate_limit True なら lookup の rate_limit に従ってAPIの呼び出しの間隔を空ける
+    @param http True ならローカルのAPIサーバを立ててHTTPでリプライ先を取得する
+    @param monitor True なら段階ごとの処理時間と除外理由をモニタで記録する (公開はしない)
+    @return 計測結果の辞書
+    """
+    config = copy.deepcopy(config)
+    config['print_progress'] = False
+    config['archive']['use'] = False
+    config['monitor'].update({'use': monitor, 'port': 0, 'snapshot_file': ""})
+    if not rate_limit:
+        config['lookup']['rate_limit'] = 0
+
+    timer = StageTimer()
+    api = ReplayAPI(timer, latency)
+    table_size = api.load(lookups or records)
+
+    # 実際のクライアントでローカルのAPIサーバから取得する
+    server = None
+    if http:
+        lk = config['lookup']
+        server = FakeAPIServer(api.find, lk['rate_limit'] or 900, lk['rate_window'])
+        api.client = LookupClient(None, server.url, lk['rate_limit'], lk['rate_window'], lk['max_retries'], lk['timeout'])
+
+    listener = ReplayListener(config, api, timer)
+    cnt = 0
+    start = time.perf_counter()
+    try:
+        records = iter_records(records)
+        while limit is None or cnt < limit:
+            # 記録ファイルの読み込みと展開の時間も記録する
+            with timer.measure("read"):
+                data = next(records, None)
+            if data is None or not listener.on_data(data):
+                break
+            cnt += 1
+
+        # キューに残った対話もそれ以上さかのぼれなくなるまで取得する
+        listener.flush_queue()
+    finally:
+        listener.close()
+        if server is not None:
+            server.close()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'tweets': cnt,
+        'skipped': listener.decoder.skipped,
+        'dialogs': listener.dump_cnt,
+        'turns': listener.trn_cnt,
+        'seconds': elapsed,
+        'tweets_per_sec': cnt / elapsed if elapsed > 0 else 0.0,
+        'dialogs_per_sec': listener.dump_cnt / elapsed if elapsed > 0 else 0.0,
+        'lookup_table': table_size,
+        'lookup_calls': api.calls,
+        'lookup_hits': api.hits,
+        'client': api.client.stats() if api.client else None,
+        'cache': listener.cache.stats(),
+        'dialog_metrics': listener.metrics.stats(),
+        'monitor': listener.monitor.snapshot() if monitor else None,
+        'stages': timer.report()
+    }
+
+
+def print_result(result):
+    """
+    計測結果を出力する
+    @param result 計測結果の辞書
+    """
+    print("tweets : %d (%.1f tweets/sec), %d skipped without decoding" % (result['tweets'], result['tweets_per_sec'], result['skipped']))
+    print("dialogs: %d (%.1f dialogs/sec), turns: %d" % (result['dialogs'], result['dialogs_per_sec'], result['turns']))
+    print("lookup : %d calls, %d hits (table: %d)" % (result['lookup_calls'], result['lookup_hits'], result['lookup_table']))
+    if result['client']:
+        print("client : %(calls)d requests, %(remaining)s remaining, errors: %(errors)s" % result['client'])
+    print("cache  : %(hits)d hits, %(misses)d misses, %(entries)d entries (%(bytes)d[B]), %(evictions)d evictions" % result['cache'])
+    print("latency: %(latency_mean).2f[sec] mean, %(latency_max).2f[sec] max, %(calls_per_dialog).2f calls/dialog" % result['dialog_metrics'])
+    print("elapsed: %.2f[sec]" % result['seconds'])
+    for stage, stat in result['stages'].items():
+        print("  %-8s: %10d calls %10.2f[sec]" % (stage, stat['count'], stat['seconds']))
+    if result['monitor']:
+        print("monitor:")
+        for stage, stat in result['monitor']['stages'].items():
+            print("  %-15s: %10d calls %10d items %10.2f[sec] (p50 <= %g[sec], p99 <= %g[sec])" % (
+                stage, stat['calls'], stat['items'], stat['seconds'], stat['p50'], stat['p99']))
+        for reason, n in sorted(result['monitor']['counters'].get('rejects', {}).items()):
+            print("  reject %-8s: %10d" % (reason.split("=")[-1], n))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="記録したストリームのツイートを収集処理に流し込んで速度を計測する")
+    parser.add_argument('records', nargs='+', help="ストリームの記録ファイル (json/jsonl/gz) かシャードを含むフォルダ")
+    parser.add_argument('--lookup', action='append', help="リプライ先の記録ファイルかフォルダ (省略時はストリームの記録を用いる)")
+    parser.add_argument('--latency', type=float, default=0.0, help="リプライ先の一回の取得ごとに待機する秒数")
+    parser.add_argument('--limit', type=int, help="流し込むデータ数の最大")
+    parser.add_argument('--rate-limit', action='store_true', help="lookup の rate_limit に従ってAPIの呼び出しの間隔を空ける")
+    parser.add_argument('--http', action='store_true', help="ローカルのAPIサーバを立て、実際のクライアントでHTTPでリプライ先を取得する")
+    parser.add_argument('--monitor', action='store_true', help="段階ごとの処理時間と除外理由をモニタで記録して出力する")
+    parser.add_argument('--out', help="対話データを保存するフォルダ (空のフォルダか存在しないもの、省略時は一時フォルダに保存して削除する)")
+    parser.add_argument('--json', action='store_true', help="計測結果をjson形式で出力する")
+    args = parser.parse_args()
+
+    # 設定ファイルを読み込む
+    config = yaml.load(stream=open("config/config.yml", 'rt', encoding='utf-8'), Loader=yaml.SafeLoader)
+    records = [os.path.abspath(path) for path in args.records]
+    lookups = [os.path.abspath(path) for path in args.lookup] if args.lookup else None
+
+    # 収集済みのデータと混ざらないように、保存先のフォルダで実行する
+    if args.out:
+        if os.path.isdir(args.out) and os.listdir(args.out):
+            parser.error("output folder is not empty: " + args.out)
+        os.makedirs(args.out, exist_ok=True)
+        folder = args.out
+    else:
+        folder = tempfile.mkdtemp()
+
+    cwd = os.getcwd()
+    os.chdir(folder)
+    try:
+        result = replay(config, records, lookups, args.latency, args.limit, args.rate_limit, args.http, args.monitor)
+    finally:
+        os.chdir(cwd)
+        if not args.out:
+            shutil.rmtree(folder)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_result(result)
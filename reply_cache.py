@@ -0,0 +1,121 @@
+# coding: utf-8
+
+"""取得したリプライ先のツイートと変換結果を保持し、同じツイートの再取得と再変換を避けるキャッシュ"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import sys
+import time
+import threading
+from collections import OrderedDict
+
+
+# 変換結果がまだないことを表す値
+UNPROCESSED = object()
+
+# 一つのエントリの本文以外のおおよそのバイト数 (辞書の枠、タプル、整数)
+ENTRY_OVERHEAD = 400
+
+
+def entry_size(fields, result):
+    """
+    エントリのおおよそのバイト数を求める
+    @param fields [リプライ先のツイートID, ユーザID, 本文, ツイートID]
+    @param result (テキスト, 標準形/表層形, 品詞列) か None か UNPROCESSED
+    @return バイト数
+    """
+    size = ENTRY_OVERHEAD + sys.getsizeof(fields[2])
+    if result is not UNPROCESSED and result is not None:
+        size += sum([sys.getsizeof(text) for text in result])
+    return size
+
+
+class ReplyCache():
+    """
+    ツイートIDから取得したツイートの項目と変換結果への、件数とバイト数に上限のあるLRUキャッシュ
+    一定時間が経ったエントリは使わない (複数のスレッドから呼ばれる)
+    """
+    def __init__(self, max_entries=100000, max_bytes=67108864, ttl=900.0):
+        """
+        コンストラクタ
+        @param max_entries 保持する最大のエントリ数 (0ならキャッシュしない)
+        @param max_bytes 保持する最大のおおよそのバイト数
+        @param ttl エントリを使う秒数
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, tweet_id):
+        """
+        ツイートIDのエントリを求める
+        @param tweet_id ツイートID
+        @return ツイートの項目と変換結果 (変換していなければ UNPROCESSED)、なければNone
+        """
+        with self.lock:
+            entry = self.entries.get(tweet_id)
+            if entry is not None and time.time() - entry[3] > self.ttl:
+                self.remove(tweet_id)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(tweet_id)
+            return entry[0], entry[1]
+
+    def put(self, fields, result=UNPROCESSED):
+        """
+        取得したツイートの項目と変換結果を保持する
+        すでに変換結果があるエントリは、変換結果を省略しても残す
+        @param fields [リプライ先のツイートID, ユーザID, 本文, ツイートID] (変換前の本文)
+        @param result (テキスト, 標準形/表層形, 品詞列) か None (不適切な本文)
+        """
+        if self.max_entries <= 0:
+            return
+
+        with self.lock:
+            tweet_id = fields[3]
+            entry = self.entries.get(tweet_id)
+            if entry is not None:
+                if result is UNPROCESSED:
+                    result = entry[1]
+                self.remove(tweet_id)
+
+            size = entry_size(fields, result)
+            self.entries[tweet_id] = (tuple(fields), result, size, time.time())
+            self.size += size
+
+            # 上限を超えた分を使われていない順に捨てる
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def remove(self, tweet_id):
+        """
+        エントリを捨てる (ロックを取得した状態で呼ぶ)
+        @param tweet_id ツイートID
+        """
+        self.size -= self.entries.pop(tweet_id)[2]
+
+    def stats(self):
+        """
+        キャッシュの統計を求める
+        @return エントリ数、おおよそのバイト数、ヒット数、ミス数、捨てたエントリ数の辞書
+        """
+        with self.lock:
+            return {
+                'entries': len(self.entries), 'bytes': self.size,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions
+            }
@@ -0,0 +1,142 @@
+# coding: utf-8
+
+"""リプライ先を取得するバッチを作る時期と大きさを、APIの呼び出し回数の上限に合わせて決める"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import time
+import threading
+
+
+class Dialog(list):
+    """発話のリストに、最初にキューに入った時刻とキューに戻った時刻、APIで取得した回数と取得に失敗した回数を持たせた対話"""
+    def __init__(self, turns=()):
+        """
+        コンストラクタ
+        @param turns 発話のリスト
+        """
+        super(Dialog, self).__init__(turns)
+        self.first_seen = time.time()
+        self.queued_at = self.first_seen
+        self.calls = 0
+        self.failures = 0
+
+
+class BatchScheduler():
+    """
+    キューの対話を取得処理に回す時期とバッチの大きさを決めるクラス
+    バッチが満杯になるか、最も古い対話が一定時間待つとバッチを作る
+    APIの呼び出し回数の上限を時間枠の残りに均等に割り振り、呼び出しの間隔を空ける
+    """
+    def __init__(self, batch_size=100, max_age=30.0, rate_limit=900, window=900.0):
+        """
+        コンストラクタ
+        @param batch_size 一回の取得で扱う最大の対話数
+        @param max_age 満杯でないバッチを作るまでに最も古い対話を待たせる秒数
+        @param rate_limit 時間枠あたりのAPIの呼び出し回数の上限 (0なら制限しない)
+        @param window 時間枠の秒数
+        """
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self.rate_limit = rate_limit
+        self.window = window
+
+        self.window_start = time.time()
+        self.used = 0
+        self.last_call = None
+
+    def next_call(self, now):
+        """
+        次にAPIを呼び出せる時刻を求める
+        @param now 現在時刻
+        @return 時刻
+        """
+        if self.rate_limit <= 0 or self.last_call is None:
+            return now
+
+        # 時間枠が過ぎていれば新しい時間枠を始める
+        if now >= self.window_start + self.window:
+            self.window_start = now
+            self.used = 0
+
+        # 残りの呼び出し回数を時間枠の残りに均等に割り振る
+        window_end = self.window_start + self.window
+        remaining = self.rate_limit - self.used
+        if remaining <= 0:
+            return window_end
+        base = max(self.last_call, self.window_start)
+        return max(now, base + (window_end - base) / remaining)
+
+    def wait(self, size, oldest, now, flushing=False):
+        """
+        バッチを作るまでに待つ秒数を求める
+        @param size キューの対話数
+        @param oldest キューで最も古い対話がキューに入った時刻
+        @param now 現在時刻
+        @param flushing True なら満杯でなくても待たずにバッチを作る
+        @return 秒数 (今作れるなら0、キューが空ならNone)
+        """
+        if size == 0:
+            return None
+        due = now if size >= self.batch_size or flushing else oldest + self.max_age
+        return max(0.0, max(due, self.next_call(now)) - now)
+
+    def take(self, size, now):
+        """
+        バッチを作ってAPIを呼び出すことを記録する
+        @param size キューの対話数
+        @param now 現在時刻
+        @return バッチの対話数
+        """
+        if now >= self.window_start + self.window:
+            self.window_start = now
+            self.used = 0
+        self.used += 1
+        self.last_call = now
+        return min(size, self.batch_size)
+
+
+class DialogMetrics():
+    """保存した対話の、最初にキューに入ってから保存されるまでの時間とAPIで取得した回数を集計するクラス"""
+    def __init__(self):
+        """コンストラクタ"""
+        self.lock = threading.Lock()
+        self.dialogs = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.calls_sum = 0
+        self.api_calls = 0
+
+    def call(self):
+        """APIを一回呼び出したことを記録する"""
+        with self.lock:
+            self.api_calls += 1
+
+    def dump(self, dialog):
+        """
+        対話を保存したことを記録する
+        @param dialog 保存した対話
+        """
+        latency = time.time() - dialog.first_seen
+        with self.lock:
+            self.dialogs += 1
+            self.latency_sum += latency
+            self.latency_max = max(self.latency_max, latency)
+            self.calls_sum += dialog.calls
+
+    def stats(self):
+        """
+        集計結果を求める
+        @return 対話数、保存までの時間の平均と最大、対話あたりの取得回数、APIの呼び出し回数の辞書
+        """
+        with self.lock:
+            return {
+                'dialogs': self.dialogs,
+                'latency_mean': self.latency_sum / self.dialogs if self.dialogs else 0.0,
+                'latency_max': self.latency_max,
+                'calls_per_dialog': self.calls_sum / self.dialogs if self.dialogs else 0.0,
+                'api_calls': self.api_calls
+            }
@@ -0,0 +1,93 @@
+# coding: utf-8
+
+"""ツイートのテキストに不適切な情報が含まれていないかを一度の走査で判定"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import re
+
+
+# URL (画像も含む？)
+URL_PATTERN = r"((ftp|http|https):\/\/(\w+:{0,1}\w*@)?(\S+)(:[0-9]+)?(\/|\/([\w#!:.?+=&amp;%@!&#45;\/]))?)"
+# ハッシュタグ
+# (?:^|[^...]+)[#＃]([...]*[...]+[...]*) と同じテキストに一致し、直前の文字と最初の数文字だけを調べる
+HASHTAG_PATTERN = r"(?<![ーー゛゜々ヾヽぁ-ヶ一-龠a-zA-Z0-9&_/>])[#＃][0-9_]*[ー゛゜々ヾヽぁ-ヶ一-龠a-zA-Z]"
+# 英数字 (URLは必ず英数字から始まるので、この規則に一致した位置でURLかどうかを調べる)
+ALNUM_PATTERN = r"[a-zA-Z0-9]"
+
+
+def trie_pattern(words):
+    """
+    単語のリストを共通の接頭辞でまとめたトライ構造の正規表現に変換する
+    @param words 単語のリスト
+    @return 正規表現の文字列
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node):
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        optional = "" in node
+        if len(alts) == 1 and not optional:
+            return alts[0]
+        return "(?:" + "|".join(alts) + ")" + ("?" if optional else "")
+
+    return build(trie)
+
+
+class TextScreener():
+    """除外規則を一つの正規表現にまとめてあらかじめコンパイルしておくクラス"""
+    def __init__(self, word_lists):
+        """
+        コンストラクタ
+        @param word_lists 規則名をキー、含んではならない単語のリストを値とする辞書
+        """
+        # 単語から規則名を引く辞書 (複数の規則に含まれる単語は先の規則とする)
+        self.word_rules = {}
+        for name, words in word_lists.items():
+            for word in words or []:
+                self.word_rules.setdefault(word, name)
+
+        patterns = [HASHTAG_PATTERN, ALNUM_PATTERN]
+        if self.word_rules:
+            patterns.append(trie_pattern(self.word_rules))
+
+        self.pattern = re.compile("|".join(patterns))
+        self.url_pattern = re.compile(URL_PATTERN)
+        self.alnum_pattern = re.compile(ALNUM_PATTERN)
+
+    def screen(self, text):
+        """
+        テキストの先頭から見て最初に抵触する規則を判定する
+        @param text ツイートデータのテキスト
+        @return 抵触した規則名 (url, hashtag, alnum, または単語のリストの名前)、抵触しなければNone
+        """
+        match = self.pattern.search(text)
+        if not match:
+            return None
+
+        word = match.group()
+        if word in self.word_rules:
+            return self.word_rules[word]
+        if word[0] in "#＃":
+            return "hashtag"
+        if self.url_pattern.match(text, match.start()):
+            return "url"
+        return "alnum"
+
+    def check(self, text):
+        """
+        テキストがいずれの規則にも抵触しないかを判定する
+        @param text ツイートデータのテキスト
+        @return True: 適切、False: 不適切
+        """
+        return self.pattern.search(text) is None
@@ -0,0 +1,110 @@
+# coding: utf-8
+
+"""ストリームのデータからリプライだけを、必要な項目に絞って高速に取り出す"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import json
+
+# 高速なjsonライブラリがあれば使う
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    try:
+        import ujson
+        loads = ujson.loads
+    except ImportError:
+        loads = json.loads
+
+
+# リプライ先のツイートIDのキー
+REPLY_KEY = '"in_reply_to_status_id"'
+# ツイートIDのキー
+ID_KEY = '"id"'
+# キーと値の間に入りうる文字
+SEPARATORS = " \t\r\n:"
+
+
+def value_start(data, key):
+    """
+    最初に現れるキーの値の開始位置を求める
+    ストリームのツイートでは最上位のキーが引用やリツイートの元のツイートより先に現れる
+    @param data json形式のデータ
+    @param key ダブルクォートで囲んだキー
+    @return 値の開始位置 (キーがなければ-1)
+    """
+    i = data.find(key)
+    if i < 0:
+        return -1
+    i += len(key)
+    while i < len(data) and data[i] in SEPARATORS:
+        i += 1
+    return i
+
+
+def is_reply(data):
+    """
+    デコードせずに、リプライである可能性があるかを判定する
+    @param data json形式のデータ
+    @return True: リプライの可能性がある、False: リプライではない (リプライ先がnullか、ツイートでない)
+    """
+    i = value_start(data, REPLY_KEY)
+    return i >= 0 and not data.startswith("null", i)
+
+
+def peek_id(data):
+    """
+    デコードせずに、最初に現れるツイートIDを取り出す
+    @param data json形式のデータ
+    @return ツイートID (数値でなければNone)
+    """
+    i = value_start(data, ID_KEY)
+    if i < 0:
+        return None
+    j = i
+    while j < len(data) and data[j].isdigit():
+        j += 1
+    return int(data[i:j]) if j > i else None
+
+
+class StreamDecoder():
+    """リプライでないデータをデコードせずに捨て、リプライから on_status が使う項目だけを取り出すクラス"""
+    def __init__(self):
+        """コンストラクタ"""
+        self.messages = 0
+        self.skipped = 0
+        self.replys = 0
+
+    def decode(self, data):
+        """
+        データがリプライなら必要な項目を取り出す
+        @param data json形式のデータ
+        @return [リプライ先のツイートID, ユーザID, 本文, ツイートID] (リプライでなければNone)
+        """
+        self.messages += 1
+        if not is_reply(data):
+            self.skipped += 1
+            return None
+        return self.extract(loads(data))
+
+    def extract(self, raw):
+        """
+        デコードしたデータがリプライなら必要な項目を取り出す
+        @param raw ツイートデータの構造体
+        @return [リプライ先のツイートID, ユーザID, 本文, ツイートID] (リプライでなければNone)
+        """
+        if not isinstance(raw.get('in_reply_to_status_id'), int):
+            return None
+        self.replys += 1
+        return [raw['in_reply_to_status_id'], raw['user']['id'], raw['text'], raw['id']]
+
+    def stats(self):
+        """
+        デコードの統計を求める
+        @return データ数、デコードせずに捨てたデータ数、リプライ数の辞書
+        """
+        return {'messages': self.messages, 'skipped': self.skipped, 'replys': self.replys}
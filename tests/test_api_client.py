@@ -0,0 +1,158 @@
+# coding: utf-8
+
+"""LookupClient の再試行と待機時間を、ローカルのAPIサーバに失敗を注入して確かめるテスト"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import os
+import sys
+import time
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from api_client import LookupClient, TokenBucket, APIError, RESET_MARGIN
+from fake_api import FakeAPIServer
+
+
+class FakeTime():
+    """待機した秒数を記録し、その分だけ時刻を進める偽の時計"""
+    def __init__(self):
+        """コンストラクタ"""
+        self.now = time.time()
+        self.sleeps = []
+
+    def time(self):
+        """
+        現在時刻を返す
+        @return 時刻 (UNIX時間)
+        """
+        return self.now
+
+    def sleep(self, seconds):
+        """
+        待機したことにして時刻を進める
+        @param seconds 秒数
+        """
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def find(ids):
+    """
+    どのツイートIDにもリプライ先のないツイートを返す
+    @param ids ツイートIDのリスト
+    @return ツイートの構造体のリスト
+    """
+    return [{'id': i, 'id_str': str(i), 'in_reply_to_status_id': None, 'user': {'id': 1}, 'text': "text"} for i in ids]
+
+
+@pytest.fixture
+def clock():
+    """偽の時計"""
+    return FakeTime()
+
+
+@pytest.fixture
+def server(clock):
+    """偽の時計で時間枠を数えるローカルのAPIサーバ"""
+    server = FakeAPIServer(find, 900, 900, clock=clock.time)
+    yield server
+    server.close()
+
+
+def client_for(server, clock, rate_limit=0, max_retries=5):
+    """
+    ローカルのAPIサーバを呼び出すクライアントを作る
+    @param server ローカルのAPIサーバ
+    @param clock 偽の時計
+    @param rate_limit 時間枠あたりの呼び出し回数の上限 (0ならトークンバケットで待たない)
+    @param max_retries 再試行する最大の回数
+    @return クライアント
+    """
+    return LookupClient(None, server.url, rate_limit, 900, max_retries, 5, sleep=clock.sleep, clock=clock.time)
+
+
+def test_injected_faults(server, clock):
+    """503、切断、429、404 の順に失敗すると、それぞれの待機時間だけ待って再試行し、404で諦める"""
+    client = client_for(server, clock)
+    server.inject(503, "drop", 429, 404)
+    with pytest.raises(APIError) as e:
+        client.statuses_lookup([1])
+    assert e.value.status == 404
+    # リセット時刻が分からない429は1分から倍々に待つ
+    assert clock.sleeps == [5.0, 0.25, 60.0]
+    assert client.stats()['errors'] == {503: 1, "tcpip": 1, 429: 1, 404: 1}
+
+
+def test_server_error_doubles(server, clock):
+    """サーバエラーは5秒から倍々に待つ"""
+    client = client_for(server, clock)
+    server.inject(503, 503, 503, 503)
+    assert [status.id for status in client.statuses_lookup([7])] == [7]
+    assert clock.sleeps == [5.0, 10.0, 20.0, 40.0]
+
+
+def test_tcpip_error_steps(server, clock):
+    """通信エラーは0.25秒ずつ増やして待つ"""
+    client = client_for(server, clock)
+    server.inject("drop", "drop", "drop")
+    client.statuses_lookup([7])
+    assert clock.sleeps == [0.25, 0.5, 0.75]
+
+
+def test_rate_limit_waits_until_reset(server, clock):
+    """リセット時刻が分かっている429はリセット時刻まで待つ"""
+    client = client_for(server, clock)
+    client.statuses_lookup([7])
+    reset_at = client.stats()['reset_at']
+
+    start = clock.now
+    server.inject(429)
+    client.statuses_lookup([7])
+    assert clock.sleeps == [pytest.approx(reset_at - start + RESET_MARGIN)]
+
+
+def test_reset_after_success(server, clock):
+    """成功するとすべての待機時間が最初に戻る"""
+    client = client_for(server, clock)
+    server.inject(503, 503, "drop", "drop")
+    client.statuses_lookup([7])
+    assert clock.sleeps == [5.0, 10.0, 0.25, 0.5]
+
+    server.inject(503, "drop")
+    client.statuses_lookup([7])
+    assert clock.sleeps[4:] == [5.0, 0.25]
+
+
+def test_retries_exhausted(server, clock):
+    """再試行の回数を使い切ると最後の例外を出す"""
+    client = client_for(server, clock, max_retries=2)
+    server.inject(500, 500, 502)
+    with pytest.raises(APIError) as e:
+        client.statuses_lookup([7])
+    assert e.value.status == 502
+    assert clock.sleeps == [5.0, 10.0]
+
+
+def test_exhausted_window_waits_once(clock):
+    """残り回数を使い切ると、偽の時計でもリセット時刻まで一度だけ待つ"""
+    server = FakeAPIServer(find, 2, 900, clock=clock.time)
+    try:
+        client = client_for(server, clock, rate_limit=2)
+        for _ in range(3):
+            client.statuses_lookup([7])
+        assert len(clock.sleeps) == 1
+        assert clock.sleeps[0] == pytest.approx(900.0, abs=1.0)
+    finally:
+        server.close()
+
+
+def test_bucket_paces_calls(clock):
+    """トークンを使い切ると、溜まるまでの時間だけ待つ"""
+    bucket = TokenBucket(2, 1.0, burst=1, sleep=clock.sleep, clock=clock.time)
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.sleeps == [pytest.approx(0.5)]
@@ -0,0 +1,69 @@
+# coding: utf-8
+
+"""溜めた対話データが、新しい対話データが届かなくても書き出す間隔で書き出されることを確かめるテスト"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import os
+import sys
+import copy
+import json
+import time
+import yaml
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from twitter import QueueListener
+from scheduler import Dialog
+from corpus_writer import CorpusWriter
+
+
+# 書き出す間隔 (秒)
+FLUSH_INTERVAL = 0.2
+
+
+def test_flush_due(tmp_path):
+    """書き出す間隔が過ぎるまでは残り秒数を返し、過ぎると書き出してジャーナルを更新する"""
+    path, journal = str(tmp_path / "dialog.txt"), str(tmp_path / "journal.json")
+    writer = CorpusWriter([path], flush_interval=FLUSH_INTERVAL, journal=journal)
+    assert writer.flush_due() is None
+
+    writer.write({path: ["a", "b"]})
+    wait = writer.flush_due()
+    assert 0 < wait <= FLUSH_INTERVAL
+    assert os.path.getsize(path) == 0
+
+    time.sleep(wait)
+    assert writer.flush_due() is None
+    assert json.load(open(journal)) == {path: 4}
+    writer.close()
+
+
+def test_listener_flushes_when_idle(tmp_path, monkeypatch):
+    """ストリームが止まっていても、キューリスナーはファイルとストアに書き出す"""
+    config = yaml.load(stream=open(os.path.join(ROOT, "config/config.yml"), 'rt', encoding='utf-8'), Loader=yaml.SafeLoader)
+    config = copy.deepcopy(config)
+    config['print_progress'] = False
+    config['archive']['use'] = False
+    config['nlp']['processes'] = 0
+    config['dump']['store_file'] = True
+    config['writer']['flush_interval'] = FLUSH_INTERVAL
+    monkeypatch.chdir(tmp_path)
+
+    listener = QueueListener(config, None, api=object())
+    try:
+        with listener.lock:
+            listener.dump(Dialog([[[None, 1, "b", 2], "b", "名詞"], [[2, 0, "a", 3], "a", "名詞"]]))
+            listener.cond.notify_all()
+
+        deadline = time.time() + FLUSH_INTERVAL * 20
+        while (listener.writer.pending or listener.store.pending) and time.time() < deadline:
+            time.sleep(FLUSH_INTERVAL / 4)
+        assert listener.writer.pending == 0
+        assert listener.store.count == 1
+        assert json.load(open("data/.journal.json"))[listener.layout.dig_fp] == os.path.getsize(listener.layout.dig_fp) > 0
+    finally:
+        listener.close()
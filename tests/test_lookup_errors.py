@@ -0,0 +1,139 @@
+# coding: utf-8
+
+"""リプライ先の取得に失敗したバッチを、QueueListener がキューに戻すか諦めるかを確かめるテスト"""
+__author__ = "Aso Taisei"
+__version__ = "1.0.0"
+__date__ = "18 Oct 2026"
+
+
+# 必要なモジュールをインポート
+import os
+import sys
+import copy
+import yaml
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from twitter import QueueListener
+from scheduler import Dialog
+from api_client import LookupClient
+from fake_api import FakeAPIServer
+from test_api_client import FakeTime, find
+
+
+# 失敗した対話をキューに戻す最大の回数
+MAX_FAILURES = 3
+
+
+@pytest.fixture
+def listener(tmp_path, monkeypatch):
+    """ローカルのAPIサーバから取得し、一時フォルダに保存するキューリスナー"""
+    config = yaml.load(stream=open(os.path.join(ROOT, "config/config.yml"), 'rt', encoding='utf-8'), Loader=yaml.SafeLoader)
+    config = copy.deepcopy(config)
+    config['print_progress'] = False
+    config['archive']['use'] = False
+    config['monitor'].update({'use': True, 'port': 0, 'snapshot_file': ""})
+    config['nlp']['processes'] = 0
+    # 取得は submit を呼んだスレッドで行い、スケジューラにはバッチを作らせない
+    config['lookup'].update({'workers': 0, 'max_age': 1e9, 'rate_limit': 0, 'max_retries': 0, 'max_failures': MAX_FAILURES})
+
+    clock = FakeTime()
+    server = FakeAPIServer(find, 900, 900, clock=clock.time)
+    monkeypatch.chdir(tmp_path)
+    lk = config['lookup']
+    api = LookupClient(None, server.url, 0, lk['rate_window'], lk['max_retries'], lk['timeout'], sleep=clock.sleep, clock=clock.time)
+    listener = QueueListener(config, None, api)
+    listener.server = server
+    yield listener
+    listener.close()
+    server.close()
+
+
+def dialog(turns):
+    """
+    リプライ先をさかのぼり途中の対話を作る
+    @param turns 発話数
+    @return 新しい順に並んだ発話の対話 (最も古い発話はツイートID 100 へのリプライ)
+    """
+    return Dialog([[[100 + turns - i, i % 2, "text " + str(i), 100 + turns - i + 1], "text", "名詞"] for i in range(turns)])
+
+
+def submit(listener, batch):
+    """
+    バッチを取得処理に回す
+    @param listener キューリスナー
+    @param batch 対話のリスト
+    """
+    with listener.lock:
+        listener.inflight += 1
+    listener.pool.submit(batch)
+
+
+def retry(listener):
+    """
+    キューに戻された対話をすべて取り出して、もう一度取得処理に回す
+    @param listener キューリスナー
+    @return 取り出した対話のリスト
+    """
+    with listener.lock:
+        batch, listener.queue = listener.queue, []
+    submit(listener, batch)
+    return batch
+
+
+def given_up(listener):
+    """
+    取得を諦めた対話の数を求める
+    @param listener キューリスナー
+    @return 結果ごとの対話数の辞書
+    """
+    return listener.monitor.snapshot()['counters'].get('lookup_given_up', {})
+
+
+def test_retryable_faults_until_give_up(listener):
+    """503、切断、429 はキューに戻し、max_failures 回を超えると2発話以上の対話だけ保存する"""
+    long, short = dialog(2), dialog(1)
+    listener.server.inject(503, "drop", 429, 503)
+
+    submit(listener, [long, short])
+    for failures in range(1, MAX_FAILURES + 1):
+        assert listener.queue == [long, short]
+        assert (long.failures, short.failures) == (failures, failures)
+        assert listener.inflight == 0
+        retry(listener)
+
+    assert listener.queue == []
+    assert listener.dump_cnt == 1
+    assert given_up(listener) == {'result=dumped': 1, 'result=dropped': 1}
+
+
+def test_client_error_gives_up(listener):
+    """404 は再試行せずに諦め、2発話以上の対話だけ保存する"""
+    long, short = dialog(3), dialog(1)
+    listener.server.inject(404)
+
+    submit(listener, [long, short])
+    assert listener.queue == []
+    assert listener.dump_cnt == 1
+    assert listener.trn_cnt == 2
+    assert given_up(listener) == {'result=dumped': 1, 'result=dropped': 1}
+
+
+def test_retry_keeps_order_after_failed_dump(listener, monkeypatch):
+    """保存に失敗しても対話は並べ替えられず、同じバッチの他の対話は一度だけ扱われる"""
+    failed, kept = dialog(2), dialog(1)
+    ids = [turn[0][3] for turn in failed]
+
+    def write(records):
+        raise OSError("disk full")
+    monkeypatch.setattr(listener.writer, "write", write)
+
+    # リプライ先のないツイートが返るので、2発話以上の対話は保存され、1発話の対話は捨てられる
+    submit(listener, [failed, kept])
+    assert [turn[0][3] for turn in failed[:2]] == ids
+    assert listener.queue == []
+    assert listener.dump_cnt == 0
+    assert listener.monitor.snapshot()['counters']['dump_errors'] == {'': 1}
+    assert 'lookup_errors' not in listener.monitor.snapshot()['counters']
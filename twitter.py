@@ -7,116 +7,154 @@ __date__ = "4 May 2019"
 
 
 # 必要モジュールのインポート
-import yaml
 import os
-import json
-import re
+import yaml
 import time
-import unicodedata
-import tweepy
+import shutil
+import argparse
+import tempfile
+import threading
 from tweepy import OAuthHandler, Stream
 from tweepy.streaming import StreamListener
-import MeCab
-
-
-# 分かち書きするモジュール
-tagger = MeCab.Tagger('-Ochasen')
-
-# 指定した複数のインデックスに対応する要素をリストから削除するラムダ式
-dellist = lambda items, indices: [item for idx, item in enumerate(items) if idx not in indices]
-
-# ストリームを再開する際の待機時間
-tcpip_delay = 0.25
-MAX_TCPIP_TIMEOUT = 16
+from dedup import TweetIdSet
+from checkpoint import Checkpoint
+from lookup_pool import LookupPool
+from pipeline import TextPipeline, PipelinePool
+from corpus_writer import CorpusWriter, CorpusLayout
+from dialog_store import DialogStore
+from archive import StreamArchive
+from stream_decoder import StreamDecoder, peek_id
+from reply_cache import ReplyCache, UNPROCESSED
+from scheduler import Dialog, BatchScheduler, DialogMetrics
+from api_client import LookupClient, BackoffPolicy, APIError
+from monitor import PipelineMonitor, MonitorExporter, NULL_MONITOR
+from profiler import Profiler, PROFILE_MODES
 
 
 class QueueListener(StreamListener):
     """流れるツイートを取得するモジュール群のクラス"""
-    def __init__(self, config, api_config):
+    def __init__(self, config, api_config, api=None):
         """
         コンストラクタ
         @param config 設定ファイル情報
         @param api_config Twitter APIの情報
+        @param api リプライ先の取得に用いるAPI (Noneなら api_config から作成する)
         """
         super(QueueListener, self).__init__()
 
         # メンバの初期化
         self.queue = []
-        self.BATCH_SIZE = 100
         self.trn_cnt = 0
         self.dig_cnt = 0
         self.dump_cnt = 0
-        self.tweet_ids = []
+        self.tweet_ids = TweetIdSet(1000000)
         self.cum_time = 0
         self.start_time = time.time()
+        self.checkpoint = Checkpoint("tmp")
+        self.lock = threading.RLock()
+        self.cond = threading.Condition(self.lock)
+        self.decoder = StreamDecoder()
+
+        # 段階ごとの処理時間と除外理由を記録するモニタ (使わない場合は何もしない)
+        mo = config['monitor']
+        self.monitor = PipelineMonitor() if mo['use'] else NULL_MONITOR
+
+        # ストリームのデータごとに呼ばれる処理は、記録する場合だけ処理時間を記録する関数に置き換える
+        if self.monitor.enabled:
+            self.on_data = self.monitor.wrap("on_data", self.on_data)
+            self.on_status = self.monitor.wrap("on_status", self.on_status)
+            self.decoder.decode = self.monitor.wrap("decode", self.decoder.decode)
 
         # チェックポイントの読み込み
         self.load_tmp()
 
-        # 保存ファイル名の情報取得
-        fn = config['filename']
-        inp_fn = fn['input_file']
-        tar_fn = fn['target_file']
-        dig_fn = fn['dialog_file']
-        std_fn = fn['standard_file']
-        prt_fn = fn['part_file']
-
-        # 保存ファイルパス
-        self.dig_fp = "data/" + dig_fn + ".txt"
-        self.dig_std_fp = "data/" + dig_fn + "_" + std_fn + ".txt"
-        self.dig_prt_fp = "data/" + dig_fn + "_" + prt_fn + ".txt"
-        self.inp_fp = "data/" + inp_fn + ".txt"
-        self.tar_fp = "data/" + tar_fn + ".txt"
-        self.inp_std_fp = "data/" + inp_fn + "_" + std_fn + ".txt"
-        self.tar_std_fp = "data/" + tar_fn + "_" + std_fn + ".txt"
-        self.inp_prt_fp = "data/" + inp_fn + "_" + prt_fn + ".txt"
-        self.tar_prt_fp = "data/" + tar_fn + "_" + prt_fn + ".txt"
-
-        # 保存するかどうかを取得
-        fd = config['dump']
-        self.trn_fd = fd['turn_file']
-        self.dig_fd = fd['dialog_file']
-        self.std_fd = fd['standard_file']
-        self.prt_fd = fd['part_file']
-
-        # tweepy関連の情報取得
-        cfg_auth = api_config['twitter_API']
-        self.auth = OAuthHandler(cfg_auth['consumer_key'], cfg_auth['consumer_secret'])
-        self.auth.set_access_token(cfg_auth['access_token'], cfg_auth['access_token_secret'])
-        self.api = tweepy.API(self.auth)
+        # 保存するファイルを開いたままにしておく
+        self.layout = CorpusLayout(config)
+        wr = config['writer']
+        self.writer = CorpusWriter(self.layout.paths(), wr['buffer_size'], wr['flush_interval'])
+
+        # 対話を一レコードとして保存するストア
+        st = config['store']
+        self.store = DialogStore(st['folder'], st['shard_size'], wr['buffer_size'], wr['flush_interval']) if config['dump']['store_file'] else None
+
+        # ストリームのデータとリプライ先の取得結果をそのまま保存するアーカイブ
+        ar = config['archive']
+        self.archive = StreamArchive(ar['folder'], ar['compression'], ar['shard_bytes'], ar['shard_seconds'], ar['flush_interval']) if ar['use'] else None
+
+        # tweepy関連の情報取得 (APIが渡された場合は認証しない)
+        lk = config['lookup']
+        if api is None:
+            cfg_auth = api_config['twitter_API']
+            self.auth = OAuthHandler(cfg_auth['consumer_key'], cfg_auth['consumer_secret'])
+            self.auth.set_access_token(cfg_auth['access_token'], cfg_auth['access_token_secret'])
+            self.api = LookupClient(self.auth, lk['api_root'], lk['rate_limit'], lk['rate_window'], lk['max_retries'], lk['timeout'])
+        else:
+            self.auth = None
+            self.api = api
+
+        # ストリームに再接続するまでの待機時間と、最後に返ってきたステータスコード
+        self.backoff = BackoffPolicy()
+        self.error_status = None
+
+        # ツイートの本文を対話データの発話に変換するモジュール
+        self.pipeline = TextPipeline(config, self.monitor)
+
+        # 変換を複数のプロセスで行う場合はプロセスプールを作成 (スレッドを作る前に作成する)
+        nl = config['nlp']
+        self.nlp_batch_size = nl['batch_size']
+        self.nlp = PipelinePool(config, nl['processes'], monitor=self.monitor) if nl['processes'] > 0 else None
+        self.replys = []
+
+        # リプライ先を取得するワーカープールを作成
+        self.pool = LookupPool(self.lookup, lk['workers'], lk['max_pending'], self.on_lookup_error)
+
+        # 取得したリプライ先と変換結果のキャッシュ
+        self.cache = ReplyCache(lk['cache_entries'], lk['cache_bytes'], lk['cache_ttl'])
+
+        # キューの対話からバッチを作って取得処理に回すスレッドを作成
+        # APIがトークンバケットで呼び出しの間隔を空ける場合は二重に待たないよう、バッチを作る時期は呼び出し回数の上限で制限しない
+        paced = getattr(self.api, 'bucket', None) is not None
+        self.scheduler = BatchScheduler(lk['batch_size'], lk['max_age'], 0 if paced else lk['rate_limit'], lk['rate_window'])
+
+        # 取得に失敗した対話をキューに戻す最大の回数
+        self.max_failures = lk['max_failures']
+
+        # キューに溜められる対話の最大数 (これに達するとストリームの処理が待たされる、0ならバッチの大きさと処理待ちの最大数から決める)
+        self.max_queue = max(lk['max_queue'] or lk['batch_size'] * max(lk['max_pending'], 1), lk['batch_size'])
+        self.metrics = DialogMetrics()
+        self.inflight = 0
+        self.flushing = False
+        self.closed = False
+        self.scheduler_thread = threading.Thread(target=self.schedule, name="scheduler", daemon=True)
+        self.scheduler_thread.start()
 
         # 進捗を表示するかどうかを取得
         self.progress = config['print_progress']
 
-        # 品詞のトークンを取得
-        pt = config['part']
-        self.noun_main_token = pt['noun_main']
-        self.noun_sub_token = pt['noun_sub']
-        self.verb_main_token = pt['verb_main']
-        self.verb_sub_token = pt['verb_sub']
-        self.adjective_main_token = pt['adjective_main']
-        self.adjective_sub_token = pt['adjective_sub']
-        self.adverb_token = pt['adverb']
-        self.particle_token = pt['particle']
-        self.auxiliary_verb_token = pt['auxiliary_verb']
-        self.conjunction_token = pt['conjunction']
-        self.prefix_token = pt['prefix']
-        self.filler_token = pt['filler']
-        self.impression_verb_token = pt['impression_verb']
-        self.three_dots_token = pt['three_dots']
-        self.phrase_point_token = pt['phrase_point']
-        self.reading_point_token = pt['reading_point']
-        self.other_token = pt['other']
+        # キューの長さや各モジュールの統計を公開する
+        self.monitor.gauge("queue_depth", lambda: len(self.queue), queue="dialogs")
+        self.monitor.gauge("queue_depth", lambda: self.inflight, queue="inflight")
+        self.monitor.gauge("queue_depth", lambda: self.pool.pending(), queue="lookup")
+        self.monitor.gauge("queue_depth", lambda: len(self.replys), queue="nlp")
+        self.monitor.section("dialogs", self.metrics.stats)
+        self.monitor.section("cache", self.cache.stats)
+        self.monitor.section("decoder", self.decoder.stats)
+        if hasattr(self.api, 'stats'):
+            self.monitor.section("client", self.api.stats)
+        self.exporter = MonitorExporter(self.monitor, mo['port'], mo['snapshot_file'], mo['snapshot_interval']) if mo['use'] else None
 
     # 例外処理 #################################################################
     def on_error(self, status):
         """
         Streamオブジェクトでの処理中にステータスコード200以外が返ってきた際に呼ばれるメソッド
+        ストリームを一旦終了し、ステータスコードに応じた時間だけ待ってから再接続する
         @param status メッセージ
         @return True: 継続、False: 終了
         """
         print('ON ERROR:', status)
-        return self.save_tmp()
+        self.error_status = status
+        self.save_tmp()
+        return False
 
     def on_limit(self, track):
         """
@@ -137,8 +175,10 @@ class QueueListener(StreamListener):
         return
 
     def on_connect(self):
-        """接続した際に呼ばれるメソッド"""
+        """接続した際に呼ばれるメソッド (再接続までの待機時間を最初に戻す)"""
         print('ON CONNECT')
+        self.backoff.reset()
+        self.error_status = None
         return
 
     def on_disconnect(self, notice):
@@ -174,147 +214,353 @@ class QueueListener(StreamListener):
         @param data json形式のツイートデータ
         @return True: 成功、False: 失敗
         """
-        # json形式のデータを読み込む
-        raw = json.loads(data)
+        # リプライでないデータはデコードせずに捨て、リプライは必要な項目だけを取り出す
+        tweet = self.decoder.decode(data)
+
+        # 受け取ったデータをそのままアーカイブに積む
+        if self.archive is not None:
+            self.archive.stream(data, tweet[3] if tweet else peek_id(data))
 
         # 二話者の複数ターンの対話のみを取得
-        if not self.on_status(raw):
+        if tweet and not self.on_reply(tweet):
             return False
         return True
 
     def on_status(self, raw):
         """
-        ツイートをキューに保存する
+        デコード済みのツイートデータを処理する
         @param raw ツイートデータの構造体
         @return True: 成功、False: 失敗
         """
-        if isinstance(raw.get('in_reply_to_status_id'), int):
-            tweet = [raw['in_reply_to_status_id'], raw['user']['id'], self.del_username(unicodedata.normalize('NFKC', raw['text'])), raw['id']]
-
-            if self.check(tweet[2]):
-                tweet[2], standard, part = self.del_morpheme(self.normalize(tweet[2]))
-
-                if tweet[2] != "":
-                    self.queue.append([[tweet, standard, part]])
-
-                    self.tweet_ids = self.tweet_ids[-1000000:]
-                    self.tweet_ids.append(tweet[3])
+        tweet = self.decoder.extract(raw)
+        if tweet:
+            return self.on_reply(tweet)
+        return True
 
-                    while len(self.queue) == self.BATCH_SIZE:
-                        if not self.lookup():
-                            return False
+    def on_reply(self, tweet):
+        """
+        リプライを変換してキューに保存し、バッチが揃えばリプライ先の取得を依頼する
+        @param tweet [リプライ先のツイートID, ユーザID, 本文, ツイートID]
+        @return True: 成功、False: 失敗
+        """
+        if self.nlp:
+            # ある程度まとめてからプロセスプールに変換を依頼する
+            self.replys.append(tweet)
+            if len(self.replys) >= self.nlp_batch_size:
+                self.flush_replys()
+        else:
+            self.enqueue([tweet], self.process([tweet[2]]))
         return True
 
-    def lookup(self):
+    def flush_replys(self):
+        """変換待ちのリプライをプロセスプールに送る"""
+        tweets, self.replys = self.replys, []
+        if tweets:
+            self.nlp.submit(tweets, [tweet[2] for tweet in tweets], self.enqueue)
+
+    def process(self, texts):
+        """
+        ツイートの本文をまとめて対話データの発話に変換する
+        @param texts ツイートの本文のリスト
+        @return (テキスト, 標準形/表層形, 品詞列) のリスト (不適切な本文はNone)
+        """
+        if self.nlp:
+            return self.nlp.map(texts)
+        with self.lock:
+            return self.pipeline.process_batch(texts)
+
+    def enqueue(self, tweets, results):
+        """
+        変換したリプライを対話の末尾としてキューに保存する
+        キューが満杯の間は、バッチが取得処理に回されて空きができるまで待たされる
+        @param tweets ツイートのリスト
+        @param results 変換結果のリスト
+        """
+        with self.lock:
+            while len(self.queue) >= self.max_queue and not self.closed:
+                self.cond.wait()
+            for tweet, result in zip(tweets, results):
+                if result and result[0] != "":
+                    tweet[2], standard, part = result
+                    self.queue.append(Dialog([[tweet, standard, part]]))
+                    self.tweet_ids.add(tweet[3])
+            self.cond.notify_all()
+
+    def schedule(self):
+        """
+        キューの対話からバッチを作り、取得処理に回すスレッドの処理
+        バッチが満杯になるか最も古い対話が一定時間待つまで、またAPIを呼び出せる時刻になるまで待つ
+        待つ間も、書き出す間隔が過ぎた対話データを書き出す
+        処理待ちが満杯の間はここで待たされる
+        """
+        while True:
+            with self.lock:
+                while True:
+                    if self.closed:
+                        return
+                    flush_wait = self.flush_due()
+                    now = time.time()
+                    oldest = self.queue[0].queued_at if self.queue else now
+                    wait = self.scheduler.wait(len(self.queue), oldest, now, self.flushing)
+                    if wait == 0:
+                        break
+                    waits = [w for w in (wait, flush_wait) if w is not None]
+                    self.cond.wait(min(waits) if waits else None)
+
+                size = self.scheduler.take(len(self.queue), now)
+                batch, self.queue = self.queue[:size], self.queue[size:]
+                self.inflight += 1
+                self.cond.notify_all()
+
+            self.pool.submit(batch)
+
+    def flush_due(self):
+        """
+        書き出す間隔が過ぎた対話データを書き出す (ストリームが止まっても溜めたままにしない)
+        @return 次に書き出すまでの秒数 (溜めている対話データがなければNone)
         """
-        キューにあるツイートに対応するリプライ先を一斉に一度だけ取得
-        リプライ先がそれ以上存在しないデータはファイルに保存
+        try:
+            waits = [self.writer.flush_due()]
+            if self.store is not None:
+                waits.append(self.store.flush_due())
+        except Exception as e:
+            print('ON FLUSH ERROR:', e)
+            self.monitor.count("dump_errors")
+            return self.writer.flush_interval
+        waits = [wait for wait in waits if wait is not None]
+        return min(waits) if waits else None
+
+    def finish_batch(self):
+        """取得処理に回したバッチが終わったことを記録する"""
+        with self.lock:
+            self.inflight -= 1
+            self.cond.notify_all()
+
+    def flush_queue(self):
+        """満杯でないバッチも待たずに取得処理に回し、キューが空になって取得処理がすべて終わるまで待つ"""
+        if self.nlp:
+            self.flush_replys()
+            self.nlp.join()
+
+        with self.lock:
+            self.flushing = True
+            self.cond.notify_all()
+            while self.queue or self.inflight:
+                self.cond.wait()
+            self.flushing = False
+
+    def lookup(self, batch):
+        """
+        バッチ内の対話に対応するリプライ先を一斉に一度だけ取得
+        キャッシュにあるリプライ先は取得せず、同じリプライ先は一度だけ取得する
+        @param batch 対話のリスト
         @return True: 成功、False: 失敗
         """
-        ids = []
-        for dialogs in self.queue:
-            ids.append(dialogs[-1][0][0])
+        with self.monitor.measure("lookup", len(batch)):
+            ids = [dialog[-1][0][0] for dialog in batch]
 
-        replys = self.api.statuses_lookup(ids)
-        replys_dic = {reply.id_str: [reply.in_reply_to_status_id, reply.user.id, self.del_username(unicodedata.normalize('NFKC', reply.text)), reply.id] for reply in replys}
+            cached, misses = {}, []
+            for tweet_id in dict.fromkeys(ids):
+                entry = self.cache.get(tweet_id)
+                if entry is None:
+                    misses.append(tweet_id)
+                else:
+                    cached[tweet_id] = entry
+
+            replys = []
+            if misses:
+                with self.monitor.measure("statuses_lookup", len(misses)):
+                    replys = self.api.statuses_lookup(misses)
+                self.metrics.call()
+                self.monitor.count("api_calls")
+                for dialog, tweet_id in zip(batch, ids):
+                    if tweet_id not in cached:
+                        dialog.calls += 1
+            if self.archive is not None:
+                self.archive.lookup(replys)
+
+            success = self.trace(batch, ids, replys, cached)
+            self.finish_batch()
+            return success
+
+    def trace(self, batch, ids, replys, cached=None):
+        """
+        取得したリプライ先を対話に追加する
+        リプライ先がそれ以上存在しないデータはファイルに保存し、残りはキューに戻す
+        失敗しうる変換はすべての対話の保存やキューへの返却より前に行い、途中で例外が出ても対話を二重に扱わないようにする
+        @param batch 対話のリスト
+        @param ids 取得したツイートIDのリスト
+        @param replys 取得したツイートのリスト
+        @param cached キャッシュにあったツイートIDからツイートの項目と変換結果への辞書
+        @return True: 成功、False: 失敗
+        """
+        fields = {reply.id: (reply.in_reply_to_status_id, reply.user.id, reply.text, reply.id) for reply in replys}
+        results = {}
+        for tweet_id, (tweet, result) in (cached or {}).items():
+            fields[tweet_id] = tweet
+            if result is not UNPROCESSED:
+                results[tweet_id] = result
+        for reply in replys:
+            self.cache.put(fields[reply.id])
+
+        # 使用データの候補として適切なリプライ先を選ぶ
+        candidates = []
+        with self.lock:
+            for dialog, tweet_id in zip(batch, ids):
+                tweet = fields.get(tweet_id)
+
+                # リプライ先が本当に存在しているかを確認
+                if tweet and self.talker_check(tweet[1], dialog) and tweet[3] not in self.tweet_ids:
+                    candidates.append(tweet)
+                else:
+                    candidates.append(None)
 
-        dump_idxs = []
+        # 変換結果がキャッシュにない候補の本文を、同じツイートは一度だけまとめて変換する
+        texts = {tweet[3]: tweet[2] for tweet in candidates if tweet and tweet[3] not in results}
+        for tweet_id, result in zip(texts, self.process(list(texts.values()))):
+            results[tweet_id] = result
+            self.cache.put(fields[tweet_id], result)
 
-        for idx in range(self.BATCH_SIZE):
-            interrupte = False
-            tweet = replys_dic.get(str(ids[idx]))
+        success = True
+        with self.lock:
+            for dialog, tweet in zip(batch, candidates):
+                interrupte = True
 
-            # リプライ先が本当に存在しているかを確認
-            if tweet:
-                # 使用データの候補として適切かを判定
-                if self.check(tweet[2]) and self.talker_check(tweet[1], idx) and tweet[3] not in self.tweet_ids:
-                    tweet[2], standard, part = self.del_morpheme(self.normalize(tweet[2]))
+                if tweet:
+                    result = results[tweet[3]]
 
-                    # 長さが適切か最終判定
-                    if tweet[2] != "":
-                        self.queue[idx].append([tweet, standard, part])
-                        self.tweet_ids.append(tweet[3])
+                    # 内容と長さが適切か最終判定 (同じリプライ先が先に追加されていないかも確認)
+                    if result and result[0] != "" and tweet[3] not in self.tweet_ids:
+                        standard, part = result[1], result[2]
+                        tweet = [tweet[0], tweet[1], result[0], tweet[3]]
+                        dialog.append([tweet, standard, part])
+                        self.tweet_ids.add(tweet[3])
 
                         # リプライ先がなければ対話のさかのぼりを終了して保存
-                        if not isinstance(tweet[0], int):
-                            interrupte = True
-                    else:
-                        interrupte = True
-                else:
-                    interrupte = True
-            else:
-                interrupte = True
+                        if isinstance(tweet[0], int):
+                            interrupte = False
 
-            # リプライ探索中断して正常な部分のみを保存
-            if interrupte:
-                dump_idxs.append(idx)
-                if len(self.queue[idx]) >= 2:
-                    if not self.dump(self.queue[idx]):
-                        return False
-
-        self.queue = dellist(self.queue, dump_idxs)
-        return True
+                # リプライ探索中断して正常な部分のみを保存
+                if interrupte:
+                    if len(dialog) >= 2 and not self.dump(dialog):
+                        success = False
+                else:
+                    dialog.queued_at = time.time()
+                    self.queue.append(dialog)
+            self.cond.notify_all()
+
+        return success
+
+    def on_lookup_error(self, batch, exception):
+        """
+        リプライ先の取得中に例外が発生した際に呼ばれるメソッド
+        バッチをキューに戻して次の機会に取得し直す
+        再試行しても成功しないエラー (420/429 以外の4xx) か、失敗した回数が上限を超えた対話は取得をあきらめ、2発話以上あれば保存する
+        @param batch 対話のリスト
+        @param exception 例外
+        """
+        print('ON LOOKUP ERROR:', exception)
+        self.monitor.count("lookup_errors")
+        retryable = not isinstance(exception, APIError) or exception.status in (420, 429) or exception.status >= 500
+
+        with self.lock:
+            retry = []
+            for dialog in batch:
+                dialog.failures += 1
+                if retryable and dialog.failures <= self.max_failures:
+                    retry.append(dialog)
+                elif len(dialog) >= 2:
+                    self.dump(dialog)
+                    self.monitor.count("lookup_given_up", result="dumped")
+                else:
+                    self.monitor.count("lookup_given_up", result="dropped")
+            self.queue = retry + self.queue
+            self.inflight -= 1
+            self.cond.notify_all()
+
+    def close(self):
+        """
+        変換中のリプライと取得処理中のバッチがすべて処理されるのを待ってからワーカーを終了し、ファイルを閉じる
+        キューに残った対話は最後に一度だけリプライ先を取得し、さかのぼり途中の対話も2発話以上あれば保存する
+        """
+        if self.nlp:
+            self.flush_replys()
+            self.nlp.join()
+
+        with self.lock:
+            self.closed = True
+            self.cond.notify_all()
+        self.scheduler_thread.join()
+
+        with self.lock:
+            size = self.scheduler.batch_size
+            batches = [self.queue[i:i + size] for i in range(0, len(self.queue), size)]
+            self.queue = []
+            self.inflight += len(batches)
+        for batch in batches:
+            self.pool.submit(batch)
+        self.pool.close()
+
+        with self.lock:
+            for dialog in self.queue:
+                if len(dialog) >= 2:
+                    self.dump(dialog)
+            self.queue = []
+
+        if self.nlp:
+            self.nlp.close()
+        self.writer.close()
+        if self.store is not None:
+            self.store.close()
+        if self.archive is not None:
+            self.archive.close()
+        if self.exporter is not None:
+            self.exporter.close()
 
     def dump(self, dialog):
         """
         対話データをファイルに保存する
+        書き込みに失敗した対話は、二重に保存しないようキューに戻さずに破棄する
         @param dialog 保存する対話データ
         @return True: 成功、False: 失敗
         """
-        # 時系列順に並べ替え
-        dialog.reverse()
+        with self.monitor.measure("dump"):
+            try:
+                return self.write_dialog(dialog)
+            except Exception as e:
+                print('ON DUMP ERROR:', e)
+                self.monitor.count("dump_errors")
+                return False
 
-        # ツイート内容だけのリストを作成
-        tweets = [[tweet[0][2], tweet[1], tweet[2]] for tweet in dialog]
+    def write_dialog(self, dialog):
+        """
+        対話データを各ファイルとストアに書き込む
+        @param dialog 保存する対話データ
+        @return True: 成功、False: 失敗
+        """
+        # 最初にキューに入ってから保存されるまでの時間と取得回数を記録
+        self.metrics.dump(dialog)
 
-        # ファイルに出力保存
-        if not os.path.isdir("data"):
-            os.mkdir("data")
+        # 時系列順に並べる (渡された対話は並べ替えない)
+        turns = list(reversed(dialog))
 
-        self.dump_cnt += 1
+        # ツイート内容だけのリストを作成
+        tweets = [[tweet[0][2], tweet[1], tweet[2]] for tweet in turns]
 
-        if self.dig_fd:
+        # 各ファイルに書き込む行をまとめて、対話単位で書き込む
+        self.writer.write(self.layout.records(tweets))
+        self.dump_cnt += 1
+        if self.layout.dig_fd:
             self.dig_cnt += 1
-
-            with open(self.dig_fp, 'a', encoding='utf-8') as f:
-                for tweet in tweets:
-                    f.write(tweet[0] + "\n")
-                f.write("\n")
-
-            if self.std_fd:
-                with open(self.dig_std_fp, 'a', encoding='utf-8') as f:
-                    for tweet in tweets:
-                        f.write(tweet[1] + "\n")
-                    f.write("\n")
-
-            if self.prt_fd:
-                with open(self.dig_prt_fp, 'a', encoding='utf-8') as f:
-                    for tweet in tweets:
-                        f.write(tweet[2] + "\n")
-                    f.write("\n")
-
-        if self.trn_fd:
+        if self.layout.trn_fd:
             self.trn_cnt += len(tweets) - 1
 
-            with open(self.inp_fp, 'a', encoding='utf-8') as f_in,\
-            open(self.tar_fp, 'a', encoding='utf-8') as f_tar:
-                for i in range(len(tweets) - 1):
-                    f_in.write(tweets[i][0] + "\n")
-                    f_tar.write(tweets[i + 1][0] + "\n")
-
-            if self.std_fd:
-                with open(self.inp_std_fp, 'a', encoding='utf-8') as f_in,\
-                open(self.tar_std_fp, 'a', encoding='utf-8') as f_tar:
-                    for i in range(len(tweets) - 1):
-                        f_in.write(tweets[i][1] + "\n")
-                        f_tar.write(tweets[i + 1][1] + "\n")
-
-            if self.prt_fd:
-                with open(self.inp_prt_fp, 'a', encoding='utf-8') as f_in,\
-                open(self.tar_prt_fp, 'a', encoding='utf-8') as f_tar:
-                    for i in range(len(tweets) - 1):
-                        f_in.write(tweets[i][2] + "\n")
-                        f_tar.write(tweets[i + 1][2] + "\n")
+        # 発話ごとのツイートIDやユーザIDも合わせてストアに保存
+        if self.store is not None:
+            self.store.append([{
+                'id': tweet[0][3], 'user': tweet[0][1], 'reply_to': tweet[0][0],
+                'text': tweet[0][2], 'standard': tweet[1], 'part': tweet[2]
+            } for tweet in turns])
 
         # 標準出力に進捗状況を出力
         if self.progress:
@@ -334,8 +580,7 @@ class QueueListener(StreamListener):
         @param text ツイートデータのテキスト
         @return ユーザ名を除去したツイートデータのテキスト
         """
-        text = re.sub("(^|\s)(@|＠)(\w+)", "", text)
-        return text
+        return self.pipeline.del_username(text)
 
     def check(self, text):
         """
@@ -343,31 +588,16 @@ class QueueListener(StreamListener):
         @param text ツイートデータのテキスト
         @return True: 適切、False: 不適切
         """
-        # URLを含む（画像も含む？）
-        if re.compile("((ftp|http|https):\/\/(\w+:{0,1}\w*@)?(\S+)(:[0-9]+)?(\/|\/([\w#!:.?+=&amp;%@!&#45;\/]))?)").search(text):
-            return False
-        # ハッシュタグを含む
-        if re.compile("(?:^|[^ーー゛゜々ヾヽぁ-ヶ一-龠a-zA-Z0-9&_/>]+)[#＃]([ー゛゜々ヾヽぁ-ヶ一-龠a-zA-Z0-9_]*[ー゛゜々ヾヽぁ-ヶ一-龠a-zA-Z]+[ー゛゜々ヾヽぁ-ヶ一-龠a-zA-Z0-9_]*)").search(text):
-            return False
-        # 英数字を含む
-        if re.compile("[a-zA-Z0-9]").search(text):
-            return False
-        # ツイッター用語を含む
-        if re.compile("アイコン|あいこん|トプ|とぷ|ヘッダー|へっだー|たぐ|タグ|ツイ|つい|ふぉろ|フォロ|リプ|りぷ|リツ|りつ|いいね|お気に入り|ふぁぼ|ファボ|リム|りむ|ブロック|ぶろっく|スパブロ|すぱぶろ|ブロ解|ぶろ解|鍵|アカ|垢|ダイレクトメッセージ|巻き込|まきこ").search(text):
-            return False
-        # 特定のスラングを含む
-        if re.compile("ナカーマ|イキスギ|いきすぎ|スヤ|すや|うぇーい|ウェーイ|おなしゃす|アザッス|あざっす|ドヤ|どや|ワカリミ|わかりみ|分かりみ").search(text):
-            return False
-        return True
+        return self.pipeline.screener.check(text)
 
-    def talker_check(self, talker, idx):
+    def talker_check(self, talker, dialog):
         """
         二話者の交互発話による対話であるかを判定
         @param talker 話者ID
-        @param idx キュー内の対話ID
+        @param dialog 対話データ
         @return True: 適切、False: 不適切
         """
-        if talker != self.queue[idx][-1][0][1] and (len(self.queue[idx]) == 1 or talker == self.queue[idx][-2][0][1]):
+        if talker != dialog[-1][0][1] and (len(dialog) == 1 or talker == dialog[-2][0][1]):
             return True
         return False
 
@@ -377,51 +607,7 @@ class QueueListener(StreamListener):
         @param text ツイートデータのテキスト
         @return フィルタ処理を施したツイートデータのテキスト
         """
-        text = re.sub("\([^笑泣嬉悲驚汗爆渋苦困死楽怒哀呆殴涙藁]+?\)", " ", text)
-        text = re.sub("[^ぁ-んァ-ヶｧ-ｳﾞ一-龠々ー～〜、。！？!?,，.．\r\n]", " ", text)
-
-        text = re.sub("[,，]", "、", text)
-        text = re.sub("[．.]", "。", text)
-        text = re.sub("〜", "～", text)
-        text = re.sub("、(\s*、)+|。(\s*。)+", "...", text)
-
-        text = re.sub("!+", "！", text)
-        text = re.sub("！(\s*！)+", "！", text)
-        text = re.sub("\?+", "？", text)
-        text = re.sub("？(\s*？)+", "？", text)
-
-        text = re.sub("～(\s*～)+", "～", text)
-        text = re.sub("ー(\s*ー)+", "ー", text)
-
-        text = re.sub("\r\n|\n|\r", "。", text)
-
-        text += "。"
-        text = re.sub("[、。](\s*[、。])+", "。", text)
-
-        text = re.sub("[。、！](\s*[。、！])+", "！", text)
-        text = re.sub("[。、？](\s*[。、？])+", "？", text)
-        text = re.sub("((！\s*)+？|(？\s*)+！)(\s*[！？])*", "!?", text)
-
-        for w in ["っ", "笑", "泣", "嬉", "悲", "驚", "汗", "爆", "渋", "苦", "困", "死", "楽", "怒", "哀", "呆", "殴", "涙", "藁"]:
-            text = re.sub(w + "(\s*" + w + ")+", " " + w + " ", text)
-
-        text = re.sub("、\s*([笑泣嬉悲驚汗爆渋苦困死楽怒哀呆殴涙藁])\s*。", " \\1。", text)
-        text = re.sub("(。|！|？|!\?)\s*([笑泣嬉悲驚汗爆渋苦困死楽怒哀呆殴涙藁])\s*。", " \\2\\1", text)
-
-        text = re.sub("、", " 、 ", text)
-        text = re.sub("。", " 。\n", text)
-
-        text = re.sub("(\.\s*)+", " ... ", text)
-        text = re.sub("！", " ！\n", text)
-        text = re.sub("？", " ？\n", text)
-        text = re.sub("!\?", " !?\n", text)
-
-        text = re.sub("\n(\s*[～ー])+", "\n", text)
-
-        text = re.sub("^([\s\n]*[。、！？!?ー～]+)+", "", text)
-        text = re.sub("(.+?)\\1{3,}", "\\1\\1\\1", text)
-
-        return text
+        return self.pipeline.normalizer.normalize(text)
 
     def del_morpheme(self, text):
         """
@@ -431,103 +617,23 @@ class QueueListener(StreamListener):
         @return 標準形/表層系のテキスト
         @return 品詞列
         """
-        lines = text.strip().split("\n")
-        result, standard, part = "", "", ""
-
-        for line in lines:
-            add_result, add_standard, add_part = "", "", ""
-            node = tagger.parseToNode(line)
-
-            while node:
-                feature = node.feature.split(',')
-                if feature[0] == "BOS/EOS":
-                    node = node.next
-                    continue
-
-                if node.surface in [".", "..", "!", "?", "ノ", "ーノ", "ロ", "艸", "屮", "罒", "灬", "彡", "ヮ", "益",\
-                "皿", "タヒ", "厂", "厂厂", "啞", "卍", "ノノ", "ノノノ", "ノシ", "ノツ",\
-                "癶", "癶癶", "乁", "乁厂", "マ", "んご", "んゴ", "ンゴ", "にき", "ニキ", "ナカ", "み", "ミ"]:
-                    node = node.next
-                    continue
-
-                if node.surface in ["つ", "っ"] and add_result == "":
-                    node = node.next
-                    continue
-
-                if feature[0] == "名詞":
-                    if feature[1] in ["サ変接続", "一般", "形容動詞語幹", "固有名詞"]:
-                        token = self.noun_main_token
-                    else:
-                        token = self.noun_sub_token
-                elif feature[0] == "動詞":
-                    if feature[1] in ["自立"]:
-                        token = self.verb_main_token
-                    else:
-                        token = self.verb_sub_token
-                elif feature[0] == "形容詞":
-                    if feature[1] in ["自立"]:
-                        token = self.adjective_main_token
-                    else:
-                        token = self.adjective_sub_token
-                elif feature[0] == "副詞":
-                    token = self.adverb_token
-                elif feature[0] == "助詞":
-                    token = self.particle_token
-                elif feature[0] == "助動詞":
-                    token = self.auxiliary_verb_token
-                elif feature[0] == "接続詞":
-                    token = self.conjunction_token
-                elif feature[0] == "接頭詞":
-                    token = self.prefix_token
-                elif feature[0] == "フィラー":
-                    token = self.filler_token
-                elif feature[0] == "感動詞":
-                    token = self.impression_verb_token
-                elif node.surface == "...":
-                    token = self.three_dots_token
-                elif node.surface in ["。", "！", "？", "!?"]:
-                    token = self.phrase_point_token
-                elif node.surface == "、":
-                    token = self.reading_point_token
-                else:
-                    token = self.other_token
-
-                add_result += node.surface + " "
-                if re.compile("[^ぁ-んァ-ヶｧ-ｳﾞ一-龠々ー～]").search(feature[6]) or\
-                token in [self.three_dots_token, self.phrase_point_token, self.reading_point_token] or\
-                node.surface in ["ー", "～"]:
-                    add_standard += node.surface + " "
-                else:
-                    add_standard += feature[6] + " "
-                add_part += token + " "
-
-                node = node.next
-
-            if add_result.strip() not in ["、", "。", "！", "？", "!?", "", "... 。", "... ！", "... ？", "... !?",\
-            "人 。", "つ 。", "っ 。", "笑 。", "笑 ！", "笑 ？", "笑 !?"]:
-                result += add_result
-                standard += add_standard
-                part += add_part
-
-        return result.strip(), standard.strip(), part.strip()
+        return self.pipeline.analyzer.analyze(text)
 
     def save_tmp(self):
         """
         ツイートIDのリストや、収集した対話数をチェックポイントとして一時保存
         @return True: 成功、False: 失敗
         """
-        if not os.path.isdir("tmp"):
-            os.mkdir("tmp")
-
-        with open("tmp/cnt.txt", 'w', encoding='utf-8') as f:
-            f.write(str(self.dig_cnt) + "\n")
-            f.write(str(self.trn_cnt) + "\n")
-            f.write(str(self.cum_time + time.time() - self.start_time) + "\n")
-
-        with open("tmp/id.txt", 'w', encoding='utf-8') as f:
-            for tweet_id in self.tweet_ids:
-                f.write(str(tweet_id) + "\n")
-
+        with self.lock:
+            # 保存済みの対話とチェックポイントが食い違わないように先に書き出す
+            self.writer.flush()
+            if self.store is not None:
+                self.store.flush()
+            self.checkpoint.save(self.tweet_ids, {
+                'dig_cnt': self.dig_cnt,
+                'trn_cnt': self.trn_cnt,
+                'cum_time': self.cum_time + time.time() - self.start_time
+            })
         return True
 
     def load_tmp(self):
@@ -535,49 +641,70 @@ class QueueListener(StreamListener):
         チェックポイントを読み込む
         @return True: 成功、False: 失敗
         """
-        if os.path.isdir("tmp"):
-            if os.path.isfile("tmp/cnt.txt"):
-                with open("tmp/cnt.txt", 'r', encoding='utf-8') as f:
-                    self.dig_cnt = int(f.readline().strip())
-                    self.trn_cnt = int(f.readline().strip())
-                    self.cum_time = float(f.readline().strip())
-
-            if os.path.isfile("tmp/id.txt"):
-                with open("tmp/id.txt", 'r', encoding='utf-8') as f:
-                    tweet_id = f.readline()
-                    while tweet_id:
-                        self.tweet_ids.append(int(tweet_id.strip()))
-                        tweet_id = f.readline()
-
+        counters = self.checkpoint.load(self.tweet_ids)
+        if counters:
+            self.dig_cnt = counters['dig_cnt']
+            self.trn_cnt = counters['trn_cnt']
+            self.cum_time = counters['cum_time']
         return True
 
 
-def get_twitter_corpus(config, api_config):
+def get_twitter_corpus(config, api_config, limit=None):
     """
     ツイッターよりコーパスを作成
+    接続が切れた場合はキューリスナーとキューをそのまま使い、失敗の種類に応じた時間だけ待ってから再接続する
     @param config 設定ファイル情報
     @param api_config Twitter APIの情報
+    @param limit 受け取るデータ数の最大 (Noneなら中断されるまで収集する)
     """
+    # キューリスナー作成
+    listener = QueueListener(config, api_config)
+    stream = None
+
+    # 指定した数のデータを受け取ったらストリームを終了する
+    received = [0]
+    if limit is not None:
+        on_data = listener.on_data
+
+        def limited(data):
+            received[0] += 1
+            return on_data(data) and received[0] < limit
+        listener.on_data = limited
+
     while True:
         try:
-            # キューリスナー作成
-            listener = QueueListener(config, api_config)
-
             # ストリームを開く
             stream = Stream(listener.auth, listener)
 
             # ストリームフィルタ（どれかにヒットすれば拾う）
             stream.filter(languages=["ja"], track=['。', '，', '！', '.', '!', ',', '?', '？', '、', '私', '俺', '(', ')', '君', 'あなた'])
 
+            # 指定した数のデータを受け取った
+            if limit is not None and received[0] >= limit:
+                break
+
+            # ステータスコード200以外で終了した
+            delay = listener.backoff.delay(listener.error_status)
         except KeyboardInterrupt:
-            listener.log()
+            break
+        except Exception as e:
+            # 通信エラー
+            print('ON RECONNECT:', e)
             listener.save_tmp()
-            stream.disconnect()
+            delay = listener.backoff.delay()
+
+        # 再接続するまで待つ (待機中に中断されても処理中の対話を保存して終了する)
+        try:
+            time.sleep(delay)
+        except KeyboardInterrupt:
             break
-        except:
-            global tcpip_delay
-            time.sleep(min(tcpip_delay, MAX_TCPIP_TIMEOUT))
-            tcpip_delay += 0.25
+
+    # 処理中の対話を保存してから終了
+    if stream is not None:
+        stream.disconnect()
+    listener.close()
+    listener.log()
+    listener.save_tmp()
 
 
 if __name__ == '__main__':
@@ -586,5 +713,39 @@ if __name__ == '__main__':
     # Twitter API の情報を読み込む
     api_config = yaml.load(stream=open("config/api.yml", 'rt', encoding='utf-8'), Loader=yaml.SafeLoader)
 
-    # ツイート収集開始
-    get_twitter_corpus(config, api_config)
+    parser = argparse.ArgumentParser(description="ツイッターから対話データを収集する")
+    parser.add_argument("--profile", nargs='?', const="cprofile", choices=PROFILE_MODES, help="一定数のツイートの収集処理をプロファイルする (省略時は cprofile)")
+    parser.add_argument("--limit", type=int, default=10000, help="プロファイルするツイート数")
+    parser.add_argument("--records", nargs='+', help="プロファイルで流し込むストリームの記録ファイルかフォルダ (省略時は実際のストリームから収集する)")
+    parser.add_argument("--lookup", action='append', help="記録を流し込む場合のリプライ先の記録ファイルかフォルダ")
+    parser.add_argument("--profile-out", default="profile/twitter", help="プロファイルの結果を書き出すファイルパスの拡張子を除いた部分")
+    args = parser.parse_args()
+
+    if not args.profile:
+        # ツイート収集開始
+        get_twitter_corpus(config, api_config)
+    else:
+        # 本文の変換もプロファイルできるように、ストリームのプロセスで変換する
+        config['nlp']['processes'] = 0
+        prefix = os.path.abspath(args.profile_out)
+
+        if args.records:
+            # 記録したストリームを一時フォルダで流し込み、対話データは破棄する
+            from replay import replay
+            records = [os.path.abspath(path) for path in args.records]
+            lookups = [os.path.abspath(path) for path in args.lookup] if args.lookup else None
+            folder = tempfile.mkdtemp()
+            cwd = os.getcwd()
+            os.chdir(folder)
+            try:
+                with Profiler(args.profile) as profiler:
+                    replay(config, records, lookups, limit=args.limit)
+            finally:
+                os.chdir(cwd)
+                shutil.rmtree(folder)
+        else:
+            with Profiler(args.profile) as profiler:
+                get_twitter_corpus(config, api_config, args.limit)
+
+        for path in profiler.write(prefix):
+            print("profile: " + path)